@@ -0,0 +1,224 @@
+"""
+=============================================================================
+MT5 BACKENDS - PLUGGABLE IMPLEMENTATIONS + STACKABLE WRAPPERS
+=============================================================================
+
+Every endpoint talks to "the mt5 object". What that object is gets decided
+here, from config, instead of by an import in server.py:
+
+    BACKEND (exactly one)                WRAPPERS (zero or more, inside -> out)
+        real        MetaTrader5 terminal     faults    latency/failure injection
+        simulator   mt5_mock.MT5Simulator    metrics   per-call timing (/metrics)
+        replay      simulator on recorded    record    call trace (mt5_trace.py)
+                    files (MT5_REPLAY_DIR)
+        trace       results served from a
+                    recorded call trace
+
+A backend is anything that looks like the MetaTrader5 module: the functions
+in BACKEND_FUNCTIONS plus its constants. A wrapper is a proxy taking the
+object below it as `._mt5` and forwarding whatever it doesn't change, so
+wrappers stack in any order.
+
+CONFIG:
+    MT5_BACKEND    real | simulator | replay | ...
+                   (default: real, or simulator/replay when USE_MOCK_MT5=true)
+    MT5_WRAPPERS   comma list, innermost first
+                   (default: "faults,metrics", faults only when MT5_FAULTS is set
+                   and the backend is not real)
+    MT5_FAULTS_ALLOW_REAL  true to allow the faults wrapper over a real
+                   terminal (refused otherwise)
+    MT5_EXECUTION  fill model for simulator/replay (see execution.py)
+
+STRICT MODE: anything but a real backend requires USE_MOCK_MT5=true, so a
+production config can never end up trading against simulated prices. The
+other way round, fault injection over a real terminal needs
+MT5_FAULTS_ALLOW_REAL=true: a leftover MT5_FAULTS must not make a live
+bridge drop calls or invent requotes.
+
+Adding an implementation:
+
+    @register_backend('mybackend')
+    def _create_mine(env):
+        return MyBackend(...)
+=============================================================================
+"""
+
+import os
+
+
+# What the bridge calls on a backend
+BACKEND_FUNCTIONS = (
+    'initialize', 'shutdown', 'last_error', 'account_info',
+    'symbols_get', 'symbol_info', 'symbol_select', 'symbol_info_tick',
+    'copy_rates_from_pos', 'positions_get', 'order_send',
+    'orders_get',                                   # /orders/pending
+    'order_check', 'order_calc_margin',             # pre-trade checks
+    'history_deals_get',                            # client order id recovery
+)
+
+BACKENDS = {}
+WRAPPERS = {}
+
+
+class BackendConfigError(Exception):
+    """Unknown backend/wrapper or a config that breaks strict mode"""
+
+
+def register_backend(name, real=False):
+    """Decorator for factory(env) -> backend. real=True marks live-trading backends."""
+    def decorator(factory):
+        BACKENDS[name] = (factory, real)
+        return factory
+    return decorator
+
+
+def register_wrapper(name):
+    """Decorator for factory(inner, env) -> wrapped backend"""
+    def decorator(factory):
+        WRAPPERS[name] = factory
+        return factory
+    return decorator
+
+
+def missing_functions(backend):
+    return [name for name in BACKEND_FUNCTIONS if not callable(getattr(backend, name, None))]
+
+
+def unwrap(backend):
+    """Innermost backend below all wrappers"""
+    while hasattr(backend, '_mt5'):
+        backend = backend._mt5
+    return backend
+
+
+def describe(backend):
+    """'metrics > faults > MT5Simulator' - outermost first"""
+    names = []
+    while hasattr(backend, '_mt5'):
+        names.append(getattr(backend, 'wrapper_name', type(backend).__name__))
+        backend = backend._mt5
+    names.append(getattr(backend, '__name__', None) or type(backend).__name__)
+    return ' > '.join(names)
+
+
+# =============================================================================
+# SELECTION
+# =============================================================================
+def use_mock(env=None):
+    env = os.environ if env is None else env
+    return env.get('USE_MOCK_MT5', 'false').lower() == 'true'
+
+
+def default_backend_name(env=None):
+    env = os.environ if env is None else env
+    if not use_mock(env):
+        return 'real'
+    return 'replay' if env.get('MT5_REPLAY_DIR') else 'simulator'
+
+
+def faults_allowed_on_real(env=None):
+    env = os.environ if env is None else env
+    return env.get('MT5_FAULTS_ALLOW_REAL', 'false').lower() == 'true'
+
+
+def default_wrapper_names(env=None, real=False):
+    env = os.environ if env is None else env
+    faults = env.get('MT5_FAULTS', '').strip() and (not real or faults_allowed_on_real(env))
+    return (['faults'] if faults else []) + ['metrics']
+
+
+def create_backend(name=None, wrappers=None, env=None):
+    """
+    Build the configured backend and stack the wrappers on top.
+    Raises BackendConfigError for bad config; ImportError when the real
+    MetaTrader5 package is not installed.
+    """
+    env = os.environ if env is None else env
+    name = name or env.get('MT5_BACKEND', '').strip() or default_backend_name(env)
+    if name not in BACKENDS:
+        raise BackendConfigError(f"Unknown MT5_BACKEND '{name}' (available: {', '.join(sorted(BACKENDS))})")
+    factory, real = BACKENDS[name]
+    if not real and not use_mock(env):
+        raise BackendConfigError(f"Backend '{name}' is not a real terminal - it requires USE_MOCK_MT5=true")
+
+    if wrappers is None:
+        configured = env.get('MT5_WRAPPERS')
+        wrappers = ([w.strip() for w in configured.split(',') if w.strip()]
+                    if configured is not None else default_wrapper_names(env, real))
+    if real and 'faults' in wrappers and not faults_allowed_on_real(env):
+        raise BackendConfigError(f"Refusing the faults wrapper over the real backend '{name}' "
+                                 "- set MT5_FAULTS_ALLOW_REAL=true to inject faults into live trading")
+
+    backend = factory(env)
+    missing = missing_functions(backend)
+    if missing:
+        raise BackendConfigError(f"Backend '{name}' lacks: {', '.join(missing)}")
+
+    for wrapper in wrappers:
+        if wrapper not in WRAPPERS:
+            raise BackendConfigError(f"Unknown MT5 wrapper '{wrapper}' (available: {', '.join(sorted(WRAPPERS))})")
+        backend = WRAPPERS[wrapper](backend, env)
+        backend.wrapper_name = wrapper
+    return backend
+
+
+# =============================================================================
+# BUILT-IN BACKENDS
+# =============================================================================
+@register_backend('real', real=True)
+def _create_real(env):
+    import MetaTrader5
+    return MetaTrader5
+
+
+def _execution_model(env):
+    from execution import ExecutionModel, load_execution_config
+    config = load_execution_config(env.get('MT5_EXECUTION', ''))
+    return ExecutionModel(config) if config is not None else None
+
+
+@register_backend('simulator')
+def _create_simulator(env):
+    from mt5_mock import mt5
+    mt5.execution = _execution_model(env)
+    return mt5
+
+
+@register_backend('replay')
+def _create_replay(env):
+    from mt5_mock import create_replay_simulator
+    path = env.get('MT5_REPLAY_DIR')
+    if not path:
+        raise BackendConfigError("Backend 'replay' needs MT5_REPLAY_DIR")
+    return create_replay_simulator(path, speed=float(env.get('MT5_REPLAY_SPEED', 1)),
+                                   execution=_execution_model(env))
+
+
+@register_backend('trace')
+def _create_trace(env):
+    from mt5_trace import TraceBackend
+    path = env.get('MT5_TRACE_FILE')
+    if not path:
+        raise BackendConfigError("Backend 'trace' needs MT5_TRACE_FILE")
+    return TraceBackend(path, timing=float(env.get('MT5_TRACE_TIMING', 1)))
+
+
+# =============================================================================
+# BUILT-IN WRAPPERS
+# =============================================================================
+@register_wrapper('faults')
+def _wrap_faults(inner, env):
+    from faults import FaultInjectingMT5, load_fault_config
+    return FaultInjectingMT5(inner, load_fault_config(env.get('MT5_FAULTS', '')) or {})
+
+
+@register_wrapper('record')
+def _wrap_record(inner, env):
+    from mt5_trace import RecordingMT5
+    return RecordingMT5(inner, env.get('MT5_RECORD_FILE', 'mt5_trace.bin'))
+
+
+@register_wrapper('metrics')
+def _wrap_metrics(inner, env):
+    from metrics import InstrumentedMT5
+    return InstrumentedMT5(inner)
@@ -0,0 +1,273 @@
+"""
+=============================================================================
+BACKTEST - THE DOJI STRATEGY OVER YEARS OF BARS, IN ARRAY OPERATIONS
+=============================================================================
+
+Replays the live rules (patterns.py + tradingService.js) on closed bars:
+
+    signal      star pattern on bar i, else a single doji on bar i
+    direction   star: its suggested direction
+                doji: opposite to bar i-1 (bullish before -> SELL)
+    entry       open of bar i+1 (BUY pays the bar's spread)
+    SL / TP     r = high[i] - low[i]
+                BUY   sl = low[i]  - sl_mult * r    tp = close[i] + tp_mult * r
+                SELL  sl = high[i] + sl_mult * r    tp = close[i] - tp_mult * r
+    exit        first bar touching SL or TP (SL wins when both touch the
+                same bar; gaps fill at the open), else close of the
+                max_hold-th bar
+
+Exits for all candidate signals are found at once on an (n_signals x
+max_hold) window of highs/lows; only choosing non-overlapping trades
+(one_position) walks the signal list.
+
+USAGE:
+    python backtest.py --file EURUSD_M15.csv --point 0.00001
+    python backtest.py --simulate 200000 --sl-mult 1.5 --tp-mult 2
+=============================================================================
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from patterns import DOJI_MAX_RATIO, PATTERNS, STAR_LONG, STAR_SHORT, body_ratios, detect_doji, detect_star
+
+
+DEFAULT_PARAMS = {
+    'patterns': ('star', 'doji'),
+    'star_long': STAR_LONG,
+    'star_short': STAR_SHORT,
+    'doji_max': DOJI_MAX_RATIO,
+    'min_confidence': 0.0,
+    'sl_mult': 1.5,
+    'tp_mult': 2.0,
+    'max_hold': 96,
+    'one_position': True,
+    'point': 0.0,               # price of one spread point; 0 ignores spread
+    'risk_fraction': 0.01,      # equity risked per trade for the compounded curve
+}
+
+CHUNK = 4096
+EXIT_SL, EXIT_TP, EXIT_TIME = 0, 1, 2
+EXIT_NAMES = ('sl', 'tp', 'time')
+
+
+def resolve_params(params=None):
+    merged = dict(DEFAULT_PARAMS)
+    if params:
+        unknown = set(params) - set(DEFAULT_PARAMS)
+        if unknown:
+            raise ValueError(f"Unknown backtest parameter(s): {', '.join(sorted(unknown))}")
+        merged.update(params)
+    if isinstance(merged['patterns'], str):
+        merged['patterns'] = tuple(p for p in merged['patterns'].split(',') if p)
+    unknown = [p for p in merged['patterns'] if p not in PATTERNS]
+    if unknown:
+        raise ValueError(f"Unknown pattern(s): {', '.join(unknown)}")
+    return merged
+
+
+# =============================================================================
+# SIGNALS
+# =============================================================================
+def find_signals(rates, params):
+    """(index, direction +1/-1, is_star) for every signal bar"""
+    ratio, bullish = body_ratios(rates)
+    n = len(ratio)
+    direction = np.zeros(n, dtype=np.int8)
+    star = np.zeros(n, dtype=bool)
+
+    if 'doji' in params['patterns']:
+        mask, confidence = detect_doji(rates, ratio, params['doji_max'])
+        mask &= confidence >= params['min_confidence']
+        prev_bullish = np.concatenate(([False], bullish[:-1]))
+        direction[mask] = np.where(prev_bullish[mask], -1, 1)
+
+    if 'star' in params['patterns']:
+        mask, confidence, _ = detect_star(rates, ratio, bullish, params['star_long'], params['star_short'])
+        mask &= confidence >= params['min_confidence']
+        direction[mask] = np.where(bullish[mask], 1, -1)
+        star[mask] = True
+
+    index = np.flatnonzero(direction[:-1])          # the last bar has no next open
+    return index, direction[index].astype(np.float64), star[index]
+
+
+# =============================================================================
+# EXITS
+# =============================================================================
+def _exits(o, h, l, c, spread, entries, direction, sl, tp, max_hold):
+    """Vectorized exit search for a chunk of entries -> (exit index, exit price, reason)"""
+    n = len(o)
+    offsets = np.arange(max_hold)
+    bars = entries[:, None] + offsets
+    valid = bars < n
+    bars = np.minimum(bars, n - 1)
+    hi, lo, op, sp = h[bars], l[bars], o[bars], spread[bars]
+
+    buy = (direction > 0)[:, None]
+    # SELL positions close at the ask: bid + spread
+    sl_hit = np.where(buy, lo <= sl[:, None], hi + sp >= sl[:, None]) & valid
+    tp_hit = np.where(buy, hi >= tp[:, None], lo + sp <= tp[:, None]) & valid
+    k_sl = np.where(sl_hit.any(axis=1), sl_hit.argmax(axis=1), max_hold)
+    k_tp = np.where(tp_hit.any(axis=1), tp_hit.argmax(axis=1), max_hold)
+
+    rows = np.arange(len(entries))
+    by_sl = (k_sl <= k_tp) & (k_sl < max_hold)
+    by_tp = ~by_sl & (k_tp < max_hold)
+    k = np.where(by_sl, k_sl, np.where(by_tp, k_tp, valid.sum(axis=1) - 1))
+    open_k = op[rows, k] + np.where(direction > 0, 0.0, sp[rows, k])
+
+    price = np.where(by_sl, np.where(direction > 0, np.minimum(sl, open_k), np.maximum(sl, open_k)),
+                     np.where(by_tp, np.where(direction > 0, np.maximum(tp, open_k), np.minimum(tp, open_k)),
+                              c[bars[rows, k]] + np.where(direction > 0, 0.0, sp[rows, k])))
+    reason = np.where(by_sl, EXIT_SL, np.where(by_tp, EXIT_TP, EXIT_TIME))
+    return entries + k, price, reason
+
+
+def simulate_trades(rates, params=None):
+    """All trades as a dict of equal-length arrays"""
+    params = resolve_params(params)
+    o = np.asarray(rates['open'], dtype=np.float64)
+    h = np.asarray(rates['high'], dtype=np.float64)
+    l = np.asarray(rates['low'], dtype=np.float64)
+    c = np.asarray(rates['close'], dtype=np.float64)
+    spread = np.asarray(rates['spread'], dtype=np.float64) * params['point']
+
+    signal, direction, star = find_signals(rates, params)
+    entry_index = signal + 1
+    span = h[signal] - l[signal]
+    sl = np.where(direction > 0, l[signal] - params['sl_mult'] * span, h[signal] + params['sl_mult'] * span)
+    tp = np.where(direction > 0, c[signal] + params['tp_mult'] * span, c[signal] - params['tp_mult'] * span)
+    entry = o[entry_index] + np.where(direction > 0, spread[entry_index], 0.0)
+
+    # MT5 rejects stops on the wrong side of the fill price
+    ok = np.where(direction > 0, (sl < entry) & (tp > entry), (sl > entry) & (tp < entry))
+    signal, direction, star, entry_index, sl, tp, entry = (
+        a[ok] for a in (signal, direction, star, entry_index, sl, tp, entry))
+
+    exit_index = np.empty(len(signal), dtype=np.int64)
+    exit_price = np.empty(len(signal))
+    reason = np.empty(len(signal), dtype=np.int8)
+    for start in range(0, len(signal), CHUNK):
+        part = slice(start, start + CHUNK)
+        exit_index[part], exit_price[part], reason[part] = _exits(
+            o, h, l, c, spread, entry_index[part], direction[part], sl[part], tp[part], params['max_hold'])
+
+    if params['one_position']:
+        keep = np.zeros(len(signal), dtype=bool)
+        free_from = -1
+        for i, (e, x) in enumerate(zip(entry_index.tolist(), exit_index.tolist())):
+            if e > free_from:
+                keep[i] = True
+                free_from = x
+        signal, direction, star, entry_index, sl, tp, entry, exit_index, exit_price, reason = (
+            a[keep] for a in (signal, direction, star, entry_index, sl, tp, entry, exit_index, exit_price, reason))
+
+    pnl = (exit_price - entry) * direction
+    risk = np.abs(entry - sl)
+    return {
+        'signal_index': signal, 'entry_index': entry_index, 'exit_index': exit_index,
+        'direction': direction, 'star': star, 'entry': entry, 'sl': sl, 'tp': tp,
+        'exit_price': exit_price, 'reason': reason, 'pnl': pnl,
+        'r': np.divide(pnl, risk, out=np.zeros_like(pnl), where=risk > 0),
+    }
+
+
+# =============================================================================
+# REPORT
+# =============================================================================
+def max_drawdown(curve, start=0.0, axis=-1):
+    """Largest drop from a running peak (the curve starts at `start`)"""
+    curve = np.asarray(curve, dtype=np.float64)
+    if curve.shape[axis] == 0:
+        return 0.0
+    peak = np.maximum.accumulate(np.maximum(curve, start), axis=axis)
+    return np.max(peak - curve, axis=axis)
+
+
+def summarize(trades, rates, params=None, curve_points=500):
+    """Hit rate, R statistics, drawdowns and a downsampled equity curve"""
+    params = resolve_params(params)
+    r = trades['r']
+    count = len(r)
+    wins = r > 0
+    gross_win = float(trades['pnl'][wins].sum())
+    gross_loss = float(-trades['pnl'][~wins].sum())
+
+    cum_r = np.cumsum(r)
+    equity = np.cumprod(1.0 + params['risk_fraction'] * r) if count else np.ones(0)
+    peak = np.maximum.accumulate(np.maximum(equity, 1.0)) if count else equity
+    times = np.asarray(rates['time'])[trades['exit_index']] if count else np.zeros(0, dtype=np.int64)
+    step = max(1, count // curve_points) if curve_points else count + 1
+
+    return {
+        'bars': len(rates),
+        'trades': count,
+        'wins': int(wins.sum()),
+        'hit_rate': round(float(wins.mean()), 4) if count else None,
+        'total_r': round(float(cum_r[-1]), 3) if count else 0.0,
+        'avg_r': round(float(r.mean()), 4) if count else None,
+        'total_pnl': float(trades['pnl'].sum()),
+        'profit_factor': round(gross_win / gross_loss, 3) if gross_loss > 0 else None,
+        'max_drawdown_r': round(float(max_drawdown(cum_r)), 3),
+        'final_equity': round(float(equity[-1]), 4) if count else 1.0,
+        'max_drawdown_pct': round(float(np.max(1 - equity / peak)) * 100, 2) if count else 0.0,
+        'avg_bars_held': round(float(np.mean(trades['exit_index'] - trades['entry_index'] + 1)), 2) if count else None,
+        'exits': {name: int((trades['reason'] == i).sum()) for i, name in enumerate(EXIT_NAMES)},
+        'by_pattern': {
+            'star': int(trades['star'].sum()),
+            'doji': int((~trades['star']).sum()),
+        },
+        'equity_curve': [[int(t), round(float(e), 5)] for t, e in zip(times[::step], equity[::step])]
+                        if curve_points else [],
+    }
+
+
+def run_backtest(rates, params=None, curve_points=500):
+    started = time.perf_counter()
+    params = resolve_params(params)
+    trades = simulate_trades(rates, params)
+    report = summarize(trades, rates, params, curve_points)
+    report['params'] = {k: list(v) if isinstance(v, tuple) else v for k, v in params.items()}
+    report['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    return report
+
+
+def add_source_arguments(parser):
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--file', help='bars file (.csv / .npy / .parquet)')
+    source.add_argument('--simulate', type=int, help='generate N M15 bars with the simulator generator')
+    parser.add_argument('--seed', type=int, default=42)
+
+
+def load_source(args):
+    from market_data import generate_rates, load_rates
+    if args.file:
+        return load_rates(args.file)
+    return generate_rates(args.simulate, end_time=int(time.time()) // 900 * 900, seed=args.seed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Backtest the doji strategy on OHLCV history')
+    add_source_arguments(parser)
+    parser.add_argument('--sl-mult', type=float, default=DEFAULT_PARAMS['sl_mult'])
+    parser.add_argument('--tp-mult', type=float, default=DEFAULT_PARAMS['tp_mult'])
+    parser.add_argument('--max-hold', type=int, default=DEFAULT_PARAMS['max_hold'])
+    parser.add_argument('--patterns', default='star,doji')
+    parser.add_argument('--point', type=float, default=DEFAULT_PARAMS['point'])
+    args = parser.parse_args(argv)
+
+    report = run_backtest(load_source(args), {
+        'sl_mult': args.sl_mult, 'tp_mult': args.tp_mult, 'max_hold': args.max_hold,
+        'patterns': args.patterns, 'point': args.point,
+    })
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,270 @@
+"""
+=============================================================================
+BRIDGE BENCHMARK - THROUGHPUT AND TAIL LATENCY AGAINST THE MOCK
+=============================================================================
+
+Runs fully offline: server.py is imported with USE_MOCK_MT5=true, so no
+terminal and no network access are needed.
+
+SCENARIOS:
+    candles     GET  /candles        count = 10, 100, 1000, 5000
+    positions   GET  /positions      open positions = 0, 10, 100, 1000
+    order       POST /order
+    close       POST /close/<ticket> (one pre-seeded position per request)
+
+SERVING MODES:
+    inprocess   Flask test client - handler + JSON cost only, no sockets
+    threaded    werkzeug server, one thread per request (app.run default)
+    single      werkzeug server, requests served one at a time
+
+Every (scenario, mode, concurrency) cell reports requests/s and
+p50/p90/p99/max latency in milliseconds. Results are written as JSON.
+
+USAGE:
+    python bench_bridge.py                       # full matrix -> bench_results.json
+    python bench_bridge.py --scenarios candles --modes inprocess --concurrency 1,8
+    python bench_bridge.py --output - > results.json
+    python bench_bridge.py --faults faults.json     # same matrix with injected latency/failures
+    python bench_bridge.py --scenarios order --execution '{"depth": 0.05}' --order-volume 0.12
+                                                 # fills through the execution model (execution.py)
+=============================================================================
+"""
+
+import argparse
+import contextlib
+import http.client
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+SCENARIOS = ('candles', 'positions', 'order', 'close')
+MODES = ('inprocess', 'threaded', 'single')
+
+CANDLE_COUNTS = (10, 100, 1000, 5000)
+POSITION_COUNTS = (0, 10, 100, 1000)
+
+
+def load_server(confirm_delay, faults=None, execution=None):
+    """Import server.py in mock mode, keeping its startup banner off stdout"""
+    os.environ['USE_MOCK_MT5'] = 'true'
+    os.environ.setdefault('MT5_BACKEND', 'simulator')
+    os.environ['ORDER_CONFIRM_DELAY'] = str(confirm_delay)
+    if faults:
+        os.environ['MT5_FAULTS'] = faults
+    if execution:
+        os.environ['MT5_EXECUTION'] = execution
+    os.environ.setdefault('BRIDGE_LOG_LEVEL', 'WARNING')
+    with contextlib.redirect_stdout(sys.stderr):
+        import server
+    from backends import unwrap
+    return server, unwrap(server.mt5)
+
+
+# =============================================================================
+# CLIENTS
+# =============================================================================
+class InProcessClient:
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, body=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body)
+        response.get_data()
+        return response.status_code
+
+
+class HttpClient:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+
+    def request(self, method, path, body=None):
+        # werkzeug's dev server speaks HTTP/1.0 - one connection per request
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        try:
+            payload = json.dumps(body) if body is not None else None
+            headers = {'Content-Type': 'application/json'} if body is not None else {}
+            conn.request(method, path, body=payload, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        finally:
+            conn.close()
+
+
+@contextlib.contextmanager
+def serve(app, mode):
+    if mode == 'inprocess':
+        yield InProcessClient(app)
+        return
+
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    httpd = make_server('127.0.0.1', 0, app, threaded=(mode == 'threaded'),
+                        request_handler=QuietHandler)
+    thread = threading.Thread(target=httpd.serve_forever, name=f'bench-{mode}', daemon=True)
+    thread.start()
+    try:
+        yield HttpClient('127.0.0.1', httpd.server_port)
+    finally:
+        httpd.shutdown()
+        thread.join()
+
+
+# =============================================================================
+# RUNNER
+# =============================================================================
+def run_cell(client, requests, concurrency, warmup):
+    """Fire `requests` (list of (method, path, body)) with N client threads"""
+    from metrics import Histogram
+
+    for method, path, body in requests[:warmup]:
+        client.request(method, path, body)
+    requests = requests[warmup:]
+
+    hist = Histogram()
+    statuses = {}
+    lock = threading.Lock()
+
+    def one(req):
+        method, path, body = req
+        start = time.perf_counter_ns()
+        status = client.request(method, path, body)
+        elapsed = time.perf_counter_ns() - start
+        hist.record(elapsed)
+        with lock:
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, requests))
+    wall = time.perf_counter() - started
+
+    snap = hist.snapshot()
+    return {
+        'requests': len(requests),
+        'wall_s': round(wall, 4),
+        'throughput_rps': round(len(requests) / wall, 1) if wall > 0 else None,
+        'p50_ms': snap['p50_ns'] / 1e6,
+        'p90_ms': snap['p90_ns'] / 1e6,
+        'p99_ms': snap['p99_ns'] / 1e6,
+        'max_ms': snap['max_ns'] / 1e6,
+        'mean_ms': round(snap['sum_ns'] / max(1, snap['count']) / 1e6, 4),
+        'status_codes': {str(k): v for k, v in sorted(statuses.items())},
+    }
+
+
+def fill_stats(server, count):
+    """Retcodes, partial fills and slippage of the last `count` /order calls"""
+    records = server.order_latency_log.query(limit=count)
+    retcodes = {}
+    for record in records:
+        key = str(record.get('retcode'))
+        retcodes[key] = retcodes.get(key, 0) + 1
+    partial = sum(1 for r in records if r.get('filled_volume') and r['filled_volume'] < r.get('volume', 0) - 1e-9)
+    return {'retcodes': retcodes, 'partial_fills': partial,
+            'slippage': server.order_latency_log.summary(records)['slippage']}
+
+
+def build_cases(scenario, mock, args):
+    """Yield (params, setup, requests) for one scenario"""
+    n = args.requests
+    if scenario == 'candles':
+        for count in CANDLE_COUNTS:
+            path = f'/candles?symbol=EURUSD&timeframe=M15&count={count}'
+            yield {'count': count}, None, [('GET', path, None)] * n
+    elif scenario == 'positions':
+        for count in POSITION_COUNTS:
+            yield {'positions': count}, (lambda c=count: mock.seed_positions(c)), [('GET', '/positions', None)] * n
+    elif scenario == 'order':
+        body = {'symbol': 'EURUSD', 'type': 'BUY', 'volume': args.order_volume}
+        yield {}, (lambda: mock.seed_positions(0)), [('POST', '/order', body)] * args.order_requests
+    elif scenario == 'close':
+        total = args.order_requests
+        yield ({}, (lambda: mock.seed_positions(total)),
+               [('POST', f'/close/{500000 + i}', None) for i in range(total)])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark MT5 bridge endpoints against mt5_mock')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--modes', default=','.join(MODES))
+    parser.add_argument('--concurrency', default='1,4,16')
+    parser.add_argument('--requests', type=int, default=500, help='requests per candles/positions cell')
+    parser.add_argument('--order-requests', type=int, default=100, help='requests per order/close cell')
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--confirm-delay', type=float, default=0.0,
+                        help='ORDER_CONFIRM_DELAY for /order (server default is 0.5s)')
+    parser.add_argument('--faults', help='MT5_FAULTS config (inline JSON or .json path), see faults.py')
+    parser.add_argument('--execution', help='MT5_EXECUTION fill model (inline JSON or .json path), see execution.py')
+    parser.add_argument('--order-volume', type=float, default=0.01, help='lots per /order request')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='bench_results.json', help="file path or '-' for stdout")
+    args = parser.parse_args(argv)
+
+    server, mock = load_server(args.confirm_delay, args.faults, args.execution)
+    scenarios = [s for s in args.scenarios.split(',') if s]
+    modes = [m for m in args.modes.split(',') if m]
+    levels = [int(c) for c in args.concurrency.split(',') if c]
+
+    results = []
+    for scenario in scenarios:
+        if scenario not in SCENARIOS:
+            parser.error(f'unknown scenario {scenario}')
+        for mode in modes:
+            if mode not in MODES:
+                parser.error(f'unknown mode {mode}')
+            for concurrency in levels:
+                for params, setup, requests in build_cases(scenario, mock, args):
+                    random.seed(args.seed)
+                    if setup:
+                        setup()
+                    # the warmup for close would consume tickets - skip it
+                    warmup = 0 if scenario == 'close' else min(args.warmup, len(requests) // 2)
+                    with serve(server.app, mode) as client:
+                        cell = run_cell(client, requests, concurrency, warmup)
+                    cell.update({'scenario': scenario, 'mode': mode, 'concurrency': concurrency, **params})
+                    if scenario == 'order':
+                        cell['fills'] = fill_stats(server, cell['requests'])
+                    results.append(cell)
+                    print(f"{scenario:<10} {mode:<10} c={concurrency:<3} {json.dumps(params):<20} "
+                          f"{cell['throughput_rps']:>9} rps  p50={cell['p50_ms']:.3f}ms  "
+                          f"p99={cell['p99_ms']:.3f}ms  max={cell['max_ms']:.3f}ms", file=sys.stderr)
+
+    report = {
+        'benchmark': 'mt5_bridge',
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'config': vars(args),
+        'results': results,
+    }
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+"""
+=============================================================================
+BRIDGE LOGGING - STRUCTURED, NON-BLOCKING LOG OUTPUT
+=============================================================================
+
+Request threads never write to the console directly. Every record is pushed
+onto a bounded in-memory queue and a single background listener thread does
+the formatting and the (possibly slow) console/file I/O.
+
+CONFIGURATION (environment variables):
+    BRIDGE_LOG_LEVEL   DEBUG | INFO | WARNING | ERROR      (default INFO)
+    BRIDGE_LOG_FORMAT  json | text                         (default json)
+    BRIDGE_LOG_FILE    optional path, one JSON line per record
+    BRIDGE_LOG_QUEUE   max queued records before dropping (default 10000)
+    BRIDGE_LOG_SAMPLE  per-logger, per-level sampling, e.g.
+                       "bridge.candles:INFO=20,bridge.candles:DEBUG=100"
+                       keeps 1 out of every N records for that pair
+
+If the queue is full the record is DROPPED and counted - the order path must
+never wait for the console.
+=============================================================================
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+
+_LEVELS = {
+    'DEBUG': logging.DEBUG,
+    'INFO': logging.INFO,
+    'WARNING': logging.WARNING,
+    'ERROR': logging.ERROR,
+    'CRITICAL': logging.CRITICAL,
+}
+
+_listener = None
+_queue_handler = None
+
+
+# =============================================================================
+# FORMATTERS
+# =============================================================================
+class JsonLineFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, event + event fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 6),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': record.getMessage(),
+            'thread': record.threadName,
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Human readable single line: time level logger event key=value ..."""
+
+    def format(self, record):
+        ts = time.strftime('%H:%M:%S', time.localtime(record.created))
+        line = f"{ts}.{int(record.msecs):03d} {record.levelname:<7} {record.name} {record.getMessage()}"
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line += ' ' + ' '.join(f"{k}={v}" for k, v in fields.items())
+        if record.exc_text:
+            line += '\n' + record.exc_text
+        return line
+
+
+# =============================================================================
+# SAMPLING + QUEUE HANDLER
+# =============================================================================
+class SamplingFilter(logging.Filter):
+    """
+    Keep 1 out of every N records per (logger, level).
+    Rules come from BRIDGE_LOG_SAMPLE; pairs without a rule are never sampled.
+    """
+
+    def __init__(self, rules):
+        super().__init__()
+        self.rules = rules
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        every = self.rules.get((record.name, record.levelno))
+        if not every or every <= 1:
+            return True
+        key = (record.name, record.levelno)
+        with self._lock:
+            n = self._counters.get(key, 0)
+            self._counters[key] = n + 1
+        return n % every == 0
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks and never formats on the caller thread.
+    Records that don't fit in the queue are counted in `dropped`.
+    """
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()     # enqueue() runs on every logging thread
+
+    def prepare(self, record):
+        # Formatting happens on the listener thread. Only freeze the message
+        # and the traceback text so the record is safe to hand over.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+
+def parse_sample_rules(spec):
+    """Parse "logger:LEVEL=N,..." into {(logger, levelno): N}"""
+    rules = {}
+    for part in (spec or '').split(','):
+        part = part.strip()
+        if not part or '=' not in part or ':' not in part:
+            continue
+        target, every = part.rsplit('=', 1)
+        name, level = target.rsplit(':', 1)
+        levelno = _LEVELS.get(level.strip().upper())
+        if levelno is None:
+            continue
+        try:
+            rules[(name.strip(), levelno)] = max(1, int(every))
+        except ValueError:
+            continue
+    return rules
+
+
+# =============================================================================
+# EVENT LOGGER
+# =============================================================================
+class EventLogger:
+    """
+    Thin wrapper over logging.Logger for structured events:
+
+        log = get_logger('bridge.order')
+        log.info('order_sent', symbol='EURUSD', volume=0.01)
+
+    Disabled levels return before a LogRecord is created.
+    """
+
+    def __init__(self, name):
+        self.logger = logging.getLogger(name)
+
+    def _log(self, level, event, fields, exc_info=False):
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, event, extra={'fields': fields}, exc_info=exc_info)
+
+    def debug(self, event, **fields):
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event, **fields):
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event, **fields):
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event, **fields):
+        self._log(logging.ERROR, event, fields)
+
+    def exception(self, event, **fields):
+        self._log(logging.ERROR, event, fields, exc_info=True)
+
+
+def get_logger(name):
+    return EventLogger(name)
+
+
+# =============================================================================
+# SETUP
+# =============================================================================
+def configure_logging():
+    """
+    Install the queue handler on the 'bridge' logger and start the listener.
+    Safe to call more than once - only the first call has an effect.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return _queue_handler
+
+    level = _LEVELS.get(os.environ.get('BRIDGE_LOG_LEVEL', 'INFO').upper(), logging.INFO)
+    fmt = os.environ.get('BRIDGE_LOG_FORMAT', 'json').lower()
+    log_file = os.environ.get('BRIDGE_LOG_FILE')
+    max_queue = int(os.environ.get('BRIDGE_LOG_QUEUE', 10000))
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(TextFormatter() if fmt == 'text' else JsonLineFormatter())
+    handlers = [console]
+    if log_file:
+        file_handler = logging.FileHandler(log_file, encoding='utf-8')
+        file_handler.setFormatter(JsonLineFormatter())
+        handlers.append(file_handler)
+
+    log_queue = queue.Queue(maxsize=max_queue)
+    _queue_handler = DroppingQueueHandler(log_queue)
+    _queue_handler.addFilter(SamplingFilter(parse_sample_rules(os.environ.get('BRIDGE_LOG_SAMPLE'))))
+
+    root = logging.getLogger('bridge')
+    root.setLevel(level)
+    root.addHandler(_queue_handler)
+    root.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=False)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _queue_handler
+
+
+def shutdown_logging():
+    """Flush everything still queued (called automatically at exit)"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def dropped_records():
+    """Number of log records dropped because the queue was full"""
+    return _queue_handler.dropped if _queue_handler else 0
@@ -0,0 +1,230 @@
+"""
+=============================================================================
+BRIDGE CACHES - AVOID RE-FETCHING DATA MT5 ALREADY GAVE US
+=============================================================================
+
+CandleCache
+    Closed bars never change, so they are kept per (symbol, timeframe).
+    A request for N bars then costs one 2-bar copy_rates_from_pos call
+    (forming bar + last closed bar) instead of N bars:
+
+        last closed bar == cached          -> hit: cached closed bars + fresh forming bar
+        newer closed bar(s) on the server  -> extend: fetch only the gap
+        no entry / not enough bars         -> miss: full fetch
+
+    Outcomes are counted in candle_cache_total{result=hit|extend|miss}.
+
+PositionsCache / OrdersCache
+    The last positions_get() / orders_get() snapshot, shared by readers
+    that can live with a few hundred ms of staleness (position monitor,
+    pending order listings). Anything that changes the book calls
+    invalidate(), so the next read refetches.
+    Counted in positions_cache_total / orders_cache_total{result=hit|refresh}.
+    AccountCache does the same for account_info() (balance, margin_free).
+
+SymbolInfoCache
+    symbol_info() per symbol for its static fields (point, digits, stops /
+    freeze level, volume limits), refetched after max_age seconds. Its
+    bid/ask go stale: prices come from symbol_info_tick().
+=============================================================================
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from metrics import registry
+from replay import TF_SECONDS
+
+
+class CandleCache:
+    """LRU of closed bars per (symbol, timeframe)"""
+
+    def __init__(self, max_entries=512, max_bars=5000, metrics=None):
+        self.max_entries = max_entries
+        self.max_bars = max_bars
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        metrics = metrics or registry
+        self._counters = {
+            result: metrics.counter('candle_cache_total', 'Candle cache lookups by outcome', result=result)
+            for result in ('hit', 'extend', 'miss')
+        }
+
+    def get(self, mt5, symbol, timeframe, count):
+        """
+        Same result as mt5.copy_rates_from_pos(symbol, TIMEFRAMES[timeframe], 0, count),
+        or None when MT5 fails (last_error is left for the caller).
+        """
+        tf = getattr(mt5, f'TIMEFRAME_{timeframe}')
+        key = (symbol, timeframe)
+        with self._lock:
+            closed = self._entries.get(key)
+            if closed is not None:
+                self._entries.move_to_end(key)
+
+        if closed is None or len(closed) < count - 1:
+            return self._full_fetch(mt5, key, tf, count)
+
+        head = mt5.copy_rates_from_pos(symbol, tf, 0, 2)
+        if head is None:
+            return None
+        if len(head) < 2:
+            return self._full_fetch(mt5, key, tf, count)
+
+        newest, cached_newest = int(head['time'][-2]), int(closed['time'][-1])
+        if newest == cached_newest:
+            self._counters['hit'].inc()
+            forming = head[-1:]
+        elif newest > cached_newest:
+            gap = (newest - cached_newest) // TF_SECONDS[timeframe] + 1
+            if gap >= count:
+                return self._full_fetch(mt5, key, tf, count)
+            fresh = mt5.copy_rates_from_pos(symbol, tf, 0, gap + 1)
+            if fresh is None:
+                return None
+            self._counters['extend'].inc()
+            keep = closed[closed['time'] < fresh['time'][0]]
+            closed = self._store(key, np.concatenate((keep, fresh[:-1])))
+            forming = fresh[-1:]
+        else:
+            # Server history went backwards (reconnect, replay restart)
+            return self._full_fetch(mt5, key, tf, count)
+
+        older = closed[max(0, len(closed) - (count - 1)):] if count > 1 else closed[:0]
+        return np.concatenate((older, forming))
+
+    def _full_fetch(self, mt5, key, tf, count):
+        rates = mt5.copy_rates_from_pos(key[0], tf, 0, count)
+        if rates is None:
+            return None
+        self._counters['miss'].inc()
+        if len(rates):
+            self._store(key, rates[:-1])
+        return rates
+
+    def _store(self, key, closed):
+        closed = np.array(closed[-self.max_bars:], copy=True)
+        with self._lock:
+            self._entries[key] = closed
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return closed
+
+    def invalidate(self, symbol=None):
+        with self._lock:
+            if symbol is None:
+                self._entries.clear()
+            else:
+                for key in [k for k in self._entries if k[0] == symbol]:
+                    del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            entries = len(self._entries)
+        return {'entries': entries, **{k: c.value for k, c in self._counters.items()}}
+
+
+class SnapshotCache:
+    """Last result of an MT5 getter, refetched when older than max_age seconds"""
+
+    getter = None
+    metric = None
+    book = True                 # result is a sequence (stored as a tuple)
+
+    def __init__(self, max_age=0.5, metrics=None):
+        self.max_age = max_age
+        self._items = None
+        self._fetched = 0.0
+        self._lock = threading.Lock()
+        metrics = metrics or registry
+        self._counters = {
+            result: metrics.counter(self.metric, f'{self.getter}() snapshot reads by outcome', result=result)
+            for result in ('hit', 'refresh')
+        }
+
+    def get(self, mt5, max_age=None):
+        """Cached result (a tuple for books), or None when MT5 fails and nothing is cached"""
+        max_age = self.max_age if max_age is None else max_age
+        with self._lock:
+            if self._items is not None and time.monotonic() - self._fetched < max_age:
+                self._counters['hit'].inc()
+                return self._items
+        items = getattr(mt5, self.getter)()
+        with self._lock:
+            if items is None:
+                return self._items
+            self._counters['refresh'].inc()
+            self._items = tuple(items) if self.book else items
+            self._fetched = time.monotonic()
+            return self._items
+
+    def invalidate(self):
+        with self._lock:
+            self._fetched = 0.0
+
+    def stats(self):
+        with self._lock:
+            held = len(self._items) if self.book and self._items is not None else None
+            age = round(time.monotonic() - self._fetched, 3) if self._fetched else None
+        return {'count': held, 'age_s': age, **{k: c.value for k, c in self._counters.items()}}
+
+
+class PositionsCache(SnapshotCache):
+    getter = 'positions_get'
+    metric = 'positions_cache_total'
+
+
+class OrdersCache(SnapshotCache):
+    getter = 'orders_get'
+    metric = 'orders_cache_total'
+
+
+class AccountCache(SnapshotCache):
+    getter = 'account_info'
+    metric = 'account_cache_total'
+    book = False
+
+
+class SymbolInfoCache:
+    """symbol_info() per symbol, refetched when older than max_age seconds"""
+
+    def __init__(self, max_age=60.0, metrics=None):
+        self.max_age = max_age
+        self._entries = {}
+        self._lock = threading.Lock()
+        metrics = metrics or registry
+        self._counters = {
+            result: metrics.counter('symbol_info_cache_total', 'Symbol info lookups by outcome', result=result)
+            for result in ('hit', 'miss')
+        }
+
+    def get(self, mt5, symbol):
+        """symbol_info(symbol), or None when MT5 does not know the symbol"""
+        with self._lock:
+            entry = self._entries.get(symbol)
+        if entry is not None and time.monotonic() - entry[1] < self.max_age:
+            self._counters['hit'].inc()
+            return entry[0]
+        info = mt5.symbol_info(symbol)
+        if info is None:
+            return None
+        self._counters['miss'].inc()
+        with self._lock:
+            self._entries[symbol] = (info, time.monotonic())
+        return info
+
+    def invalidate(self, symbol=None):
+        with self._lock:
+            if symbol is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(symbol, None)
+
+    def stats(self):
+        with self._lock:
+            entries = len(self._entries)
+        return {'entries': entries, **{k: c.value for k, c in self._counters.items()}}
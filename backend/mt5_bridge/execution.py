@@ -0,0 +1,130 @@
+"""
+=============================================================================
+EXECUTION MODEL - HOW THE SIMULATOR FILLS MARKET ORDERS
+=============================================================================
+
+Without a model the simulator fills every deal instantly, in full, at the
+quote of the moment. With one, order_send behaves like a broker:
+
+    latency      the fill happens `latency` after the request (same spec as
+                 faults.py: fixed ms or uniform / normal / lognormal); with
+                 sleep the call really waits, otherwise only the fill time
+                 moves (fast backtests)
+    price move   replay: the fill uses the recorded quote at fill time
+                 random walk: the bid drifts N(0, drift_points) points per
+                 100 ms of latency (scaled by sqrt(time))
+    spread       BUY fills at the ask, SELL at the bid of the fill-time quote
+    deviation    request price vs fill-time quote moved against the order by
+                 more than `deviation` points -> TRADE_RETCODE_REQUOTE
+    depth        `depth` lots per price level, each level one point worse;
+                 the fill walks levels (VWAP) while they stay inside the
+                 deviation (or max_levels)
+    filling      FOK  whole volume or TRADE_RETCODE_REJECT
+                 IOC  what the book gives, the rest cancelled
+                      -> TRADE_RETCODE_DONE_PARTIAL
+
+CONFIG (MT5_EXECUTION = inline JSON or path to a .json file):
+
+    {"seed": 7, "latency": {"dist": "lognormal", "median_ms": 35, "sigma": 0.5},
+     "sleep": true, "drift_points": 3, "depth": 2.0, "max_levels": 20}
+
+Rolls come from one seeded RNG, so a request sequence fills the same way
+on every run.
+=============================================================================
+"""
+
+import json
+import math
+import os
+import random
+import threading
+
+from faults import sample_latency_ms
+
+
+_FIELDS = {'seed', 'latency', 'sleep', 'drift_points', 'depth', 'max_levels'}
+
+DEFAULTS = {
+    'latency': {'dist': 'lognormal', 'median_ms': 35, 'sigma': 0.5},
+    'sleep': True,
+    'drift_points': 3.0,
+    'depth': 2.0,
+    'max_levels': 20,
+}
+
+
+def load_execution_config(value=None):
+    """MT5_EXECUTION (inline JSON or .json path) -> dict, or None when unset"""
+    value = value if value is not None else os.environ.get('MT5_EXECUTION', '')
+    value = value.strip()
+    if not value:
+        return None
+    if not value.startswith('{'):
+        with open(value) as f:
+            value = f.read()
+    config = json.loads(value)
+    unknown = set(config) - _FIELDS
+    if unknown:
+        raise ValueError(f"Unknown execution field(s): {', '.join(sorted(unknown))}")
+    return config
+
+
+class ExecutionModel:
+
+    def __init__(self, config=None):
+        config = {**DEFAULTS, **(config or {})}
+        self.latency_spec = config['latency']
+        self.sleep = bool(config['sleep'])
+        self.drift_points = float(config['drift_points'])
+        self.depth = float(config['depth'])
+        self.max_levels = int(config['max_levels'])
+        self._rng = random.Random(config.get('seed', 7))
+        self._lock = threading.Lock()
+
+    def latency(self):
+        """Seconds between request and fill"""
+        with self._lock:
+            return sample_latency_ms(self.latency_spec, self._rng) / 1000.0
+
+    def drift(self, point, latency):
+        """Random-walk price move over `latency` seconds"""
+        if not self.drift_points or latency <= 0:
+            return 0.0
+        with self._lock:
+            return self._rng.gauss(0.0, self.drift_points * math.sqrt(latency / 0.1)) * point
+
+    @staticmethod
+    def _limit(buy, point, requested, deviation):
+        """Worst acceptable price, or None when the request sets no bound"""
+        if not requested or deviation is None:
+            return None
+        return requested + (1 if buy else -1) * deviation * point
+
+    def requote(self, buy, top, point, requested=0.0, deviation=None):
+        """True when the quote moved against the order by more than `deviation` points"""
+        limit = self._limit(buy, point, requested, deviation)
+        return limit is not None and (1 if buy else -1) * (top - limit) > point / 2
+
+    def fill(self, buy, volume, top, point, digits, volume_step, requested=0.0, deviation=None):
+        """
+        Walk the book from `top` (ask for BUY, bid for SELL) -> (filled volume,
+        VWAP), (0.0, None) when nothing fills. Volume is rounded down to
+        volume_step; the dropped part comes off the worst level.
+        """
+        sign = 1 if buy else -1
+        limit = self._limit(buy, point, requested, deviation)
+        remaining, cost, last = volume, 0.0, top
+        for level in range(self.max_levels):
+            price = top + sign * level * point
+            if remaining <= 1e-9 or (limit is not None and sign * (price - limit) > point / 2):
+                break
+            take = min(remaining, self.depth)
+            cost += take * price
+            remaining -= take
+            last = price
+
+        taken = volume - remaining
+        filled = round(math.floor(taken / volume_step + 1e-9) * volume_step, 8)
+        if filled <= 0:
+            return 0.0, None
+        return filled, round((cost - (taken - filled) * last) / filled, digits)
@@ -0,0 +1,234 @@
+"""
+=============================================================================
+FAULT INJECTION - MAKE THE MT5 BACKEND SLOW AND UNRELIABLE ON PURPOSE
+=============================================================================
+
+The simulator answers in microseconds and never fails; a real terminal
+stalls, drops the IPC connection and requotes. FaultInjectingMT5 wraps any
+MT5 backend (real module or simulator) and, per function, adds:
+
+    latency      fixed ms, or a distribution (uniform / normal / lognormal)
+    spike        rare long stalls on top of the latency (tail latency)
+    timeout      sleep timeout_ms, then return None with a timeout last_error
+    none         return None with a last_error code, like a failed IPC call
+    requote      order_send returns REQUOTE / PRICE_CHANGED / ... instead of DONE
+    disconnect   every call fails until disconnect_s has passed; initialize()
+                 returns False meanwhile
+
+CONFIG (MT5_FAULTS = inline JSON or path to a .json file):
+
+    {
+      "seed": 7,
+      "disconnect_s": 5,
+      "rules": {
+        "*":               {"latency": {"dist": "lognormal", "median_ms": 2, "sigma": 0.6},
+                            "none": 0.002},
+        "order_send":      {"latency": {"dist": "uniform", "min_ms": 40, "max_ms": 120},
+                            "spike": 0.01, "spike_ms": 1500, "requote": 0.05},
+        "copy_rates_*":    {"timeout": 0.001, "timeout_ms": 3000},
+        "symbol_info_tick": {"disconnect": 0.0005}
+      }
+    }
+
+Rule keys are fnmatch patterns; the most specific (longest) pattern wins
+per field, "*" supplies the defaults. Rolls come from one seeded RNG, so a
+given request sequence sees the same faults on every run.
+=============================================================================
+"""
+
+import fnmatch
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections import namedtuple
+
+from metrics import registry
+
+
+# MetaTrader5 IPC error codes (last_error)
+RES_E_INTERNAL_FAIL_SEND = -10001
+RES_E_INTERNAL_FAIL_RECEIVE = -10002
+RES_E_INTERNAL_FAIL_CONNECT = -10004
+RES_E_INTERNAL_FAIL_TIMEOUT = -10005
+
+TRADE_RETCODE_REQUOTE = 10004
+TRADE_RETCODE_REJECT = 10006
+TRADE_RETCODE_PRICE_CHANGED = 10020
+TRADE_RETCODE_PRICE_OFF = 10021
+
+DEFAULT_REQUOTE_CODES = (TRADE_RETCODE_REQUOTE, TRADE_RETCODE_PRICE_CHANGED)
+
+_REQUOTE_COMMENTS = {
+    TRADE_RETCODE_REQUOTE: 'Requote',
+    TRADE_RETCODE_REJECT: 'Request rejected',
+    TRADE_RETCODE_PRICE_CHANGED: 'Prices changed',
+    TRADE_RETCODE_PRICE_OFF: 'No quotes to process the request',
+}
+
+# Never faulted: error reporting and the terminal's own constants
+_PASSTHROUGH = {'last_error', 'shutdown', 'version'}
+
+# Same fields as MetaTrader5.OrderSendResult
+OrderSendResult = namedtuple('OrderSendResult', [
+    'retcode', 'deal', 'order', 'volume', 'price', 'bid', 'ask',
+    'comment', 'request_id', 'retcode_external', 'request',
+])
+
+_RULE_FIELDS = {
+    'latency', 'spike', 'spike_ms', 'timeout', 'timeout_ms', 'none', 'error',
+    'requote', 'requote_codes', 'disconnect',
+}
+
+
+def load_fault_config(value=None):
+    """MT5_FAULTS (inline JSON or .json path) -> dict, or None when unset"""
+    value = value if value is not None else os.environ.get('MT5_FAULTS', '')
+    value = value.strip()
+    if not value:
+        return None
+    if not value.startswith('{'):
+        with open(value) as f:
+            value = f.read()
+    config = json.loads(value)
+    for pattern, rule in config.get('rules', {}).items():
+        unknown = set(rule) - _RULE_FIELDS
+        if unknown:
+            raise ValueError(f"Unknown fault field(s) for '{pattern}': {', '.join(sorted(unknown))}")
+    return config
+
+
+def sample_latency_ms(spec, rng):
+    if spec is None:
+        return 0.0
+    if isinstance(spec, (int, float)):
+        return float(spec)
+    dist = spec.get('dist', 'fixed')
+    if dist == 'fixed':
+        return float(spec.get('ms', 0.0))
+    if dist == 'uniform':
+        return rng.uniform(spec['min_ms'], spec['max_ms'])
+    if dist == 'normal':
+        return max(0.0, rng.gauss(spec['mean_ms'], spec['std_ms']))
+    if dist == 'lognormal':
+        return rng.lognormvariate(math.log(spec['median_ms']), spec.get('sigma', 0.5))
+    raise ValueError(f"Unknown latency distribution '{dist}'")
+
+
+class FaultInjectingMT5:
+    """
+    Proxy around an MT5 backend that injects latency and failures.
+    Constants and unfaulted functions pass straight through.
+    """
+
+    def __init__(self, mt5_module, config=None, metrics=None):
+        self._mt5 = mt5_module
+        self._metrics = metrics or registry
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._wrapped = {}
+        self.disconnected_until = 0.0
+        self.configure(config or {})
+
+    def configure(self, config):
+        """Replace the active rules (can be called while serving)"""
+        with self._lock:
+            self.config = config
+            self._rng = random.Random(config.get('seed'))
+            self.disconnect_s = float(config.get('disconnect_s', 5.0))
+            self._rules = sorted(config.get('rules', {}).items(), key=lambda kv: len(kv[0]))
+            self._resolved = {}
+
+    def _rule_for(self, name):
+        rule = self._resolved.get(name)
+        if rule is None:
+            rule = {}
+            for pattern, fields in self._rules:
+                if fnmatch.fnmatchcase(name, pattern):
+                    rule.update(fields)
+            self._resolved[name] = rule
+        return rule
+
+    def _roll(self, probability):
+        if not probability:
+            return False
+        with self._lock:
+            return self._rng.random() < probability
+
+    def _count(self, name, kind):
+        self._metrics.counter('mt5_faults_injected_total', 'Faults injected into MetaTrader5 calls',
+                              function=name, kind=kind).inc()
+
+    def _fail(self, name, kind, code, message):
+        self._count(name, kind)
+        self._local.error = (code, message)
+        return None
+
+    # -------------------------------------------------------------------------
+    # MT5 API
+    # -------------------------------------------------------------------------
+    def last_error(self):
+        error = getattr(self._local, 'error', None)
+        return error if error is not None else self._mt5.last_error()
+
+    def __getattr__(self, name):
+        wrapped = self._wrapped.get(name)
+        if wrapped is not None:
+            return wrapped
+        attr = getattr(self._mt5, name)
+        if not callable(attr) or name.isupper() or name.startswith('_') or name in _PASSTHROUGH:
+            return attr
+
+        def faulty(*args, **kwargs):
+            return self._call(name, attr, args, kwargs)
+
+        faulty.__name__ = name
+        self._wrapped[name] = faulty
+        return faulty
+
+    def _call(self, name, attr, args, kwargs):
+        rule = self._rule_for(name)
+        self._local.error = None
+
+        if time.monotonic() < self.disconnected_until:
+            return self._disconnected(name)
+        if self._roll(rule.get('disconnect')):
+            self.disconnected_until = time.monotonic() + self.disconnect_s
+            self._count(name, 'disconnect')
+            return self._disconnected(name)
+
+        with self._lock:
+            delay_ms = sample_latency_ms(rule.get('latency'), self._rng)
+        if self._roll(rule.get('spike')):
+            self._count(name, 'spike')
+            delay_ms += float(rule.get('spike_ms', 1000.0))
+
+        if self._roll(rule.get('timeout')):
+            time.sleep(float(rule.get('timeout_ms', 5000.0)) / 1000.0)
+            return self._fail(name, 'timeout', RES_E_INTERNAL_FAIL_TIMEOUT, 'Timeout')
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000.0)
+
+        if self._roll(rule.get('none')):
+            code, message = rule.get('error', (RES_E_INTERNAL_FAIL_RECEIVE, 'Receive failed'))
+            return self._fail(name, 'none', code, message)
+        if name == 'order_send' and self._roll(rule.get('requote')):
+            return self._requote(name, rule, args, kwargs)
+        return attr(*args, **kwargs)
+
+    def _disconnected(self, name):
+        self._fail(name, 'disconnected', RES_E_INTERNAL_FAIL_CONNECT, 'No IPC connection')
+        return False if name == 'initialize' else None
+
+    def _requote(self, name, rule, args, kwargs):
+        request = dict(args[0] if args else kwargs.get('request', {}))
+        with self._lock:
+            retcode = self._rng.choice(rule.get('requote_codes') or DEFAULT_REQUOTE_CODES)
+        self._count(name, 'requote')
+        tick = self._mt5.symbol_info_tick(request.get('symbol')) if request.get('symbol') else None
+        bid, ask = (tick.bid, tick.ask) if tick else (0.0, 0.0)
+        return OrderSendResult(retcode=retcode, deal=0, order=0, volume=0.0, price=0.0,
+                               bid=bid, ask=ask, comment=_REQUOTE_COMMENTS.get(retcode, 'Rejected'),
+                               request_id=0, retcode_external=0, request=request)
@@ -0,0 +1,240 @@
+"""
+=============================================================================
+IDEMPOTENCY - CLIENT ORDER IDS FOR /order
+=============================================================================
+
+A client that times out while /order is still inside order_send() can't
+tell whether the position was opened. With a client order id (body field
+`client_order_id` or header `Idempotency-Key`) it can simply send again:
+
+    first request   the key is claimed, written to the journal ('sent')
+                    right before order_send and mapped into the MT5 comment
+                    ("DojiHunter <16 hex>", inside the 31 char limit)
+    in flight       a duplicate waits for the first one (up to WAIT s),
+                    then gets 409 in_progress
+    finished        a duplicate gets the stored response straight from
+                    memory (idempotent_replay: true), the terminal is not
+                    asked at all
+    unknown         order_send returned nothing, or the bridge died after
+                    'sent': the next duplicate looks for the comment in
+                    positions / deal history; found -> stored as the
+                    result (recovered: true), not found -> sent again
+    other body      the same key with another symbol/type/volume/sl/tp
+                    -> 422
+
+The index holds the newest `max_entries` keys for `ttl` seconds. Every
+change is appended to a JSONL journal (ORDER_KEYS_FILE) that is replayed
+and compacted at startup, so keys survive a bridge restart.
+=============================================================================
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import registry
+
+
+MAX_KEY_LENGTH = 64
+COMMENT_PREFIX = 'DojiHunter '
+KEY_TTL = 24 * 3600.0
+WAIT = 10.0                 # how long a duplicate waits for the request in flight
+CLAIM_ATTEMPTS = 3          # claim / wait rounds for a duplicate before 409 in_progress
+LOOKBACK = 300              # seconds of deal history searched for a lost order
+
+
+def parse_key(data, headers):
+    """Client order id from the body or the Idempotency-Key header (None when not given)"""
+    key = data.get('client_order_id') or headers.get('Idempotency-Key')
+    if key is None or key == '':
+        return None
+    key = str(key).strip()
+    if not key or len(key) > MAX_KEY_LENGTH or not key.isprintable():
+        raise ValueError(f'client_order_id must be 1-{MAX_KEY_LENGTH} printable characters')
+    return key
+
+
+def order_comment(key):
+    """MT5 comment carrying the key (27 chars, the terminal keeps 31)"""
+    return COMMENT_PREFIX + hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+
+
+def fingerprint(data):
+    """The request fields a duplicate must repeat unchanged"""
+    return {name: data.get(name) for name in ('symbol', 'type', 'volume', 'sl', 'tp')}
+
+
+def find_order(mt5, symbol, comment, since):
+    """
+    Look for the deal an unanswered order_send may still have made ->
+    /order response body, or None when the terminal knows nothing of it.
+    """
+    for pos in mt5.positions_get(symbol=symbol) or ():
+        if pos.comment == comment:
+            return {
+                "success": True, "order_ticket": pos.ticket, "deal_ticket": None,
+                "entry_price": pos.price_open, "volume": pos.volume, "symbol": pos.symbol,
+                "type": 'BUY' if pos.type == mt5.POSITION_TYPE_BUY else 'SELL',
+                "retcode": mt5.TRADE_RETCODE_DONE, "position_verified": True,
+            }
+    # Already closed again: the entry deal is still in the history
+    deals = mt5.history_deals_get(int(since) - LOOKBACK, int(time.time()) + 60) or ()
+    for deal in deals:
+        if deal.comment == comment and deal.symbol == symbol and deal.entry == mt5.DEAL_ENTRY_IN:
+            return {
+                "success": True, "order_ticket": deal.position_id, "deal_ticket": deal.ticket,
+                "entry_price": deal.price, "volume": deal.volume, "symbol": deal.symbol,
+                "type": 'BUY' if deal.type == mt5.DEAL_TYPE_BUY else 'SELL',
+                "retcode": mt5.TRADE_RETCODE_DONE, "position_verified": False,
+            }
+    return None
+
+
+class OrderKeys:
+    """Bounded client order id index (OrderedDict, oldest first) backed by a JSONL journal"""
+
+    def __init__(self, path=None, max_entries=10000, ttl=KEY_TTL, metrics=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._metrics = metrics or registry
+        self._entries = OrderedDict()
+        self._events = {}           # key -> threading.Event of the request in flight
+        self._lock = threading.Lock()
+        self._journal = None
+        self._written = 0
+        if path:
+            self._load()
+
+    # -------------------------------------------------------------------------
+    # Journal
+    # -------------------------------------------------------------------------
+    def _load(self):
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue        # torn last line after a crash
+                    self._entries.pop(entry['key'], None)
+                    self._entries[entry['key']] = entry
+        self._prune()
+        self._compact()
+
+    def _compact(self):
+        """Rewrite the journal with the live entries only"""
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            for entry in self._entries.values():
+                f.write(json.dumps(entry) + '\n')
+        os.replace(tmp, self.path)
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = open(self.path, 'a')
+        self._written = len(self._entries)
+
+    def _write(self, entry):
+        if self._journal is None:
+            return
+        self._journal.write(json.dumps(entry) + '\n')
+        self._journal.flush()
+        self._written += 1
+        if self._written > 2 * self.max_entries:
+            self._compact()
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if len(self._entries) <= self.max_entries and entry['time'] >= cutoff:
+                break
+            if entry['status'] == 'pending':
+                break       # oldest key still in flight: pruned on a later claim
+            del self._entries[key]
+
+    # -------------------------------------------------------------------------
+    # Claims
+    # -------------------------------------------------------------------------
+    def _count(self, result):
+        self._metrics.counter('order_keys_total', 'Client order ids by outcome', result=result).inc()
+
+    def claim(self, key, request, retry=False):
+        """
+        (entry, True) when the caller now owns the key and must send the order,
+        (existing entry, False) for a duplicate. retry=True takes over a key
+        left 'sent' once find_order() came back empty.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['time'] < time.time() - self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is not None and not (retry and entry['status'] == 'sent'):
+                return dict(entry), False
+            entry = {'key': key, 'status': 'pending', 'time': time.time(), 'request': request,
+                     'comment': order_comment(key), 'sent_at': None, 'code': None, 'response': None}
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            self._events[key] = threading.Event()
+            self._prune()
+        self._count('retry' if retry else 'new')
+        return dict(entry), True
+
+    def sent(self, key):
+        """
+        The order is about to reach order_send: from now on it must not be sent
+        twice. It stays 'pending' here; the journal says 'sent' in case the
+        bridge dies before finish().
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry['sent_at'] = time.time()
+                self._write({**entry, 'status': 'sent'})
+
+    def finish(self, key, code, response, recovered=False):
+        """
+        Store the response of an order that reached order_send. A key that
+        never got that far is released, so the client may simply try again;
+        a 5xx without a retcode leaves it 'sent' (outcome unknown).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            if entry['sent_at'] is None:
+                del self._entries[key]
+            else:
+                unknown = code >= 500 and response.get('retcode') is None
+                entry.update(status='sent' if unknown else 'done', code=code, response=response)
+                self._write(entry)
+            event = self._events.pop(key, None)
+        if event is not None:
+            event.set()
+        if recovered:
+            self._count('recovered')
+
+    def wait(self, key, timeout=WAIT):
+        """Block until the request in flight for `key` finishes -> its entry (or None)"""
+        with self._lock:
+            event = self._events.get(key)
+        if event is not None:
+            event.wait(timeout)
+        with self._lock:
+            entry = self._entries.get(key)
+            return dict(entry) if entry is not None else None
+
+    def count(self, result):
+        self._count(result)
+
+    def stats(self):
+        with self._lock:
+            states = {}
+            for entry in self._entries.values():
+                states[entry['status']] = states.get(entry['status'], 0) + 1
+            return {'keys': len(self._entries), 'max_entries': self.max_entries, 'states': states,
+                    'journal': self.path}
@@ -0,0 +1,204 @@
+"""
+=============================================================================
+INCREMENTAL INDICATORS - O(1) UPDATE PER CLOSED BAR
+=============================================================================
+
+Per (symbol, timeframe) the bridge keeps running indicator state and feeds
+it only the bars that closed since the last update, so nothing is
+recomputed over the full window on each poll:
+
+    ema_<n>        exponential moving averages (seeded with the SMA of n bars)
+    atr_<n>        Wilder's average true range
+    body_ratio     |close - open| / range: last, p50, p90, percentile of last
+    range          high - low:             last, p50, p90, percentile of last
+    volume         tick volume: last, rolling mean/std, z-score of last
+
+Rolling statistics cover the last WINDOW closed bars. Percentiles use a
+sorted window (bisect insert/remove), the volume z-score running sums.
+State is seeded once from WARMUP_BARS of history.
+=============================================================================
+"""
+
+import bisect
+import math
+import threading
+from collections import deque
+
+from replay import TF_SECONDS
+
+
+EMA_PERIODS = (9, 21, 50)
+ATR_PERIOD = 14
+WINDOW = 100
+WARMUP_BARS = 500
+
+
+class RollingWindow:
+    """Last `size` values with running mean/std and sorted-order percentiles"""
+
+    def __init__(self, size):
+        self.size = size
+        self.values = deque()
+        self.sorted = []
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def push(self, value):
+        self.values.append(value)
+        bisect.insort(self.sorted, value)
+        self.total += value
+        self.total_sq += value * value
+        if len(self.values) > self.size:
+            old = self.values.popleft()
+            del self.sorted[bisect.bisect_left(self.sorted, old)]
+            self.total -= old
+            self.total_sq -= old * old
+
+    def percentile(self, q):
+        if not self.sorted:
+            return None
+        return self.sorted[min(len(self.sorted) - 1, int(q * len(self.sorted)))]
+
+    def rank(self, value):
+        """Share of the window at or below value (0..1)"""
+        if not self.sorted:
+            return None
+        return bisect.bisect_right(self.sorted, value) / len(self.sorted)
+
+    def mean(self):
+        return self.total / len(self.values) if self.values else None
+
+    def std(self):
+        n = len(self.values)
+        if n < 2:
+            return None
+        return math.sqrt(max(0.0, (self.total_sq - self.total * self.total / n) / (n - 1)))
+
+
+class SeriesIndicators:
+    """Indicator state for one (symbol, timeframe) series"""
+
+    def __init__(self, ema_periods=EMA_PERIODS, atr_period=ATR_PERIOD, window=WINDOW):
+        self.ema_periods = ema_periods
+        self.atr_period = atr_period
+        self.ema = {n: None for n in ema_periods}
+        self._ema_seed = {n: [] for n in ema_periods}
+        self.atr = None
+        self._atr_seed = []
+        self.prev_close = None
+        self.last_time = None
+        self.bars = 0
+        self.body_ratio = RollingWindow(window)
+        self.range = RollingWindow(window)
+        self.volume = RollingWindow(window)
+        self._last = None
+
+    def update(self, bar):
+        """Feed one closed bar (time, open, high, low, close, tick_volume)"""
+        o, h, l, c = float(bar['open']), float(bar['high']), float(bar['low']), float(bar['close'])
+        volume = float(bar['tick_volume'])
+
+        for n in self.ema_periods:
+            if self.ema[n] is None:
+                seed = self._ema_seed[n]
+                seed.append(c)
+                if len(seed) == n:
+                    self.ema[n] = sum(seed) / n
+                    self._ema_seed[n] = None
+            else:
+                alpha = 2.0 / (n + 1)
+                self.ema[n] += alpha * (c - self.ema[n])
+
+        span = h - l
+        true_range = span if self.prev_close is None else max(span, abs(h - self.prev_close), abs(l - self.prev_close))
+        if self.atr is None:
+            self._atr_seed.append(true_range)
+            if len(self._atr_seed) == self.atr_period:
+                self.atr = sum(self._atr_seed) / self.atr_period
+                self._atr_seed = None
+        else:
+            self.atr = (self.atr * (self.atr_period - 1) + true_range) / self.atr_period
+
+        ratio = abs(c - o) / span if span > 0 else 0.0
+        self.body_ratio.push(ratio)
+        self.range.push(span)
+        self.volume.push(volume)
+
+        self.prev_close = c
+        self.last_time = int(bar['time'])
+        self.bars += 1
+        self._last = (ratio, span, volume)
+
+    def snapshot(self):
+        if self._last is None:
+            return None
+        ratio, span, volume = self._last
+        mean, std = self.volume.mean(), self.volume.std()
+        out = {'time': self.last_time, 'bars': self.bars}
+        out.update({f'ema_{n}': self.ema[n] for n in self.ema_periods})
+        out[f'atr_{self.atr_period}'] = self.atr
+        out['body_ratio'] = {
+            'last': ratio, 'p50': self.body_ratio.percentile(0.5),
+            'p90': self.body_ratio.percentile(0.9), 'rank': self.body_ratio.rank(ratio),
+        }
+        out['range'] = {
+            'last': span, 'p50': self.range.percentile(0.5),
+            'p90': self.range.percentile(0.9), 'rank': self.range.rank(span),
+        }
+        out['volume'] = {
+            'last': volume, 'mean': mean, 'std': std,
+            'zscore': (volume - mean) / std if std else None,
+        }
+        return out
+
+
+class IndicatorEngine:
+    """SeriesIndicators per (symbol, timeframe), fed from the candle cache"""
+
+    def __init__(self, mt5, candle_cache, warmup=WARMUP_BARS):
+        self.mt5 = mt5
+        self.cache = candle_cache
+        self.warmup = warmup
+        self._series = {}
+        self._locks = {}            # (symbol, timeframe) -> lock held across its MT5 fetch
+        self._lock = threading.Lock()
+
+    def _series_lock(self, key):
+        with self._lock:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = self._locks[key] = threading.Lock()
+            return lock
+
+    def get(self, symbol, timeframe):
+        """
+        Bring the series up to the latest closed bar and return its snapshot.
+        None when MT5 has no data (last_error is left for the caller).
+        Only callers of the same series wait on each other's copy_rates calls.
+        """
+        key = (symbol, timeframe)
+        with self._series_lock(key):
+            state = self._series.get(key)
+            rates = self.cache.get(self.mt5, symbol, timeframe, 4 if state else self.warmup + 1)
+            if rates is None:
+                return None
+            if state is not None and len(rates) > 1 and state.last_time is not None:
+                # Missed more bars than the small fetch covers (e.g. not polled for a while)
+                first_closed = int(rates['time'][0])
+                if first_closed > state.last_time + TF_SECONDS[timeframe]:
+                    gap = (first_closed - state.last_time) // TF_SECONDS[timeframe] + 4
+                    rates = self.cache.get(self.mt5, symbol, timeframe, min(gap, self.warmup + 1))
+                    if rates is None:
+                        return None
+            if state is None:
+                state = SeriesIndicators()
+                with self._lock:
+                    self._series[key] = state
+            for bar in rates[:-1]:
+                if state.last_time is None or int(bar['time']) > state.last_time:
+                    state.update(bar)
+            return state.snapshot()
+
+    def tracked(self):
+        with self._lock:
+            return sorted(f"{s}:{tf}" for s, tf in self._series)
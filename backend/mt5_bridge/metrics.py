@@ -0,0 +1,283 @@
+"""
+=============================================================================
+BRIDGE METRICS - LATENCY HISTOGRAMS AND COUNTERS
+=============================================================================
+
+Answers "where does the time of a request go?":
+    - every Flask route is timed end-to-end (parse + MT5 + JSON)
+    - every MT5 call (copy_rates_from_pos, order_send, positions_get, ...)
+      is timed individually through InstrumentedMT5
+
+Histograms are HDR-style: log-linear buckets with 32 sub-buckets per power
+of two (~3% relative error), recorded in integer nanoseconds. Recording is
+O(1) and the memory footprint is bounded no matter how many samples arrive.
+
+Everything is exposed at /metrics in Prometheus text format.
+=============================================================================
+"""
+
+import threading
+import time
+
+from flask import g, request
+
+
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+def _bucket_index(value):
+    if value < SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return (shift + 1) * SUB_BUCKETS + ((value >> shift) - SUB_BUCKETS)
+
+
+def _bucket_upper(index):
+    if index < SUB_BUCKETS:
+        return index
+    shift = index // SUB_BUCKETS - 1
+    sub = index % SUB_BUCKETS + SUB_BUCKETS
+    return ((sub + 1) << shift) - 1
+
+
+# =============================================================================
+# METRIC TYPES
+# =============================================================================
+class Histogram:
+    """Log-linear latency histogram (values in nanoseconds)"""
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value_ns):
+        value_ns = max(0, int(value_ns))
+        index = _bucket_index(value_ns)
+        with self._lock:
+            self._counts[index] = self._counts.get(index, 0) + 1
+            self.count += 1
+            self.total += value_ns
+            if value_ns > self.max:
+                self.max = value_ns
+
+    def percentiles(self, quantiles=QUANTILES):
+        """Return {q: value_ns} using the highest equivalent value of each bucket"""
+        with self._lock:
+            counts = sorted(self._counts.items())
+            count = self.count
+            max_value = self.max
+        result = {}
+        if count == 0:
+            return {q: 0 for q in quantiles}
+        for q in quantiles:
+            target = max(1, int(q * count + 0.5))
+            seen = 0
+            for index, n in counts:
+                seen += n
+                if seen >= target:
+                    result[q] = min(_bucket_upper(index), max_value)
+                    break
+        return result
+
+    def snapshot(self):
+        pct = self.percentiles()
+        return {
+            'count': self.count,
+            'sum_ns': self.total,
+            'max_ns': self.max,
+            'p50_ns': pct[0.5],
+            'p90_ns': pct[0.9],
+            'p99_ns': pct[0.99],
+            'p999_ns': pct[0.999],
+        }
+
+
+class Counter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class MetricsRegistry:
+    """Named, labelled histograms and counters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._help = {}
+
+    def _get(self, store, factory, name, labels, help_text):
+        key = (name, tuple(sorted(labels.items())))
+        metric = store.get(key)
+        if metric is None:
+            with self._lock:
+                metric = store.get(key)
+                if metric is None:
+                    metric = factory()
+                    store[key] = metric
+                    if help_text:
+                        self._help.setdefault(name, help_text)
+        return metric
+
+    def histogram(self, name, help_text=None, **labels):
+        return self._get(self._histograms, Histogram, name, labels, help_text)
+
+    def counter(self, name, help_text=None, **labels):
+        return self._get(self._counters, Counter, name, labels, help_text)
+
+    def snapshot(self):
+        """Plain dict view, handy for JSON endpoints and benchmarks"""
+        return {
+            'histograms': [
+                {'name': name, 'labels': dict(labels), **h.snapshot()}
+                for (name, labels), h in list(self._histograms.items())
+            ],
+            'counters': [
+                {'name': name, 'labels': dict(labels), 'value': c.value}
+                for (name, labels), c in list(self._counters.items())
+            ],
+        }
+
+    def render_prometheus(self, extra_gauges=None):
+        """
+        Prometheus text exposition format (0.0.4).
+        Histograms are exported as summaries (quantiles + _sum + _count)
+        plus a <name>_max gauge, all in seconds.
+        """
+        lines = []
+        by_name = {}
+        for (name, labels), h in list(self._histograms.items()):
+            by_name.setdefault(name, []).append((labels, h))
+        for name in sorted(by_name):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} summary")
+            max_lines = []
+            for labels, h in by_name[name]:
+                pct = h.percentiles()
+                for q in QUANTILES:
+                    lines.append(f"{name}{_labels(labels, quantile=q)} {pct[q] / 1e9:.9f}")
+                lines.append(f"{name}_sum{_labels(labels)} {h.total / 1e9:.9f}")
+                lines.append(f"{name}_count{_labels(labels)} {h.count}")
+                max_lines.append(f"{name}_max{_labels(labels)} {h.max / 1e9:.9f}")
+            lines.append(f"# TYPE {name}_max gauge")
+            lines.extend(max_lines)
+
+        by_name = {}
+        for (name, labels), c in list(self._counters.items()):
+            by_name.setdefault(name, []).append((labels, c))
+        for name in sorted(by_name):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, c in by_name[name]:
+                lines.append(f"{name}{_labels(labels)} {c.value}")
+
+        for name, value in (extra_gauges or {}).items():
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels, **extra):
+    items = list(labels) + [(k, v) for k, v in extra.items()]
+    if not items:
+        return ''
+    inner = ','.join(f'{k}="{_escape(v)}"' for k, v in items)
+    return '{' + inner + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = MetricsRegistry()
+
+
+# =============================================================================
+# MT5 INSTRUMENTATION
+# =============================================================================
+class InstrumentedMT5:
+    """
+    Transparent proxy around the MT5 module (real or mock).
+    Callables are timed into mt5_call_seconds{function=...}; calls that
+    return None (the MT5 way of failing) are counted in mt5_call_none_total.
+    Constants such as TIMEFRAME_M15 pass straight through.
+    """
+
+    def __init__(self, mt5_module, metrics=None):
+        self._mt5 = mt5_module
+        self._metrics = metrics or registry
+        self._wrapped = {}
+
+    def __getattr__(self, name):
+        wrapped = self._wrapped.get(name)
+        if wrapped is not None:
+            return wrapped
+        attr = getattr(self._mt5, name)
+        if not callable(attr) or name.isupper():
+            return attr
+        hist = self._metrics.histogram(
+            'mt5_call_seconds', 'Latency of MetaTrader5 API calls', function=name)
+        errors = self._metrics.counter(
+            'mt5_call_errors_total', 'MetaTrader5 calls that raised', function=name)
+        nones = self._metrics.counter(
+            'mt5_call_none_total', 'MetaTrader5 calls that returned None', function=name)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                result = attr(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                hist.record(time.perf_counter_ns() - start)
+            if result is None:
+                nones.inc()
+            return result
+
+        timed.__name__ = name
+        self._wrapped[name] = timed
+        return timed
+
+
+# =============================================================================
+# FLASK INSTRUMENTATION
+# =============================================================================
+def instrument_app(app, metrics=None):
+    """Time every request into http_request_seconds{endpoint, method}"""
+    metrics = metrics or registry
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_start = time.perf_counter_ns()
+
+    @app.after_request
+    def _stop_timer(response):
+        start = getattr(g, '_metrics_start', None)
+        if start is not None:
+            endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+            metrics.histogram(
+                'http_request_seconds', 'Flask route latency incl. JSON serialization',
+                endpoint=endpoint, method=request.method,
+            ).record(time.perf_counter_ns() - start)
+            metrics.counter(
+                'http_requests_total', 'Requests by route and status',
+                endpoint=endpoint, method=request.method, status=response.status_code,
+            ).inc()
+        return response
+
+    return app
@@ -1,69 +1,1089 @@
+"""
+=============================================================================
+MT5 SIMULATOR - STATEFUL STAND-IN FOR THE MetaTrader5 MODULE
+=============================================================================
+
+Implements every MetaTrader5 call the bridge uses, backed by real state:
+    - account ledger     balance / equity / margin / margin_free / level
+    - position book      open positions keyed by ticket
+    - order book         pending limit / stop orders, filled when the quote
+                         crosses them, expired at their expiration time
+    - deal history       every fill, including SL/TP exits
+    - symbol specs       digits, point, contract size, volume limits,
+                         stops level, spread, filling modes
+
+Fills are deterministic: market orders fill at the current simulated quote,
+tickets come from counters and prices follow a seeded random walk. Every
+price update re-checks SL/TP of open positions and closes the ones hit.
+With an execution.ExecutionModel, deals instead fill after a latency, with
+slippage, deviation requotes and partial IOC fills against limited depth.
+
+Candles come from market_data.generate_rates() as NumPy structured arrays
+(same dtype as the real API). Each (symbol, timeframe) history is generated
+once, then extended forward as bars close and backward when a request needs
+more history, so repeated calls see the same bars.
+
+REPLAY MODE: give the simulator a replay.ReplayFeed and a SimClock and it
+answers from recorded candles/ticks instead (see create_replay_simulator).
+
+Results are named tuples with the same field names as the real API, so
+server.py can't tell the difference (except account/server names).
+
+ONLY FOR TESTING / BENCHMARKING - selected with USE_MOCK_MT5=true.
+=============================================================================
+"""
+
+import fnmatch
+import math
 import random
+import threading
 import time
-from datetime import datetime, timedelta
+import zlib
+from collections import namedtuple
+from datetime import datetime
 
-# Mock constants
+import numpy as np
+
+from market_data import generate_rates, rescale
+from replay import ReplayFeed, SimClock
+
+# Mock constants (same values as the MetaTrader5 package)
 TIMEFRAME_M1 = 1
 TIMEFRAME_M5 = 5
 TIMEFRAME_M15 = 15
+TIMEFRAME_M30 = 30
 TIMEFRAME_H1 = 16385  # MT5 constant for H1
+TIMEFRAME_H4 = 16388
+TIMEFRAME_D1 = 16408
+
 ORDER_TYPE_BUY = 0
 ORDER_TYPE_SELL = 1
+ORDER_TYPE_BUY_LIMIT = 2
+ORDER_TYPE_SELL_LIMIT = 3
+ORDER_TYPE_BUY_STOP = 4
+ORDER_TYPE_SELL_STOP = 5
+POSITION_TYPE_BUY = 0
+POSITION_TYPE_SELL = 1
+
 TRADE_ACTION_DEAL = 1
+TRADE_ACTION_PENDING = 5
+TRADE_ACTION_SLTP = 6
+TRADE_ACTION_MODIFY = 7
+TRADE_ACTION_REMOVE = 8
+
+TRADE_RETCODE_REQUOTE = 10004
+TRADE_RETCODE_REJECT = 10006
+TRADE_RETCODE_PLACED = 10008
 TRADE_RETCODE_DONE = 10009
+TRADE_RETCODE_DONE_PARTIAL = 10010
+TRADE_RETCODE_INVALID = 10013
+TRADE_RETCODE_INVALID_VOLUME = 10014
+TRADE_RETCODE_INVALID_PRICE = 10015
+TRADE_RETCODE_INVALID_STOPS = 10016
+TRADE_RETCODE_NO_MONEY = 10019
+TRADE_RETCODE_PRICE_CHANGED = 10020
+TRADE_RETCODE_PRICE_OFF = 10021
+TRADE_RETCODE_INVALID_EXPIRATION = 10022
+TRADE_RETCODE_NO_CHANGES = 10025
+TRADE_RETCODE_INVALID_FILL = 10030
+TRADE_RETCODE_POSITION_CLOSED = 10036
+
+ORDER_TIME_GTC = 0
+ORDER_TIME_SPECIFIED = 2
+ORDER_FILLING_FOK = 0
+ORDER_FILLING_IOC = 1
+ORDER_FILLING_RETURN = 2
+
+ORDER_STATE_PLACED = 1
+ORDER_STATE_CANCELED = 2
+ORDER_STATE_FILLED = 4
+ORDER_STATE_REJECTED = 5
+ORDER_STATE_EXPIRED = 6
+
+SYMBOL_FILLING_FOK = 1
+SYMBOL_FILLING_IOC = 2
+
+SYMBOL_TRADE_MODE_DISABLED = 0
+SYMBOL_TRADE_MODE_LONGONLY = 1
+SYMBOL_TRADE_MODE_SHORTONLY = 2
+SYMBOL_TRADE_MODE_CLOSEONLY = 3
+SYMBOL_TRADE_MODE_FULL = 4
+
+DEAL_TYPE_BUY = 0
+DEAL_TYPE_SELL = 1
+DEAL_ENTRY_IN = 0
+DEAL_ENTRY_OUT = 1
+DEAL_REASON_EXPERT = 3
+DEAL_REASON_SL = 4
+DEAL_REASON_TP = 5
+
+RES_S_OK = 1
+RES_E_FAIL = -1
+RES_E_INVALID_PARAMS = -2
+RES_E_NOT_FOUND = -4
+
+TIMEFRAME_NAMES = {
+    TIMEFRAME_M1: 'M1', TIMEFRAME_M5: 'M5', TIMEFRAME_M15: 'M15', TIMEFRAME_M30: 'M30',
+    TIMEFRAME_H1: 'H1', TIMEFRAME_H4: 'H4', TIMEFRAME_D1: 'D1',
+}
+
+TIMEFRAME_MINUTES = {
+    TIMEFRAME_M1: 1,
+    TIMEFRAME_M5: 5,
+    TIMEFRAME_M15: 15,
+    TIMEFRAME_M30: 30,
+    TIMEFRAME_H1: 60,
+    TIMEFRAME_H4: 240,
+    TIMEFRAME_D1: 1440,
+}
+
+
+# =============================================================================
+# RESULT TYPES (field names match the MetaTrader5 package)
+# =============================================================================
+AccountInfo = namedtuple('AccountInfo', [
+    'login', 'trade_mode', 'leverage', 'limit_orders', 'margin_so_mode', 'trade_allowed',
+    'trade_expert', 'margin_mode', 'currency_digits', 'fifo_close', 'balance', 'credit',
+    'profit', 'equity', 'margin', 'margin_free', 'margin_level', 'margin_so_call',
+    'margin_so_so', 'name', 'server', 'currency', 'company',
+])
+
+SymbolInfo = namedtuple('SymbolInfo', [
+    'name', 'description', 'path', 'visible', 'select', 'digits', 'spread', 'point',
+    'trade_contract_size', 'trade_tick_size', 'trade_tick_value', 'volume_min', 'volume_max',
+    'volume_step', 'trade_stops_level', 'trade_freeze_level', 'filling_mode', 'bid', 'ask',
+    'currency_base', 'currency_profit', 'currency_margin', 'trade_mode',
+])
+
+Tick = namedtuple('Tick', ['time', 'bid', 'ask', 'last', 'volume', 'time_msc', 'flags', 'volume_real'])
+
+TradePosition = namedtuple('TradePosition', [
+    'ticket', 'time', 'time_msc', 'time_update', 'time_update_msc', 'type', 'magic',
+    'identifier', 'reason', 'volume', 'price_open', 'sl', 'tp', 'price_current', 'swap',
+    'profit', 'symbol', 'comment', 'external_id',
+])
+
+TradeDeal = namedtuple('TradeDeal', [
+    'ticket', 'order', 'time', 'time_msc', 'type', 'entry', 'magic', 'position_id', 'reason',
+    'volume', 'price', 'commission', 'swap', 'profit', 'fee', 'symbol', 'comment', 'external_id',
+])
+
+TradeOrder = namedtuple('TradeOrder', [
+    'ticket', 'time_setup', 'time_setup_msc', 'time_done', 'time_done_msc', 'time_expiration',
+    'type', 'type_time', 'type_filling', 'state', 'magic', 'position_id', 'position_by_id',
+    'reason', 'volume_initial', 'volume_current', 'price_open', 'sl', 'tp', 'price_current',
+    'price_stoplimit', 'symbol', 'comment', 'external_id',
+])
+
+OrderCheckResult = namedtuple('OrderCheckResult', [
+    'retcode', 'balance', 'equity', 'profit', 'margin', 'margin_free', 'margin_level', 'comment',
+    'request',
+])
+
+OrderSendResult = namedtuple('OrderSendResult', [
+    'retcode', 'deal', 'order', 'volume', 'price', 'bid', 'ask', 'comment', 'request_id',
+    'retcode_external', 'request',
+])
+
+
+# =============================================================================
+# SYMBOL SPECS
+# =============================================================================
+# name: (description, digits, contract_size, volume_step, stops_level, spread_points, base_price)
+DEFAULT_SYMBOLS = {
+    'EURUSD': ('Euro vs US Dollar', 5, 100000.0, 0.01, 10, 12, 1.1000),
+    'GBPUSD': ('Great Britain Pound vs US Dollar', 5, 100000.0, 0.01, 10, 15, 1.2700),
+    'USDJPY': ('US Dollar vs Japanese Yen', 3, 100000.0, 0.01, 10, 14, 150.000),
+    'XAUUSD': ('Gold vs US Dollar', 2, 100.0, 0.01, 20, 25, 2000.00),
+    'BTCUSD': ('Bitcoin vs US Dollar', 2, 1.0, 0.01, 100, 1500, 60000.00),
+    'ETHUSD': ('Ethereum vs US Dollar', 2, 1.0, 0.01, 100, 250, 3000.00),
+}
+
+
+class SymbolSpec:
+    def __init__(self, name, description, digits, contract_size, volume_step,
+                 stops_level, spread_points, base_price, volume_min=0.01, volume_max=100.0,
+                 filling_mode=SYMBOL_FILLING_FOK | SYMBOL_FILLING_IOC):
+        self.name = name
+        self.description = description
+        self.digits = digits
+        self.point = 10 ** -digits
+        self.contract_size = contract_size
+        self.volume_min = volume_min
+        self.volume_max = volume_max
+        self.volume_step = volume_step
+        self.stops_level = stops_level
+        self.spread_points = spread_points
+        self.base_price = base_price
+        self.filling_mode = filling_mode
+        if name[3:6] == 'USD' or len(name) != 6:
+            self.currency_base, self.currency_profit = name[:3], 'USD'
+        else:
+            self.currency_base, self.currency_profit = name[:3], name[3:6]
+
+    def to_account(self, amount, price):
+        """Convert an amount in the profit currency to USD"""
+        if self.currency_profit == 'USD':
+            return amount
+        return amount / price if self.currency_base == 'USD' else amount
+
+
+# =============================================================================
+# SIMULATOR
+# =============================================================================
+class MT5Simulator:
+    # server.py reads constants from the module object it was given
+    TIMEFRAME_M1 = TIMEFRAME_M1
+    TIMEFRAME_M5 = TIMEFRAME_M5
+    TIMEFRAME_M15 = TIMEFRAME_M15
+    TIMEFRAME_M30 = TIMEFRAME_M30
+    TIMEFRAME_H1 = TIMEFRAME_H1
+    TIMEFRAME_H4 = TIMEFRAME_H4
+    TIMEFRAME_D1 = TIMEFRAME_D1
+    ORDER_TYPE_BUY = ORDER_TYPE_BUY
+    ORDER_TYPE_SELL = ORDER_TYPE_SELL
+    ORDER_TYPE_BUY_LIMIT = ORDER_TYPE_BUY_LIMIT
+    ORDER_TYPE_SELL_LIMIT = ORDER_TYPE_SELL_LIMIT
+    ORDER_TYPE_BUY_STOP = ORDER_TYPE_BUY_STOP
+    ORDER_TYPE_SELL_STOP = ORDER_TYPE_SELL_STOP
+    POSITION_TYPE_BUY = POSITION_TYPE_BUY
+    POSITION_TYPE_SELL = POSITION_TYPE_SELL
+    TRADE_ACTION_DEAL = TRADE_ACTION_DEAL
+    TRADE_ACTION_PENDING = TRADE_ACTION_PENDING
+    TRADE_ACTION_SLTP = TRADE_ACTION_SLTP
+    TRADE_ACTION_MODIFY = TRADE_ACTION_MODIFY
+    TRADE_ACTION_REMOVE = TRADE_ACTION_REMOVE
+    TRADE_RETCODE_REQUOTE = TRADE_RETCODE_REQUOTE
+    TRADE_RETCODE_REJECT = TRADE_RETCODE_REJECT
+    TRADE_RETCODE_PLACED = TRADE_RETCODE_PLACED
+    TRADE_RETCODE_DONE = TRADE_RETCODE_DONE
+    TRADE_RETCODE_DONE_PARTIAL = TRADE_RETCODE_DONE_PARTIAL
+    TRADE_RETCODE_INVALID = TRADE_RETCODE_INVALID
+    TRADE_RETCODE_INVALID_VOLUME = TRADE_RETCODE_INVALID_VOLUME
+    TRADE_RETCODE_INVALID_PRICE = TRADE_RETCODE_INVALID_PRICE
+    TRADE_RETCODE_INVALID_STOPS = TRADE_RETCODE_INVALID_STOPS
+    TRADE_RETCODE_NO_MONEY = TRADE_RETCODE_NO_MONEY
+    TRADE_RETCODE_PRICE_CHANGED = TRADE_RETCODE_PRICE_CHANGED
+    TRADE_RETCODE_PRICE_OFF = TRADE_RETCODE_PRICE_OFF
+    TRADE_RETCODE_INVALID_EXPIRATION = TRADE_RETCODE_INVALID_EXPIRATION
+    TRADE_RETCODE_NO_CHANGES = TRADE_RETCODE_NO_CHANGES
+    TRADE_RETCODE_INVALID_FILL = TRADE_RETCODE_INVALID_FILL
+    TRADE_RETCODE_POSITION_CLOSED = TRADE_RETCODE_POSITION_CLOSED
+    ORDER_TIME_GTC = ORDER_TIME_GTC
+    ORDER_TIME_SPECIFIED = ORDER_TIME_SPECIFIED
+    ORDER_STATE_PLACED = ORDER_STATE_PLACED
+    ORDER_STATE_CANCELED = ORDER_STATE_CANCELED
+    ORDER_STATE_FILLED = ORDER_STATE_FILLED
+    ORDER_STATE_REJECTED = ORDER_STATE_REJECTED
+    ORDER_STATE_EXPIRED = ORDER_STATE_EXPIRED
+    ORDER_FILLING_FOK = ORDER_FILLING_FOK
+    ORDER_FILLING_IOC = ORDER_FILLING_IOC
+    ORDER_FILLING_RETURN = ORDER_FILLING_RETURN
+    SYMBOL_FILLING_FOK = SYMBOL_FILLING_FOK
+    SYMBOL_FILLING_IOC = SYMBOL_FILLING_IOC
+    SYMBOL_TRADE_MODE_DISABLED = SYMBOL_TRADE_MODE_DISABLED
+    SYMBOL_TRADE_MODE_LONGONLY = SYMBOL_TRADE_MODE_LONGONLY
+    SYMBOL_TRADE_MODE_SHORTONLY = SYMBOL_TRADE_MODE_SHORTONLY
+    SYMBOL_TRADE_MODE_CLOSEONLY = SYMBOL_TRADE_MODE_CLOSEONLY
+    SYMBOL_TRADE_MODE_FULL = SYMBOL_TRADE_MODE_FULL
+    DEAL_TYPE_BUY = DEAL_TYPE_BUY
+    DEAL_TYPE_SELL = DEAL_TYPE_SELL
+    DEAL_ENTRY_IN = DEAL_ENTRY_IN
+    DEAL_ENTRY_OUT = DEAL_ENTRY_OUT
+
+    def __init__(self, seed=42, balance=10000.0, leverage=100, symbols=None,
+                 auto_tick=True, clock=time.time, volatility=0.0006, doji_frequency=0.1,
+                 history_bars=5000, replay=None, execution=None):
+        """
+        seed            - seeds price walk and candle generation (deterministic runs)
+        auto_tick       - every symbol_info_tick() call advances that symbol one step,
+                          so prices move (and SL/TP trigger) while the bridge runs
+        clock           - callable returning the current (simulated) unix time
+        volatility      - per-bar log return std dev on M15 (scaled by sqrt(time))
+        doji_frequency  - share of generated candles that are dojis
+        history_bars    - bars generated up front per (symbol, timeframe)
+        replay          - ReplayFeed; prices and candles then come from recorded
+                          data as of clock() and the random walk is off
+        execution       - ExecutionModel for deals (None: instant full fills)
+        """
+        self._lock = threading.RLock()
+        self._rng = random.Random(seed)
+        self.seed = seed
+        self.replay = replay
+        self.execution = execution
+        self.auto_tick = auto_tick and replay is None
+        self.clock = clock
+        self.volatility = volatility
+        self.doji_frequency = doji_frequency
+        self.history_bars = history_bars
+        self._rates = {}
+        self.connected = False
+        self.leverage = leverage
+        self.balance = float(balance)
+        self.specs = {}
+        self.prices = {}
+        self.asks = {}
+        self._synced = {}
+        self.selected = set()
+        self.positions = {}
+        self.orders = {}
+        self.order_history = []
+        self.deals = []
+        self._next_ticket = 1000000
+        self._next_deal = 2000000
+        self._last_error = (RES_S_OK, 'Success')
+
+        for name, params in (symbols or DEFAULT_SYMBOLS).items():
+            self.add_symbol(name, *params)
+        if replay is not None:
+            self._add_replay_symbols()
+
+    # -------------------------------------------------------------------------
+    # Setup helpers (not part of the MT5 API)
+    # -------------------------------------------------------------------------
+    def add_symbol(self, name, description, digits, contract_size, volume_step,
+                   stops_level, spread_points, base_price, **kwargs):
+        spec = SymbolSpec(name, description, digits, contract_size, volume_step,
+                          stops_level, spread_points, base_price, **kwargs)
+        with self._lock:
+            self.specs[name] = spec
+            self.prices[name] = base_price
+            self.selected.add(name)
+        return spec
+
+    def _add_replay_symbols(self):
+        """Symbols recorded in the feed but without a spec get a generic one"""
+        start = self.clock()
+        for name in self.replay.symbols():
+            quote = self.replay.quote(name, start) or self.replay.quote(name, self.replay.start_time())
+            bid = quote[0] if quote else 1.0
+            if name not in self.specs:
+                digits = 5 if bid < 10 else 3 if bid < 1000 else 2
+                self.add_symbol(name, name, digits, 100000.0 if digits == 5 else 100.0, 0.01, 10, 10, bid)
+            self._sync(name)
+
+    def _sync(self, symbol):
+        """Replay mode: move the symbol to the recorded quote at clock() and run SL/TP"""
+        if self.replay is None:
+            return
+        t = self.clock()
+        spec = self.specs[symbol]
+        quote = self.replay.quote(symbol, t, spec.point, spec.digits)
+        if quote is None:
+            return
+        last = self._synced.get(symbol)
+        touched = self.replay.bid_range(symbol, last, t) if last is not None and t > last else None
+        self.prices[symbol], self.asks[symbol] = quote
+        self._synced[symbol] = t
+        self._check_stops(symbol, touched)
+
+    def set_price(self, symbol, bid):
+        """Move a symbol's bid to an exact price and run SL/TP checks"""
+        with self._lock:
+            self.prices[symbol] = bid
+            self._check_stops(symbol)
+
+    def advance(self, steps=1, symbol=None):
+        """Advance the seeded random walk for one or all symbols"""
+        with self._lock:
+            for name in ([symbol] if symbol else list(self.specs)):
+                spec = self.specs[name]
+                price = self.prices[name]
+                for _ in range(steps):
+                    price += self._rng.gauss(0.0, spec.point * 5)
+                self.prices[name] = round(max(price, spec.point), spec.digits)
+                self._check_stops(name)
+
+    def seed_positions(self, count, symbol='EURUSD'):
+        """Replace the position book with `count` open positions (benchmarks)"""
+        with self._lock:
+            self.positions = {}
+            for i in range(count):
+                side = POSITION_TYPE_BUY if i % 2 == 0 else POSITION_TYPE_SELL
+                self._open_position(symbol, side, 0.01, self._quote(symbol)[side], 0.0, 0.0,
+                                    234000, 'DojiHunter AI', ticket=500000 + i)
+
+    # -------------------------------------------------------------------------
+    # Internals
+    # -------------------------------------------------------------------------
+    def _fail(self, code, message, result=None):
+        self._last_error = (code, message)
+        return result
+
+    def _quote(self, symbol):
+        """(ask, bid) - indexed by position/order type: BUY fills at ask, SELL at bid"""
+        bid = self.prices[symbol]
+        ask = self.asks.get(symbol)
+        if ask is None:
+            spec = self.specs[symbol]
+            ask = round(bid + spec.spread_points * spec.point, spec.digits)
+        return ask, bid
+
+    def _fill_quote(self, symbol, latency, slept):
+        """(ask, bid) when a deal sent `latency` seconds ago reaches the market"""
+        spec = self.specs[symbol]
+        if self.replay is not None:
+            if latency and not slept:
+                quote = self.replay.quote(symbol, self.clock() + latency, spec.point, spec.digits)
+                if quote is not None:
+                    return quote[1], quote[0]
+            return self._quote(symbol)
+        drift = self.execution.drift(spec.point, latency)
+        if drift:
+            self.prices[symbol] = round(max(self.prices[symbol] + drift, spec.point), spec.digits)
+            self._check_stops(symbol)
+        return self._quote(symbol)
+
+    def _ticket(self):
+        self._next_ticket += 1
+        return self._next_ticket
+
+    def _position_profit(self, pos, bid, ask):
+        spec = self.specs[pos['symbol']]
+        if pos['type'] == POSITION_TYPE_BUY:
+            current, diff = bid, bid - pos['price_open']
+        else:
+            current, diff = ask, pos['price_open'] - ask
+        return current, spec.to_account(diff * pos['volume'] * spec.contract_size, current)
+
+    def _margin(self, symbol, volume, price):
+        spec = self.specs[symbol]
+        if spec.currency_base == 'USD':
+            notional = volume * spec.contract_size
+        else:
+            notional = spec.to_account(volume * spec.contract_size * price, price)
+        return notional / self.leverage
+
+    def _account_totals(self):
+        floating = 0.0
+        margin = 0.0
+        for pos in self.positions.values():
+            ask, bid = self._quote(pos['symbol'])
+            _, profit = self._position_profit(pos, bid, ask)
+            floating += profit
+            margin += self._margin(pos['symbol'], pos['volume'], pos['price_open'])
+        return floating, margin
+
+    def _record_deal(self, pos, deal_type, entry, volume, price, profit, reason, comment, order=0):
+        self._next_deal += 1
+        now = self.clock()
+        self.deals.append(TradeDeal(
+            ticket=self._next_deal, order=order or pos['ticket'], time=int(now),
+            time_msc=int(now * 1000), type=deal_type, entry=entry, magic=pos['magic'],
+            position_id=pos['ticket'], reason=reason, volume=volume, price=price,
+            commission=0.0, swap=0.0, profit=round(profit, 2), fee=0.0,
+            symbol=pos['symbol'], comment=comment, external_id='',
+        ))
+        return self._next_deal
 
-class MT5Mock:
-    def initialize(self):
-        print("MT5 Mock initialized")
+    def _open_position(self, symbol, side, volume, price, sl, tp, magic, comment, ticket=None):
+        ticket = ticket or self._ticket()
+        now = self.clock()
+        pos = {
+            'ticket': ticket, 'symbol': symbol, 'type': side, 'volume': volume,
+            'price_open': price, 'sl': sl, 'tp': tp, 'magic': magic, 'comment': comment,
+            'time': int(now), 'time_msc': int(now * 1000),
+        }
+        self.positions[ticket] = pos
+        deal = self._record_deal(pos, DEAL_TYPE_BUY if side == POSITION_TYPE_BUY else DEAL_TYPE_SELL,
+                                 DEAL_ENTRY_IN, volume, price, 0.0, DEAL_REASON_EXPERT, comment)
+        return pos, deal
+
+    def _close_position(self, pos, volume, price, reason, comment):
+        spec = self.specs[pos['symbol']]
+        diff = price - pos['price_open'] if pos['type'] == POSITION_TYPE_BUY else pos['price_open'] - price
+        profit = spec.to_account(diff * volume * spec.contract_size, price)
+        self.balance = round(self.balance + profit, 2)
+        deal_type = DEAL_TYPE_SELL if pos['type'] == POSITION_TYPE_BUY else DEAL_TYPE_BUY
+        deal = self._record_deal(pos, deal_type, DEAL_ENTRY_OUT, volume, price, profit, reason, comment)
+        remaining = round(pos['volume'] - volume, 8)
+        if remaining <= 0:
+            del self.positions[pos['ticket']]
+        else:
+            pos['volume'] = remaining
+        return deal, profit
+
+    def _check_stops(self, symbol, touched=None):
+        """
+        Close positions whose SL or TP has been hit.
+        touched = (low, high) of the bid since the last check (replay mode), so a
+        stop touched between two polls still fills - at the stop price.
+        """
+        ask, bid = self._quote(symbol)
+        spread = ask - bid
+        low, high = touched if touched else (bid, bid)
+        low, high = min(low, bid), max(high, bid)
+        if self.orders:
+            self._trigger_orders(symbol, ask, bid, low, high)
+        for pos in list(self.positions.values()):
+            if pos['symbol'] != symbol:
+                continue
+            sl, tp = pos['sl'], pos['tp']
+            if pos['type'] == POSITION_TYPE_BUY:
+                if sl and low <= sl:
+                    self._close_position(pos, pos['volume'], min(bid, sl), DEAL_REASON_SL, f"[sl {sl}]")
+                elif tp and high >= tp:
+                    self._close_position(pos, pos['volume'], max(bid, tp), DEAL_REASON_TP, f"[tp {tp}]")
+            else:
+                if sl and high + spread >= sl:
+                    self._close_position(pos, pos['volume'], max(ask, sl), DEAL_REASON_SL, f"[sl {sl}]")
+                elif tp and low + spread <= tp:
+                    self._close_position(pos, pos['volume'], min(ask, tp), DEAL_REASON_TP, f"[tp {tp}]")
+
+    def _trigger_orders(self, symbol, ask, bid, low, high):
+        """Fill pending orders the quote crossed (limits at their price or better), expire old ones"""
+        spread = ask - bid
+        now = self.clock()
+        for order in list(self.orders.values()):
+            if order['symbol'] != symbol:
+                continue
+            if order['type_time'] == ORDER_TIME_SPECIFIED and order['expiration'] and now >= order['expiration']:
+                self._finish_order(order, ORDER_STATE_EXPIRED)
+                continue
+            kind, price = order['type'], order['price']
+            if kind == ORDER_TYPE_BUY_LIMIT and low + spread <= price:
+                fill = min(ask, price)
+            elif kind == ORDER_TYPE_SELL_LIMIT and high >= price:
+                fill = max(bid, price)
+            elif kind == ORDER_TYPE_BUY_STOP and high + spread >= price:
+                fill = max(ask, price)
+            elif kind == ORDER_TYPE_SELL_STOP and low <= price:
+                fill = min(bid, price)
+            else:
+                continue
+            side = POSITION_TYPE_BUY if kind in (ORDER_TYPE_BUY_LIMIT, ORDER_TYPE_BUY_STOP) else POSITION_TYPE_SELL
+            floating, margin = self._account_totals()
+            if self.balance + floating - margin < self._margin(symbol, order['volume'], fill):
+                self._finish_order(order, ORDER_STATE_REJECTED)
+                continue
+            self._open_position(symbol, side, order['volume'], fill, order['sl'], order['tp'],
+                                order['magic'], order['comment'], ticket=order['ticket'])
+            self._finish_order(order, ORDER_STATE_FILLED)
+
+    def _finish_order(self, order, state):
+        del self.orders[order['ticket']]
+        now = self.clock()
+        self.order_history.append({**order, 'state': state, 'time_done': int(now), 'time_done_msc': int(now * 1000)})
+
+    def _pending_price_valid(self, symbol, kind, price):
+        """Limit orders below/above the market, stop orders beyond it, by at least the stops level"""
+        spec = self.specs[symbol]
+        ask, bid = self._quote(symbol)
+        min_dist = spec.stops_level * spec.point - spec.point / 2
+        return {
+            ORDER_TYPE_BUY_LIMIT: ask - price >= min_dist,
+            ORDER_TYPE_SELL_LIMIT: price - bid >= min_dist,
+            ORDER_TYPE_BUY_STOP: price - ask >= min_dist,
+            ORDER_TYPE_SELL_STOP: bid - price >= min_dist,
+        }[kind]
+
+    def _stops_valid(self, symbol, side, price, sl, tp):
+        spec = self.specs[symbol]
+        min_dist = spec.stops_level * spec.point
+        if side == POSITION_TYPE_BUY:
+            if sl and sl > price - min_dist:
+                return False
+            if tp and tp < price + min_dist:
+                return False
+        else:
+            if sl and sl < price + min_dist:
+                return False
+            if tp and tp > price - min_dist:
+                return False
+        return True
+
+    def _volume_valid(self, spec, volume):
+        if volume < spec.volume_min - 1e-9 or volume > spec.volume_max + 1e-9:
+            return False
+        steps = volume / spec.volume_step
+        return abs(steps - round(steps)) < 1e-6
+
+    def _result(self, request, retcode, comment, deal=0, order=0, volume=0.0, price=0.0):
+        symbol = request.get('symbol')
+        ask, bid = self._quote(symbol) if symbol in self.specs else (0.0, 0.0)
+        return OrderSendResult(retcode=retcode, deal=deal, order=order, volume=volume,
+                               price=price, bid=bid, ask=ask, comment=comment, request_id=0,
+                               retcode_external=0, request=dict(request))
+
+    # -------------------------------------------------------------------------
+    # MT5 API: connection
+    # -------------------------------------------------------------------------
+    def initialize(self, *args, **kwargs):
+        self.connected = True
+        self._last_error = (RES_S_OK, 'Success')
         return True
 
     def shutdown(self):
-        print("MT5 Mock shutdown")
+        self.connected = False
 
-    def copy_rates_from_pos(self, symbol, timeframe, start_pos, count):
-        # Generate dummy candle data
-        rates = []
-        current_time = datetime.now()
-        # Approximate timeframe in minutes
-        tf_minutes = 15
-        if timeframe == TIMEFRAME_M1: tf_minutes = 1
-        elif timeframe == TIMEFRAME_M5: tf_minutes = 5
-        
-        base_price = 1.1000 if "EUR" in symbol else 2000.0
-        
-        for i in range(count):
-            t = current_time - timedelta(minutes=tf_minutes * (count - i))
-            open_price = base_price + random.uniform(-0.0005, 0.0005)
-            close_price = base_price + random.uniform(-0.0005, 0.0005)
-            high = max(open_price, close_price) + random.uniform(0, 0.0002)
-            low = min(open_price, close_price) - random.uniform(0, 0.0002)
-            
-            # Simulate a doji occasionally (very small body)
-            if random.random() < 0.1:
-                close_price = open_price + random.uniform(-0.00001, 0.00001)
-            
-            rate = (t.timestamp(), open_price, high, low, close_price, 100, 0, 0)
-            # MT5 returns numpy array usually, but list of tuples/structs is fine for JSON serialization
-            rates.append(rate)
-            base_price = close_price
-            
-        return rates
+    def last_error(self):
+        return self._last_error
+
+    def account_info(self):
+        if not self.connected:
+            return self._fail(RES_E_FAIL, 'Terminal not initialized')
+        with self._lock:
+            for symbol in {p['symbol'] for p in self.positions.values()}:
+                self._sync(symbol)
+            floating, margin = self._account_totals()
+            equity = round(self.balance + floating, 2)
+            return AccountInfo(
+                login=10000001, trade_mode=0, leverage=self.leverage, limit_orders=200,
+                margin_so_mode=0, trade_allowed=True, trade_expert=True, margin_mode=2,
+                currency_digits=2, fifo_close=False, balance=self.balance, credit=0.0,
+                profit=round(floating, 2), equity=equity, margin=round(margin, 2),
+                margin_free=round(equity - margin, 2),
+                margin_level=round(equity / margin * 100, 2) if margin else 0.0,
+                margin_so_call=50.0, margin_so_so=30.0, name='Simulator Account',
+                server='MT5Simulator', currency='USD', company='DojiHunter Simulator',
+            )
+
+    # -------------------------------------------------------------------------
+    # MT5 API: symbols and market data
+    # -------------------------------------------------------------------------
+    def symbols_total(self):
+        return len(self.specs)
+
+    def symbols_get(self, group=None):
+        names = sorted(self.specs)
+        if group:
+            patterns = [p.strip() for p in group.split(',') if p.strip()]
+            selected = []
+            for name in names:
+                keep = False
+                for pattern in patterns:
+                    if pattern.startswith('!'):
+                        if fnmatch.fnmatchcase(name, pattern[1:]):
+                            keep = False
+                    elif fnmatch.fnmatchcase(name, pattern):
+                        keep = True
+                if keep:
+                    selected.append(name)
+            names = selected
+        return tuple(self.symbol_info(name) for name in names)
+
+    def symbol_info(self, symbol):
+        spec = self.specs.get(symbol)
+        if spec is None:
+            return self._fail(RES_E_NOT_FOUND, f'Symbol {symbol} not found')
+        ask, bid = self._quote(symbol)
+        return SymbolInfo(
+            name=spec.name, description=spec.description, path=f'Simulator\\{spec.name}',
+            visible=symbol in self.selected, select=symbol in self.selected,
+            digits=spec.digits, spread=spec.spread_points, point=spec.point,
+            trade_contract_size=spec.contract_size, trade_tick_size=spec.point,
+            trade_tick_value=spec.to_account(spec.contract_size * spec.point, bid),
+            volume_min=spec.volume_min, volume_max=spec.volume_max, volume_step=spec.volume_step,
+            trade_stops_level=spec.stops_level, trade_freeze_level=0,
+            filling_mode=spec.filling_mode, bid=bid, ask=ask,
+            currency_base=spec.currency_base, currency_profit=spec.currency_profit,
+            currency_margin=spec.currency_base, trade_mode=SYMBOL_TRADE_MODE_FULL,
+        )
+
+    def symbol_select(self, symbol, enable=True):
+        if symbol not in self.specs:
+            return self._fail(RES_E_NOT_FOUND, f'Symbol {symbol} not found', False)
+        with self._lock:
+            if enable:
+                self.selected.add(symbol)
+            else:
+                self.selected.discard(symbol)
+        return True
 
     def symbol_info_tick(self, symbol):
-        class Tick:
-            def __init__(self):
-                self.ask = 1.1005
-                self.bid = 1.1000
-        return Tick()
+        if symbol not in self.specs:
+            return self._fail(RES_E_NOT_FOUND, f'Symbol {symbol} not found')
+        with self._lock:
+            if self.replay is not None:
+                self._sync(symbol)
+            elif self.auto_tick:
+                self.advance(1, symbol)
+            ask, bid = self._quote(symbol)
+        now = self.clock()
+        return Tick(time=int(now), bid=bid, ask=ask, last=0.0, volume=0,
+                    time_msc=int(now * 1000), flags=6, volume_real=0.0)
+
+    def _series(self, symbol, timeframe, needed):
+        """Cached bar history for (symbol, timeframe), extended on demand"""
+        spec = self.specs[symbol]
+        minutes = TIMEFRAME_MINUTES[timeframe]
+        bar_seconds = minutes * 60
+        current = int(self.clock()) // bar_seconds * bar_seconds
+        stream = [self.seed, zlib.crc32(symbol.encode()), timeframe]
+        params = dict(timeframe_seconds=bar_seconds, volatility=self.volatility * math.sqrt(minutes / 15),
+                      spread_points=spec.spread_points, digits=spec.digits,
+                      doji_frequency=self.doji_frequency)
+
+        with self._lock:
+            series = self._rates.get((symbol, timeframe))
+            if series is None:
+                series = generate_rates(max(needed, self.history_bars), base_price=spec.base_price,
+                                        end_time=current, seed=stream, **params)
+                # Line the latest candle up with the live quote
+                rescale(series, self.prices[symbol] / series['close'][-1], spec.digits)
+            else:
+                last = int(series['time'][-1])
+                if current > last:
+                    newer = generate_rates((current - last) // bar_seconds, base_price=series['close'][-1],
+                                           end_time=current, seed=stream + [last], **params)
+                    series = np.concatenate([series, newer])
+                if len(series) < needed:
+                    first = int(series['time'][0])
+                    older = generate_rates(needed - len(series), base_price=spec.base_price,
+                                           end_time=first - bar_seconds, seed=stream + [first], **params)
+                    rescale(older, series['open'][0] / older['close'][-1], spec.digits)
+                    series = np.concatenate([older, series])
+            self._rates[(symbol, timeframe)] = series
+        return series
+
+    def copy_rates_from_pos(self, symbol, timeframe, start_pos, count):
+        if symbol not in self.specs:
+            return self._fail(RES_E_NOT_FOUND, f'Symbol {symbol} not found')
+        if timeframe not in TIMEFRAME_MINUTES:
+            return self._fail(RES_E_INVALID_PARAMS, f'Invalid timeframe {timeframe}')
+        if start_pos < 0 or count <= 0:
+            return self._fail(RES_E_INVALID_PARAMS, 'Invalid start_pos/count')
+        if self.replay is not None:
+            rates = self.replay.rates_at(symbol, TIMEFRAME_NAMES[timeframe], self.clock(),
+                                         start_pos, count, self.specs[symbol].digits)
+            if rates is None:
+                return self._fail(RES_E_NOT_FOUND, f'No recorded {TIMEFRAME_NAMES[timeframe]} data for {symbol}')
+            return rates
+
+        series = self._series(symbol, timeframe, start_pos + count)
+        end = len(series) - start_pos
+        return series[end - count:end].copy()
+
+    # -------------------------------------------------------------------------
+    # MT5 API: positions and history
+    # -------------------------------------------------------------------------
+    def positions_total(self):
+        return len(self.positions)
+
+    def positions_get(self, symbol=None, group=None, ticket=None):
+        with self._lock:
+            for held in {p['symbol'] for p in self.positions.values()}:
+                self._sync(held)
+            if ticket is not None:
+                book = [self.positions[ticket]] if ticket in self.positions else []
+            else:
+                book = list(self.positions.values())
+            if symbol is not None:
+                book = [p for p in book if p['symbol'] == symbol]
+            if group is not None:
+                allowed = {s.name for s in self.symbols_get(group)}
+                book = [p for p in book if p['symbol'] in allowed]
+
+            result = []
+            for pos in book:
+                ask, bid = self._quote(pos['symbol'])
+                current, profit = self._position_profit(pos, bid, ask)
+                result.append(TradePosition(
+                    ticket=pos['ticket'], time=pos['time'], time_msc=pos['time_msc'],
+                    time_update=pos['time'], time_update_msc=pos['time_msc'], type=pos['type'],
+                    magic=pos['magic'], identifier=pos['ticket'], reason=DEAL_REASON_EXPERT,
+                    volume=pos['volume'], price_open=pos['price_open'], sl=pos['sl'],
+                    tp=pos['tp'], price_current=current, swap=0.0, profit=round(profit, 2),
+                    symbol=pos['symbol'], comment=pos['comment'], external_id='',
+                ))
+            return tuple(result)
+
+    def orders_total(self):
+        return len(self.orders)
+
+    def orders_get(self, symbol=None, group=None, ticket=None):
+        with self._lock:
+            for held in {o['symbol'] for o in self.orders.values()}:
+                self._sync(held)
+            if ticket is not None:
+                book = [self.orders[ticket]] if ticket in self.orders else []
+            else:
+                book = list(self.orders.values())
+            if symbol is not None:
+                book = [o for o in book if o['symbol'] == symbol]
+            if group is not None:
+                allowed = {s.name for s in self.symbols_get(group)}
+                book = [o for o in book if o['symbol'] in allowed]
+            return tuple(self._order_tuple(o) for o in book)
+
+    def _order_tuple(self, order):
+        ask, bid = self._quote(order['symbol'])
+        buy = order['type'] in (ORDER_TYPE_BUY_LIMIT, ORDER_TYPE_BUY_STOP)
+        return TradeOrder(
+            ticket=order['ticket'], time_setup=order['time_setup'], time_setup_msc=order['time_setup_msc'],
+            time_done=order.get('time_done', 0), time_done_msc=order.get('time_done_msc', 0),
+            time_expiration=order['expiration'], type=order['type'], type_time=order['type_time'],
+            type_filling=order['type_filling'], state=order.get('state', ORDER_STATE_PLACED),
+            magic=order['magic'], position_id=0, position_by_id=0, reason=DEAL_REASON_EXPERT,
+            volume_initial=order['volume'], volume_current=order['volume'], price_open=order['price'],
+            sl=order['sl'], tp=order['tp'], price_current=ask if buy else bid, price_stoplimit=0.0,
+            symbol=order['symbol'], comment=order['comment'], external_id='',
+        )
+
+    def history_deals_get(self, date_from=None, date_to=None, position=None, ticket=None):
+        deals = self.deals
+        if position is not None:
+            deals = [d for d in deals if d.position_id == position]
+        if ticket is not None:
+            deals = [d for d in deals if d.ticket == ticket]
+        if date_from is not None:
+            start = date_from.timestamp() if isinstance(date_from, datetime) else date_from
+            deals = [d for d in deals if d.time >= start]
+        if date_to is not None:
+            end = date_to.timestamp() if isinstance(date_to, datetime) else date_to
+            deals = [d for d in deals if d.time <= end]
+        return tuple(deals)
+
+    # -------------------------------------------------------------------------
+    # MT5 API: trading
+    # -------------------------------------------------------------------------
+    def order_calc_margin(self, action, symbol, volume, price):
+        if symbol not in self.specs or action not in (ORDER_TYPE_BUY, ORDER_TYPE_SELL):
+            return self._fail(RES_E_INVALID_PARAMS, 'Invalid arguments')
+        return round(self._margin(symbol, float(volume), float(price)), 2)
+
+    def order_check(self, request):
+        """Checks a market deal like order_send would, without executing it (retcode 0 = ok)"""
+        if not self.connected:
+            return self._fail(RES_E_FAIL, 'Terminal not initialized')
+        with self._lock:
+            floating, margin = self._account_totals()
+            equity = round(self.balance + floating, 2)
+
+            def checked(retcode, comment, required=0.0):
+                used = margin + required
+                return OrderCheckResult(
+                    retcode=retcode, balance=self.balance, equity=equity, profit=round(floating, 2),
+                    margin=round(used, 2), margin_free=round(equity - used, 2),
+                    margin_level=round(equity / used * 100, 2) if used else 0.0,
+                    comment=comment, request=dict(request))
+
+            symbol = request.get('symbol')
+            spec = self.specs.get(symbol)
+            side = request.get('type')
+            if request.get('action') != TRADE_ACTION_DEAL or spec is None or side not in (ORDER_TYPE_BUY,
+                                                                                          ORDER_TYPE_SELL):
+                return checked(TRADE_RETCODE_INVALID, 'Invalid request')
+            self._sync(symbol)
+            volume = float(request.get('volume', 0.0))
+            if not self._volume_valid(spec, volume):
+                return checked(TRADE_RETCODE_INVALID_VOLUME, 'Invalid volume')
+            filling = request.get('type_filling', ORDER_FILLING_FOK)
+            if filling not in (ORDER_FILLING_FOK, ORDER_FILLING_IOC) or not spec.filling_mode & (1 << filling):
+                return checked(TRADE_RETCODE_INVALID_FILL, 'Unsupported filling mode')
+            if request.get('position'):
+                pos = self.positions.get(request['position'])
+                if pos is None or pos['symbol'] != symbol:
+                    return checked(TRADE_RETCODE_POSITION_CLOSED, 'Position doesn\'t exist')
+                return checked(0, 'Done')
+            ask, bid = self._quote(symbol)
+            price = ask if side == ORDER_TYPE_BUY else bid
+            if not self._stops_valid(symbol, side, price, float(request.get('sl') or 0.0),
+                                     float(request.get('tp') or 0.0)):
+                return checked(TRADE_RETCODE_INVALID_STOPS, 'Invalid stops')
+            required = self._margin(symbol, volume, price)
+            if equity - margin < required:
+                return checked(TRADE_RETCODE_NO_MONEY, 'No money', required)
+            return checked(0, 'Done', required)
 
     def order_send(self, request):
-        print(f"Order send request: {request}")
-        class Result:
-            def __init__(self):
-                self.retcode = 10009
-                self.order = random.randint(100000, 999999)
-                self.price = request.get('price', 0.0)
-                self.comment = "Request executed"
-        return Result()
-
-mt5 = MT5Mock()
+        if not self.connected:
+            return self._fail(RES_E_FAIL, 'Terminal not initialized')
+        action = request.get('action')
+        latency, slept = 0.0, False
+        if self.execution is not None and action == TRADE_ACTION_DEAL:
+            latency = self.execution.latency()
+            if self.execution.sleep and latency > 0:
+                time.sleep(latency)         # outside the lock: other calls go on meanwhile
+                slept = True
+        with self._lock:
+            if action == TRADE_ACTION_DEAL:
+                return self._deal(request, latency, slept)
+            if action == TRADE_ACTION_SLTP:
+                return self._modify_sltp(request)
+            if action == TRADE_ACTION_PENDING:
+                return self._place_pending(request)
+            if action == TRADE_ACTION_MODIFY:
+                return self._modify_pending(request)
+            if action == TRADE_ACTION_REMOVE:
+                return self._remove_pending(request)
+            return self._result(request, TRADE_RETCODE_INVALID, 'Unsupported trade action')
+
+    def _deal(self, request, latency=0.0, slept=False):
+        symbol = request.get('symbol')
+        spec = self.specs.get(symbol)
+        if spec is None:
+            return self._result(request, TRADE_RETCODE_INVALID, 'Unknown symbol')
+        self._sync(symbol)
+        side = request.get('type')
+        if side not in (ORDER_TYPE_BUY, ORDER_TYPE_SELL):
+            return self._result(request, TRADE_RETCODE_INVALID, 'Invalid order type')
+        volume = float(request.get('volume', 0.0))
+        if not self._volume_valid(spec, volume):
+            return self._result(request, TRADE_RETCODE_INVALID_VOLUME, 'Invalid volume')
+        filling = request.get('type_filling', ORDER_FILLING_FOK)
+        if filling not in (ORDER_FILLING_FOK, ORDER_FILLING_IOC) or not spec.filling_mode & (1 << filling):
+            return self._result(request, TRADE_RETCODE_INVALID_FILL, 'Unsupported filling mode')
+
+        # Closing (or partially closing) an existing position
+        ticket = request.get('position')
+        pos = None
+        if ticket:
+            pos = self.positions.get(ticket)
+            if pos is None or pos['symbol'] != symbol:
+                return self._result(request, TRADE_RETCODE_POSITION_CLOSED, 'Position doesn\'t exist')
+            if pos['type'] == side:
+                return self._result(request, TRADE_RETCODE_INVALID, 'Close must be opposite side')
+            volume = min(volume, pos['volume'])
+
+        if self.execution is None:
+            ask, bid = self._quote(symbol)
+            price = ask if side == ORDER_TYPE_BUY else bid
+            filled = volume
+        else:
+            ask, bid = self._fill_quote(symbol, latency, slept)
+            buy = side == ORDER_TYPE_BUY
+            top = ask if buy else bid
+            requested = float(request.get('price') or 0.0)
+            deviation = request.get('deviation')
+            if self.execution.requote(buy, top, spec.point, requested, deviation):
+                return self._result(request, TRADE_RETCODE_REQUOTE, 'Requote')
+            filled, price = self.execution.fill(buy, volume, top, spec.point, spec.digits,
+                                                spec.volume_step, requested, deviation)
+            if price is None or (filling == ORDER_FILLING_FOK and filled < volume - 1e-9):
+                return self._result(request, TRADE_RETCODE_REJECT, 'Not enough liquidity')
+        if filled < volume - 1e-9:
+            retcode, comment = TRADE_RETCODE_DONE_PARTIAL, 'Request executed partially'
+        else:
+            retcode, comment = TRADE_RETCODE_DONE, 'Request executed'
+
+        if pos is not None:
+            deal, _ = self._close_position(pos, filled, price, DEAL_REASON_EXPERT,
+                                           request.get('comment', ''))
+            return self._result(request, retcode, comment,
+                                deal=deal, order=self._ticket(), volume=filled, price=price)
+
+        sl = float(request.get('sl') or 0.0)
+        tp = float(request.get('tp') or 0.0)
+        if not self._stops_valid(symbol, side, price, sl, tp):
+            return self._result(request, TRADE_RETCODE_INVALID_STOPS, 'Invalid stops')
+
+        floating, margin = self._account_totals()
+        required = self._margin(symbol, filled, price)
+        if self.balance + floating - margin < required:
+            return self._result(request, TRADE_RETCODE_NO_MONEY, 'No money')
+
+        pos, deal = self._open_position(symbol, side, filled, price, sl, tp,
+                                        request.get('magic', 0), request.get('comment', ''))
+        return self._result(request, retcode, comment,
+                            deal=deal, order=pos['ticket'], volume=filled, price=price)
+
+    def _modify_sltp(self, request):
+        pos = self.positions.get(request.get('position'))
+        if pos is None:
+            return self._result(request, TRADE_RETCODE_POSITION_CLOSED, 'Position doesn\'t exist')
+        self._sync(pos['symbol'])
+        sl = float(request.get('sl') or 0.0)
+        tp = float(request.get('tp') or 0.0)
+        if (sl, tp) == (pos['sl'], pos['tp']):
+            return self._result(request, TRADE_RETCODE_NO_CHANGES, 'No changes')
+        ask, bid = self._quote(pos['symbol'])
+        reference = bid if pos['type'] == POSITION_TYPE_BUY else ask
+        if not self._stops_valid(pos['symbol'], pos['type'], reference, sl, tp):
+            return self._result(request, TRADE_RETCODE_INVALID_STOPS, 'Invalid stops')
+        pos['sl'], pos['tp'] = sl, tp
+        self._check_stops(pos['symbol'])
+        return self._result(request, TRADE_RETCODE_DONE, 'Request executed', order=pos['ticket'])
+
+    def _check_pending(self, request, symbol, kind, price, sl, tp):
+        """Result to refuse a pending order with, or None when it is acceptable"""
+        if not price or not self._pending_price_valid(symbol, kind, price):
+            return self._result(request, TRADE_RETCODE_INVALID_PRICE, 'Invalid price')
+        side = POSITION_TYPE_BUY if kind in (ORDER_TYPE_BUY_LIMIT, ORDER_TYPE_BUY_STOP) else POSITION_TYPE_SELL
+        if not self._stops_valid(symbol, side, price, sl, tp):
+            return self._result(request, TRADE_RETCODE_INVALID_STOPS, 'Invalid stops')
+        type_time = request.get('type_time', ORDER_TIME_GTC)
+        expiration = int(request.get('expiration') or 0)
+        if type_time not in (ORDER_TIME_GTC, ORDER_TIME_SPECIFIED) or (
+                type_time == ORDER_TIME_SPECIFIED and expiration <= self.clock()):
+            return self._result(request, TRADE_RETCODE_INVALID_EXPIRATION, 'Invalid expiration')
+        return None
+
+    def _place_pending(self, request):
+        symbol = request.get('symbol')
+        spec = self.specs.get(symbol)
+        if spec is None:
+            return self._result(request, TRADE_RETCODE_INVALID, 'Unknown symbol')
+        self._sync(symbol)
+        kind = request.get('type')
+        if kind not in (ORDER_TYPE_BUY_LIMIT, ORDER_TYPE_SELL_LIMIT, ORDER_TYPE_BUY_STOP, ORDER_TYPE_SELL_STOP):
+            return self._result(request, TRADE_RETCODE_INVALID, 'Invalid order type')
+        volume = float(request.get('volume', 0.0))
+        if not self._volume_valid(spec, volume):
+            return self._result(request, TRADE_RETCODE_INVALID_VOLUME, 'Invalid volume')
+        price = round(float(request.get('price') or 0.0), spec.digits)
+        sl = float(request.get('sl') or 0.0)
+        tp = float(request.get('tp') or 0.0)
+        refused = self._check_pending(request, symbol, kind, price, sl, tp)
+        if refused is not None:
+            return refused
+
+        now = self.clock()
+        ticket = self._ticket()
+        type_time = request.get('type_time', ORDER_TIME_GTC)
+        self.orders[ticket] = {
+            'ticket': ticket, 'symbol': symbol, 'type': kind, 'volume': volume, 'price': price,
+            'sl': sl, 'tp': tp, 'magic': request.get('magic', 0), 'comment': request.get('comment', ''),
+            'type_time': type_time,
+            'expiration': int(request.get('expiration') or 0) if type_time == ORDER_TIME_SPECIFIED else 0,
+            'type_filling': request.get('type_filling', ORDER_FILLING_RETURN),
+            'time_setup': int(now), 'time_setup_msc': int(now * 1000),
+        }
+        return self._result(request, TRADE_RETCODE_DONE, 'Request executed', order=ticket,
+                            volume=volume, price=price)
+
+    def _modify_pending(self, request):
+        order = self.orders.get(request.get('order'))
+        if order is None:
+            return self._result(request, TRADE_RETCODE_INVALID, 'Order not found')
+        symbol = order['symbol']
+        self._sync(symbol)
+        if order['ticket'] not in self.orders:
+            return self._result(request, TRADE_RETCODE_INVALID, 'Order not found')   # filled by the sync
+        price = round(float(request.get('price') or 0.0), self.specs[symbol].digits)
+        sl = float(request.get('sl') or 0.0)
+        tp = float(request.get('tp') or 0.0)
+        type_time = request.get('type_time', ORDER_TIME_GTC)
+        expiration = int(request.get('expiration') or 0) if type_time == ORDER_TIME_SPECIFIED else 0
+        if (price, sl, tp, type_time, expiration) == (order['price'], order['sl'], order['tp'],
+                                                      order['type_time'], order['expiration']):
+            return self._result(request, TRADE_RETCODE_NO_CHANGES, 'No changes')
+        refused = self._check_pending(request, symbol, order['type'], price, sl, tp)
+        if refused is not None:
+            return refused
+        order.update(price=price, sl=sl, tp=tp, type_time=type_time, expiration=expiration)
+        self._check_stops(symbol)
+        return self._result(request, TRADE_RETCODE_DONE, 'Request executed', order=order['ticket'])
+
+    def _remove_pending(self, request):
+        order = self.orders.get(request.get('order'))
+        if order is None:
+            return self._result(request, TRADE_RETCODE_INVALID, 'Order not found')
+        self._finish_order(order, ORDER_STATE_CANCELED)
+        return self._result(request, TRADE_RETCODE_DONE, 'Request executed', order=order['ticket'])
+
+
+def create_replay_simulator(path, speed=1.0, warmup_bars=200, **kwargs):
+    """
+    Simulator replaying the recorded files in `path` (see replay.py for the
+    layout), starting `warmup_bars` into the data and running `speed`x real time.
+    """
+    feed = ReplayFeed.from_directory(path)
+    clock = SimClock(feed.start_time(warmup_bars), speed=speed, end=feed.end_time())
+    return MT5Simulator(replay=feed, clock=clock, **kwargs)
+
+
+# Backwards compatible name
+MT5Mock = MT5Simulator
+
+mt5 = MT5Simulator()
@@ -0,0 +1,389 @@
+"""
+=============================================================================
+MT5 CALL TRACES - RECORD ON THE TERMINAL, REPLAY ANYWHERE
+=============================================================================
+
+RecordingMT5 is a backend wrapper (MT5_WRAPPERS=record,metrics) that logs
+every MT5 call - function, arguments, result, latency, thread, and the
+last_error of failed calls - to a compact binary trace. TraceBackend
+(MT5_BACKEND=trace) serves those recorded results again, sleeping for the
+recorded latency, so production traffic can be re-run on a Linux box
+without a terminal.
+
+TRACE FORMAT (gzip stream of length-prefixed marshal frames):
+    frame 0     header  {'version', 'created', 'constants', 'backend'}
+    frame 1..n  call    (seq, start_ns, latency_ns, thread, function,
+                         args, kwargs, result, last_error)
+
+Results are stored by value: named tuples as (type name, fields, values),
+NumPy arrays as (dtype descr, shape, raw bytes). A trace taken with the
+Windows MetaTrader5 package therefore loads without it.
+
+Recording happens mostly off the hot path: the arguments are encoded at
+call time (callers may reuse a request dict afterwards), the results are
+queued and a background thread encodes, compresses and writes them.
+
+CONFIG:
+    MT5_RECORD_FILE   trace written by the "record" wrapper (default mt5_trace.bin)
+    MT5_TRACE_FILE    trace served by the "trace" backend
+    MT5_TRACE_TIMING  recorded latency multiplier for the trace backend
+                      (1 = as recorded, 0 = no sleeping)
+
+CLI:
+    python mt5_trace.py info mt5_trace.bin
+    python mt5_trace.py bench mt5_trace.bin --speed 10 --wrappers metrics
+=============================================================================
+"""
+
+import argparse
+import atexit
+import collections
+import gzip
+import json
+import marshal
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+
+import numpy as np
+
+from backends import BACKEND_FUNCTIONS, describe
+
+
+TRACE_VERSION = 1
+FRAME = struct.Struct('<I')
+
+_TAG_NAMEDTUPLE = '\0nt'
+_TAG_NDARRAY = '\0nd'
+
+# Not recorded: error lookups are captured with the failing call instead
+_NOT_RECORDED = {'last_error'}
+
+
+# =============================================================================
+# ENCODING
+# =============================================================================
+def encode(value):
+    """MT5 value -> marshal-able value"""
+    if value is None or isinstance(value, (bool, int, float, str, bytes)):
+        return value
+    if isinstance(value, np.ndarray):
+        return (_TAG_NDARRAY, value.dtype.descr, value.shape, value.tobytes())
+    if isinstance(value, np.generic):
+        return value.item()
+    if hasattr(value, '_asdict'):
+        fields = value._asdict()
+        return (_TAG_NAMEDTUPLE, type(value).__name__, tuple(fields),
+                tuple(encode(v) for v in fields.values()))
+    if isinstance(value, tuple):
+        return tuple(encode(v) for v in value)
+    if isinstance(value, list):
+        return [encode(v) for v in value]
+    if isinstance(value, dict):
+        return {k: encode(v) for k, v in value.items()}
+    return repr(value)
+
+
+_namedtuple_types = {}
+
+
+def decode(value):
+    """Inverse of encode(); named tuples come back as equivalent namedtuple types"""
+    if isinstance(value, tuple):
+        if len(value) == 4 and value[0] == _TAG_NAMEDTUPLE:
+            _, name, fields, values = value
+            cls = _namedtuple_types.get((name, fields))
+            if cls is None:
+                cls = _namedtuple_types[(name, fields)] = collections.namedtuple(name, fields)
+            return cls(*(decode(v) for v in values))
+        if len(value) == 4 and value[0] == _TAG_NDARRAY:
+            _, descr, shape, raw = value
+            dtype = np.dtype([tuple(d) for d in descr]) if isinstance(descr, list) else np.dtype(descr)
+            return np.frombuffer(raw, dtype=dtype).reshape(shape).copy()
+        return tuple(decode(v) for v in value)
+    if isinstance(value, list):
+        return [decode(v) for v in value]
+    if isinstance(value, dict):
+        return {k: decode(v) for k, v in value.items()}
+    return value
+
+
+def _constants(module):
+    out = {}
+    for name in dir(module):
+        if name.isupper():
+            value = getattr(module, name, None)
+            if isinstance(value, (int, float, str)) and not isinstance(value, bool):
+                out[name] = value
+    return out
+
+
+# =============================================================================
+# READING
+# =============================================================================
+def read_trace(path):
+    """(header, [call tuple, ...]); a truncated tail (crash while recording) is ignored"""
+    calls = []
+    header = None
+    with gzip.open(path, 'rb') as f:
+        try:
+            while True:
+                size = f.read(FRAME.size)
+                if len(size) < FRAME.size:
+                    break
+                body = f.read(FRAME.unpack(size)[0])
+                frame = marshal.loads(body)
+                if header is None:
+                    header = frame
+                else:
+                    calls.append(frame)
+        except (EOFError, ValueError, OSError):
+            pass
+    if header is None or header.get('version') != TRACE_VERSION:
+        raise ValueError(f"{path} is not an MT5 trace (version {TRACE_VERSION})")
+    return header, calls
+
+
+# =============================================================================
+# RECORDING WRAPPER
+# =============================================================================
+class RecordingMT5:
+    """Proxy that forwards every call and queues it for the trace writer"""
+
+    def __init__(self, mt5_module, path, flush_interval=1.0):
+        self._mt5 = mt5_module
+        self.path = path
+        self._queue = queue.SimpleQueue()
+        self._seq = 0
+        self._seq_lock = threading.Lock()
+        self._origin = time.perf_counter_ns()
+        self._wrapped = {}
+        self._file = gzip.open(path, 'wb', compresslevel=6)
+        self._write_frame({
+            'version': TRACE_VERSION,
+            'created': time.time(),
+            'constants': _constants(mt5_module),
+            'backend': describe(mt5_module),
+        })
+        self._flush_interval = flush_interval
+        self._closed = threading.Event()
+        self._writer = threading.Thread(target=self._write_loop, name='mt5-trace-writer', daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def __getattr__(self, name):
+        wrapped = self._wrapped.get(name)
+        if wrapped is not None:
+            return wrapped
+        attr = getattr(self._mt5, name)
+        if not callable(attr) or name.isupper() or name.startswith('_') or name in _NOT_RECORDED:
+            return attr
+
+        def recorded(*args, **kwargs):
+            start = time.perf_counter_ns()
+            result = attr(*args, **kwargs)
+            latency = time.perf_counter_ns() - start
+            error = self._mt5.last_error() if result is None or result is False else None
+            with self._seq_lock:
+                self._seq += 1
+                seq = self._seq
+            # Arguments by value now: a request dict changed after the call must not leak in
+            self._queue.put((seq, start - self._origin, latency, threading.current_thread().name,
+                             name, encode(args), encode(kwargs), result, error))
+            return result
+
+        recorded.__name__ = name
+        self._wrapped[name] = recorded
+        return recorded
+
+    def _write_frame(self, frame):
+        body = marshal.dumps(frame)
+        self._file.write(FRAME.pack(len(body)) + body)
+
+    def _write_loop(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = self._queue.get(timeout=self._flush_interval)
+            except queue.Empty:
+                item = None
+            if item is not None:
+                seq, start, latency, thread, name, args, kwargs, result, error = item
+                self._write_frame((seq, start, latency, thread, name, args, kwargs,
+                                   encode(result), encode(error)))
+            if time.monotonic() - last_flush >= self._flush_interval:
+                self._file.flush()
+                last_flush = time.monotonic()
+            if item is None and self._closed.is_set():
+                break
+        self._file.close()
+
+    def close(self):
+        """Write out everything queued so far and close the trace"""
+        if not self._closed.is_set():
+            self._closed.set()
+            self._writer.join()
+
+
+# =============================================================================
+# TRACE BACKEND
+# =============================================================================
+class TraceBackend:
+    """
+    Serves recorded results. A call is matched on (function, args, kwargs);
+    unseen arguments fall back to the function's recorded results in order.
+    Repeated matches cycle through what was recorded.
+    """
+
+    def __init__(self, path, timing=1.0):
+        header, calls = read_trace(path)
+        self.header = header
+        self.calls = calls
+        self.timing = float(timing)
+        self.__name__ = f"TraceBackend({os.path.basename(path)})"
+        for name, value in header['constants'].items():
+            setattr(self, name, value)
+
+        self._exact = {}
+        self._by_function = {}
+        for call in calls:
+            _, _, latency, _, name, args, kwargs, result, error = call
+            entry = (latency, result, error)
+            self._exact.setdefault(self._key(name, args, kwargs), []).append(entry)
+            self._by_function.setdefault(name, []).append(entry)
+        self._cursor = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @staticmethod
+    def _key(name, args, kwargs):
+        # repr, not marshal: marshal output depends on string interning
+        return name, repr((args, sorted(kwargs.items())))
+
+    def _next(self, key, entries):
+        with self._lock:
+            i = self._cursor.get(key, 0)
+            self._cursor[key] = i + 1
+        return entries[i % len(entries)]
+
+    def _serve(self, name, args, kwargs):
+        key = self._key(name, encode(args), encode(kwargs))
+        entries = self._exact.get(key)
+        if entries is None:
+            key, entries = name, self._by_function.get(name)
+        if not entries:
+            self._local.error = (-1, f'{name} was not recorded')
+            return None
+        latency, result, error = self._next(key, entries)
+        if self.timing > 0:
+            time.sleep(latency * self.timing / 1e9)
+        self._local.error = decode(error) if error is not None else None
+        return decode(result)
+
+    def last_error(self):
+        return getattr(self._local, 'error', None) or (1, 'Success')
+
+    def __getattr__(self, name):
+        if name not in self._by_function and name not in BACKEND_FUNCTIONS:
+            raise AttributeError(name)
+
+        def served(*args, **kwargs):
+            return self._serve(name, args, kwargs)
+
+        served.__name__ = name
+        return served
+
+    # Always present so the backend passes the BACKEND_FUNCTIONS check
+    def initialize(self, *args, **kwargs):
+        return self._serve('initialize', args, kwargs) if 'initialize' in self._by_function else True
+
+    def shutdown(self):
+        return None
+
+
+# =============================================================================
+# BENCH: RE-RUN A TRACE'S CALL PATTERN AGAINST A BACKEND STACK
+# =============================================================================
+def replay_calls(calls, backend, speed=1.0):
+    """
+    Re-issue recorded calls on `backend`, one worker per recorded thread,
+    at the recorded start offsets divided by `speed` (0 = back to back).
+    Returns {function: Histogram} of observed latencies.
+    """
+    from metrics import Histogram
+
+    by_thread = {}
+    for call in calls:
+        by_thread.setdefault(call[3], []).append(call)
+    hists = collections.defaultdict(Histogram)
+    origin = time.perf_counter_ns()
+
+    def worker(thread_calls):
+        for _, start, _, _, name, args, kwargs, _, _ in thread_calls:
+            if speed > 0:
+                wait = start / speed - (time.perf_counter_ns() - origin)
+                if wait > 0:
+                    time.sleep(wait / 1e9)
+            began = time.perf_counter_ns()
+            getattr(backend, name)(*decode(args), **decode(kwargs))
+            hists[name].record(time.perf_counter_ns() - began)
+
+    threads = [threading.Thread(target=worker, args=(c,), name=f'replay-{n}') for n, c in by_thread.items()]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return dict(hists)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Inspect or benchmark MT5 call traces')
+    sub = parser.add_subparsers(dest='command', required=True)
+    info = sub.add_parser('info', help='summarize a trace')
+    info.add_argument('path')
+    bench = sub.add_parser('bench', help='replay the call pattern against the trace backend')
+    bench.add_argument('path')
+    bench.add_argument('--speed', type=float, default=1.0, help='arrival speed-up, 0 = back to back')
+    bench.add_argument('--timing', type=float, default=1.0, help='recorded latency multiplier')
+    bench.add_argument('--wrappers', default='', help='wrappers stacked on the trace backend, innermost first')
+    args = parser.parse_args(argv)
+
+    header, calls = read_trace(args.path)
+    if args.command == 'info':
+        per_function = collections.Counter(c[4] for c in calls)
+        duration = (calls[-1][1] + calls[-1][2] - calls[0][1]) / 1e9 if calls else 0.0
+        print(json.dumps({
+            'backend': header['backend'],
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(header['created'])),
+            'calls': len(calls),
+            'duration_s': round(duration, 3),
+            'threads': len({c[3] for c in calls}),
+            'functions': dict(per_function.most_common()),
+        }, indent=2))
+        return
+
+    from backends import WRAPPERS
+    backend = TraceBackend(args.path, timing=args.timing)
+    for name in [w.strip() for w in args.wrappers.split(',') if w.strip()]:
+        backend = WRAPPERS[name](backend, os.environ)
+    started = time.perf_counter()
+    hists = replay_calls(calls, backend, speed=args.speed)
+    wall = time.perf_counter() - started
+    report = {'calls': len(calls), 'wall_s': round(wall, 3), 'functions': {}}
+    for name, hist in sorted(hists.items()):
+        snap = hist.snapshot()
+        report['functions'][name] = {
+            'count': snap['count'],
+            'p50_ms': snap['p50_ns'] / 1e6,
+            'p99_ms': snap['p99_ns'] / 1e6,
+            'max_ms': snap['max_ns'] / 1e6,
+        }
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
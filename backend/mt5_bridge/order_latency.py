@@ -0,0 +1,136 @@
+"""
+=============================================================================
+ORDER LATENCY - PER-ORDER TIMING BREAKDOWN
+=============================================================================
+
+Every /order request gets an OrderTimer. Each step of place_order marks a
+stage (client_order_id too when the order carries one), so a finished
+record looks like:
+
+    {
+      "ticket": 123456, "symbol": "EURUSD", "type": "BUY", "success": true,
+      "stages_ms": {"request_parse": 0.05, "connection_check": 0.41,
+                    "symbol_info_tick": 0.12, "order_send": 38.7,
+                    "confirmation_wait": 500.3, "verification": 0.9},
+      "total_ms": 540.5,
+      "requested_price": 1.10050, "fill_price": 1.10053, "slippage": 0.00003
+    }
+
+Slippage is signed so that POSITIVE = worse than requested for either side.
+
+Records live in a bounded ring (ORDER_LATENCY_RING, default 1000) and are
+served by /orders/latency. Stage durations are also fed into the metrics
+registry as order_stage_seconds{stage=...}.
+=============================================================================
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+from metrics import Histogram, registry as metrics_registry
+
+
+class OrderTimer:
+    """Collects stage durations for a single order"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._start = time.perf_counter_ns()
+        self._last = self._start
+        self.stages = {}
+        self.fields = {}
+
+    def mark(self, stage):
+        """Close the current stage: time since the previous mark goes to `stage`"""
+        now = time.perf_counter_ns()
+        self.stages[stage] = self.stages.get(stage, 0) + (now - self._last)
+        self._last = now
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def to_record(self):
+        total = time.perf_counter_ns() - self._start
+        record = {
+            'started_at': self.started_at,
+            'total_ms': round(total / 1e6, 3),
+            'stages_ms': {k: round(v / 1e6, 3) for k, v in self.stages.items()},
+        }
+        record.update(self.fields)
+
+        requested = self.fields.get('requested_price')
+        filled = self.fields.get('fill_price')
+        if requested and filled:
+            diff = filled - requested
+            record['slippage'] = round(diff if self.fields.get('type') == 'BUY' else -diff, 10)
+        return record
+
+
+class OrderLatencyLog:
+    """Thread-safe bounded ring of finished order timing records"""
+
+    def __init__(self, maxlen=1000, metrics=None):
+        self._records = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self._metrics = metrics or metrics_registry
+
+    def add(self, timer):
+        record = timer.to_record()
+        with self._lock:
+            self._records.append(record)
+        for stage, ns in timer.stages.items():
+            self._metrics.histogram(
+                'order_stage_seconds', 'Duration of each place_order stage', stage=stage,
+            ).record(ns)
+        return record
+
+    def query(self, limit=100, symbol=None, success=None):
+        """Most recent first"""
+        with self._lock:
+            records = list(self._records)
+        out = []
+        for record in reversed(records):
+            if len(out) >= limit:
+                break
+            if symbol and record.get('symbol') != symbol:
+                continue
+            if success is not None and record.get('success') != success:
+                continue
+            out.append(record)
+        return out
+
+    def summary(self, records):
+        """p50/p99/max per stage + slippage stats for the given records"""
+        stage_hists = {}
+        total_hist = Histogram()
+        slippages = []
+        for record in records:
+            for stage, ms in record['stages_ms'].items():
+                stage_hists.setdefault(stage, Histogram()).record(ms * 1e6)
+            total_hist.record(record['total_ms'] * 1e6)
+            if 'slippage' in record:
+                slippages.append(record['slippage'])
+
+        def _ms(hist):
+            snap = hist.snapshot()
+            return {
+                'count': snap['count'],
+                'p50_ms': snap['p50_ns'] / 1e6,
+                'p99_ms': snap['p99_ns'] / 1e6,
+                'max_ms': snap['max_ns'] / 1e6,
+            }
+
+        return {
+            'total': _ms(total_hist),
+            'stages': {stage: _ms(h) for stage, h in stage_hists.items()},
+            'slippage': {
+                'count': len(slippages),
+                'mean': sum(slippages) / len(slippages) if slippages else 0.0,
+                'max': max(slippages) if slippages else 0.0,
+            },
+        }
+
+
+order_latency_log = OrderLatencyLog(maxlen=int(os.environ.get('ORDER_LATENCY_RING', 1000)))
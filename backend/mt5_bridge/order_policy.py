@@ -0,0 +1,163 @@
+"""
+=============================================================================
+ORDER POLICY - FILLING MODE AND RETRIES FOR MARKET DEALS
+=============================================================================
+
+/order, /close and the position monitor send market deals through one
+policy instead of a hard-coded IOC / deviation 20 / give up on the first
+non-DONE retcode:
+
+    filling     the first mode in `filling` the symbol allows
+                (symbol_info.filling_mode from SymbolInfoCache: FOK / IOC
+                flags; RETURN when the symbol advertises neither).
+                INVALID_FILL drops that mode for the symbol and retries
+                with the next one
+    retries     REQUOTE, PRICE_CHANGED and PRICE_OFF are re-sent at a fresh
+                tick's price while attempts < max_attempts and the time
+                spent stays inside budget_ms; each retry may widen the
+                deviation by deviation_step points (up to max_deviation)
+    record      every attempt (retcode, price, filling, deviation, ms) is
+                returned with the result and counted in
+                order_attempts_total{retcode=...}
+
+CONFIG (ORDER_POLICY = inline JSON or path to a .json file):
+
+    {"filling": ["IOC", "FOK", "RETURN"], "deviation": 20, "max_attempts": 3,
+     "budget_ms": 1500, "deviation_step": 0, "max_deviation": 50}
+=============================================================================
+"""
+
+import json
+import os
+import threading
+import time
+
+from metrics import registry
+
+
+FILLING_MODES = ('IOC', 'FOK', 'RETURN')
+SYMBOL_FLAGS = {'FOK': 1, 'IOC': 2}         # symbol_info.filling_mode bits
+
+DEFAULT_POLICY = {
+    'filling': ['IOC', 'FOK', 'RETURN'],
+    'deviation': 20,
+    'max_attempts': 3,
+    'budget_ms': 1500,
+    'deviation_step': 0,
+    'max_deviation': 50,
+}
+
+
+def load_policy_config(value=None):
+    """ORDER_POLICY (inline JSON or .json path) -> policy dict over DEFAULT_POLICY"""
+    value = value if value is not None else os.environ.get('ORDER_POLICY', '')
+    value = value.strip()
+    config = {}
+    if value:
+        if not value.startswith('{'):
+            with open(value) as f:
+                value = f.read()
+        config = json.loads(value)
+    unknown = set(config) - set(DEFAULT_POLICY)
+    if unknown:
+        raise ValueError(f"Unknown order policy field(s): {', '.join(sorted(unknown))}")
+    policy = {**DEFAULT_POLICY, **config}
+    policy['filling'] = [str(m).upper() for m in policy['filling']]
+    bad = [m for m in policy['filling'] if m not in FILLING_MODES]
+    if bad or not policy['filling']:
+        raise ValueError(f"filling must list modes from {', '.join(FILLING_MODES)}")
+    if int(policy['max_attempts']) < 1:
+        raise ValueError('max_attempts must be >= 1')
+    return policy
+
+
+class ExecutionPolicy:
+
+    def __init__(self, mt5, symbol_cache, config=None, metrics=None):
+        self.mt5 = mt5
+        self.symbols = symbol_cache
+        self.config = {**DEFAULT_POLICY, **(config or {})}      # validated by load_policy_config
+        self._metrics = metrics or registry
+        self._refused = {}          # symbol -> filling modes the server answered INVALID_FILL to
+        self._lock = threading.Lock()
+        self.retry_retcodes = {mt5.TRADE_RETCODE_REQUOTE, mt5.TRADE_RETCODE_PRICE_CHANGED,
+                               mt5.TRADE_RETCODE_PRICE_OFF}
+
+    def filling_for(self, symbol):
+        """Name of the first preferred filling mode the symbol accepts"""
+        info = self.symbols.get(self.mt5, symbol)
+        flags = info.filling_mode if info is not None else 0
+        with self._lock:
+            refused = self._refused.get(symbol, ())
+        allowed = [m for m in self.config['filling'] if m not in refused]
+        for mode in allowed:
+            if mode == 'RETURN' or flags & SYMBOL_FLAGS[mode]:
+                return mode
+        # Nothing advertised matches: fall back to the first preference not refused yet
+        return allowed[0] if allowed else self.config['filling'][0]
+
+    def prepare(self, order_request):
+        """Fill in type_filling and deviation from the policy (in place) and return it"""
+        mode = self.filling_for(order_request['symbol'])
+        order_request['type_filling'] = getattr(self.mt5, f'ORDER_FILLING_{mode}')
+        order_request['deviation'] = int(self.config['deviation'])
+        return order_request
+
+    def _refuse(self, symbol, filling):
+        for mode in FILLING_MODES:
+            if getattr(self.mt5, f'ORDER_FILLING_{mode}') == filling:
+                with self._lock:
+                    self._refused.setdefault(symbol, set()).add(mode)
+                self.symbols.invalidate(symbol)
+                return
+
+    def send(self, order_request):
+        """
+        order_send with the policy's retries -> (last result or None, attempts).
+        The request is prepared first when it has no type_filling yet.
+        """
+        mt5 = self.mt5
+        if 'type_filling' not in order_request:
+            self.prepare(order_request)
+        request = dict(order_request)
+        config = self.config
+        started = time.perf_counter()
+        attempts = []
+        while True:
+            sent_at = time.perf_counter()
+            result = mt5.order_send(request)
+            elapsed_ms = (time.perf_counter() - sent_at) * 1000
+            retcode = result.retcode if result is not None else None
+            attempts.append({
+                'attempt': len(attempts) + 1,
+                'retcode': retcode,
+                'comment': result.comment if result is not None else str(mt5.last_error()),
+                'price': request.get('price'),
+                'filling': request.get('type_filling'),
+                'deviation': request.get('deviation'),
+                'ms': round(elapsed_ms, 3),
+            })
+            self._metrics.counter('order_attempts_total', 'order_send attempts by retcode',
+                                  retcode=str(retcode)).inc()
+
+            if retcode == mt5.TRADE_RETCODE_INVALID_FILL:
+                self._refuse(request['symbol'], request['type_filling'])
+                next_filling = getattr(mt5, f"ORDER_FILLING_{self.filling_for(request['symbol'])}")
+                if next_filling == request['type_filling']:
+                    return result, attempts
+                request = {**request, 'type_filling': next_filling}
+            elif retcode not in self.retry_retcodes:
+                return result, attempts
+
+            spent_ms = (time.perf_counter() - started) * 1000
+            if len(attempts) >= config['max_attempts'] or spent_ms + elapsed_ms > config['budget_ms']:
+                return result, attempts
+            if retcode in self.retry_retcodes:
+                tick = mt5.symbol_info_tick(request['symbol'])
+                if tick is None:
+                    return result, attempts
+                widened = request['deviation'] + int(config['deviation_step'])
+                # A new dict per attempt: wrappers (record, faults) may keep the one already sent
+                request = {**request,
+                           'price': tick.ask if request['type'] == mt5.ORDER_TYPE_BUY else tick.bid,
+                           'deviation': max(request['deviation'], min(int(config['max_deviation']), widened))}
@@ -0,0 +1,131 @@
+"""
+=============================================================================
+PATTERN ENGINE - VECTORIZED DOJI / MORNING STAR / EVENING STAR
+=============================================================================
+
+Same rules as backend/src/services/manualAnalyzer.js, but evaluated for
+every bar of a series at once on the rates array MT5 returns - no JSON
+round trip, no per-candle loop.
+
+    body ratio = |close - open| / (high - low)
+
+3-CANDLE STAR (reported on the third candle):
+    candle 1  ratio > 0.50
+    candle 2  ratio < 0.25
+    candle 3  ratio > 0.50, direction opposite to candle 1
+    confidence 0.75, +0.05 each for ratio1 > 0.65 / 0.75, ratio2 < 0.15 / 0.10,
+    ratio3 > 0.65 / 0.75, capped at 0.98
+    bullish candle 3 -> morning star (BUY), bearish -> evening star (SELL)
+
+SINGLE DOJI:
+    ratio < 0.15, confidence = clamp(1 - 4 * ratio, 0.75, 0.90)
+
+Bars with zero range never match.
+=============================================================================
+"""
+
+import numpy as np
+
+
+PATTERNS = ('star', 'doji')
+
+STAR_LONG = 0.50
+STAR_SHORT = 0.25
+DOJI_MAX_RATIO = 0.15
+
+
+def body_ratios(rates):
+    """(ratio, bullish) arrays; ratio is NaN where high == low"""
+    open_ = np.asarray(rates['open'], dtype=np.float64)
+    close = np.asarray(rates['close'], dtype=np.float64)
+    span = np.asarray(rates['high'], dtype=np.float64) - np.asarray(rates['low'], dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(span > 0, np.abs(close - open_) / span, np.nan)
+    return ratio, close > open_
+
+
+def detect_doji(rates, ratio=None, doji_max=DOJI_MAX_RATIO):
+    """(mask, confidence) per bar"""
+    if ratio is None:
+        ratio, _ = body_ratios(rates)
+    with np.errstate(invalid='ignore'):
+        mask = ratio < doji_max
+    confidence = np.where(mask, np.round(np.clip(1 - 4 * ratio, 0.75, 0.90), 2), 0.0)
+    return mask, confidence
+
+
+def detect_star(rates, ratio=None, bullish=None, star_long=STAR_LONG, star_short=STAR_SHORT):
+    """
+    (mask, confidence, bullish) per bar - bar i is the third candle of the
+    pattern formed by bars i-2, i-1, i. The first two bars never match.
+    Thresholds default to the live rules; the backtester varies them.
+    """
+    if ratio is None or bullish is None:
+        ratio, bullish = body_ratios(rates)
+    n = len(ratio)
+    mask = np.zeros(n, dtype=bool)
+    confidence = np.zeros(n)
+    if n < 3:
+        return mask, confidence, bullish
+
+    r1, r2, r3 = ratio[:-2], ratio[1:-1], ratio[2:]
+    with np.errstate(invalid='ignore'):
+        hit = (r1 > star_long) & (r2 < star_short) & (r3 > star_long) & (bullish[:-2] != bullish[2:])
+        bonus = ((r1 > 0.65).astype(int) + (r1 > 0.75) + (r2 < 0.15) + (r2 < 0.10)
+                 + (r3 > 0.65) + (r3 > 0.75))
+    mask[2:] = hit
+    confidence[2:] = np.where(hit, np.round(np.minimum(0.98, 0.75 + 0.05 * bonus), 2), 0.0)
+    return mask, confidence, bullish
+
+
+def scan_series(rates, patterns=PATTERNS, min_confidence=0.0):
+    """Every match in the series, oldest first, as JSON-ready dicts"""
+    ratio, bullish = body_ratios(rates)
+    times = np.asarray(rates['time'])
+    found = []
+
+    if 'star' in patterns:
+        mask, confidence, _ = detect_star(rates, ratio, bullish)
+        for i in np.flatnonzero(mask & (confidence >= min_confidence)):
+            up = bool(bullish[i])
+            found.append({
+                'index': int(i),
+                'time': int(times[i]),
+                'pattern': 'morning_star' if up else 'evening_star',
+                'confidence': float(confidence[i]),
+                'suggested_direction': 'BUY' if up else 'SELL',
+                'ratios': [round(float(r), 4) for r in ratio[i - 2:i + 1]],
+            })
+
+    if 'doji' in patterns:
+        mask, confidence = detect_doji(rates, ratio)
+        for i in np.flatnonzero(mask & (confidence >= min_confidence)):
+            found.append({
+                'index': int(i),
+                'time': int(times[i]),
+                'pattern': 'doji',
+                'confidence': float(confidence[i]),
+                'suggested_direction': None,
+                'ratios': [round(float(ratio[i]), 4)],
+            })
+
+    found.sort(key=lambda m: (m['index'], m['pattern'] == 'doji'))
+    return found
+
+
+def latest_signal(rates, patterns=PATTERNS, index=-1):
+    """
+    manualAnalyzer.analyze() for one bar: the star pattern wins, a single
+    doji is the fallback. Returns a match dict or None.
+    """
+    n = len(rates)
+    if n == 0:
+        return None
+    index = index % n
+    window = rates[max(0, index - 2):index + 1]
+    for match in scan_series(window, patterns):
+        if match['index'] == len(window) - 1:
+            match['index'] = index
+            match['model_name'] = 'manual-single-v1' if match['pattern'] == 'doji' else 'manual-3candle-v1'
+            return match
+    return None
@@ -0,0 +1,174 @@
+"""
+=============================================================================
+PENDING ORDERS - LIMIT / STOP ENTRIES STAGED ON THE SERVER
+=============================================================================
+
+A doji breakout entry can wait on the MT5 server as a pending order instead
+of being sent as a market order on the next poll: the broker fills it the
+moment the quote crosses its price.
+
+    BUY_LIMIT   below the ask        SELL_LIMIT  above the bid
+    BUY_STOP    above the ask        SELL_STOP   below the bid
+
+Checked against the cached symbol info before sending (MT5 refuses the
+same cases with INVALID_PRICE / INVALID_STOPS):
+    - the order price at least stops_level points from the market
+    - SL / TP at least stops_level points from the ORDER price
+    - an order within trade_freeze_level points of the market can no
+      longer be modified or removed
+=============================================================================
+"""
+
+from sltp import check_stops
+
+
+PENDING_TYPES = ('BUY_LIMIT', 'SELL_LIMIT', 'BUY_STOP', 'SELL_STOP')
+PLACEMENT = {
+    'BUY_LIMIT': 'below the ask',
+    'SELL_LIMIT': 'above the bid',
+    'BUY_STOP': 'above the ask',
+    'SELL_STOP': 'below the bid',
+}
+PENDING_MAGIC = 234000
+
+
+def _number(data, name, required=False):
+    value = data.get(name)
+    if value is None:
+        if required:
+            raise ValueError(f'{name} is required')
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be a number')
+    if value < 0:
+        raise ValueError(f'{name} must be >= 0')
+    return value
+
+
+def parse_pending(data):
+    """New pending order body -> dict of validated fields"""
+    if not isinstance(data, dict):
+        raise ValueError('Request body must be a JSON object')
+    kind = str(data.get('type', '')).upper()
+    if kind not in PENDING_TYPES:
+        raise ValueError(f"type must be one of {', '.join(PENDING_TYPES)}")
+    if not data.get('symbol'):
+        raise ValueError('symbol is required')
+    return {
+        'symbol': data['symbol'],
+        'type': kind,
+        'volume': _number(data, 'volume', required=True),
+        'price': _number(data, 'price', required=True),
+        'sl': _number(data, 'sl') or 0.0,
+        'tp': _number(data, 'tp') or 0.0,
+        'expiration': int(_number(data, 'expiration') or 0),
+        'comment': str(data.get('comment') or 'DojiHunter Pending')[:31],
+    }
+
+
+def parse_changes(data):
+    """Modification body -> {price?, sl?, tp?, expiration?} (omitted = keep)"""
+    if not isinstance(data, dict):
+        raise ValueError('Request body must be a JSON object')
+    changes = {name: _number(data, name) for name in ('price', 'sl', 'tp', 'expiration')}
+    changes = {k: v for k, v in changes.items() if v is not None}
+    if not changes:
+        raise ValueError('Nothing to modify: give price, sl, tp and/or expiration')
+    return changes
+
+
+def is_buy(kind):
+    return kind.startswith('BUY')
+
+
+def check_pending(info, kind, bid, ask, price, sl, tp):
+    """Why MT5 would refuse the order, or None when it is fine"""
+    point = info.point
+    distance = info.trade_stops_level * point - point / 2
+    gap = {
+        'BUY_LIMIT': ask - price,
+        'SELL_LIMIT': price - bid,
+        'BUY_STOP': price - ask,
+        'SELL_STOP': bid - price,
+    }[kind]
+    if not price or gap < distance:
+        return (f'{kind} price {price} must be {PLACEMENT[kind]} by at least {info.trade_stops_level} points '
+                f'(bid {bid}, ask {ask})')
+    # SL / TP distance is measured from the order price
+    return check_stops(info, is_buy(kind), price, price, sl, tp)
+
+
+def check_frozen(info, kind, bid, ask, price):
+    """Error when the order is too close to the market to be changed"""
+    freeze = info.trade_freeze_level * info.point
+    market = ask if is_buy(kind) else bid
+    if freeze and abs(market - price) <= freeze:
+        return f'Order at {price} is inside the freeze level ({info.trade_freeze_level} points)'
+    return None
+
+
+def order_kind(mt5, order_type):
+    """MT5 order type constant -> 'BUY_LIMIT' ... (None for market types)"""
+    for kind in PENDING_TYPES:
+        if getattr(mt5, f'ORDER_TYPE_{kind}') == order_type:
+            return kind
+    return None
+
+
+def order_to_dict(mt5, order):
+    return {
+        'ticket': order.ticket,
+        'symbol': order.symbol,
+        'type': order_kind(mt5, order.type) or order.type,
+        'volume': order.volume_current,
+        'price': order.price_open,
+        'price_current': order.price_current,
+        'sl': order.sl,
+        'tp': order.tp,
+        'time_setup': order.time_setup,
+        'expiration': order.time_expiration,
+        'magic': order.magic,
+        'comment': order.comment,
+    }
+
+
+def pending_request(mt5, order):
+    """TRADE_ACTION_PENDING request for a parse_pending() dict"""
+    return {
+        "action": mt5.TRADE_ACTION_PENDING,
+        "symbol": order['symbol'],
+        "volume": order['volume'],
+        "type": getattr(mt5, f"ORDER_TYPE_{order['type']}"),
+        "price": order['price'],
+        "sl": order['sl'],
+        "tp": order['tp'],
+        "magic": PENDING_MAGIC,
+        "comment": order['comment'],
+        "type_time": mt5.ORDER_TIME_SPECIFIED if order['expiration'] else mt5.ORDER_TIME_GTC,
+        "expiration": order['expiration'],
+        "type_filling": mt5.ORDER_FILLING_RETURN,
+    }
+
+
+def modify_request(mt5, existing, price, sl, tp, expiration):
+    """TRADE_ACTION_MODIFY request: MT5 wants every field, not only the changed ones"""
+    return {
+        "action": mt5.TRADE_ACTION_MODIFY,
+        "order": existing.ticket,
+        "symbol": existing.symbol,
+        "price": price,
+        "sl": sl,
+        "tp": tp,
+        "type_time": mt5.ORDER_TIME_SPECIFIED if expiration else mt5.ORDER_TIME_GTC,
+        "expiration": expiration,
+    }
+
+
+def remove_request(mt5, existing):
+    return {
+        "action": mt5.TRADE_ACTION_REMOVE,
+        "order": existing.ticket,
+        "symbol": existing.symbol,
+    }
@@ -0,0 +1,439 @@
+"""
+=============================================================================
+POSITION MONITOR - EXIT RULES ON EVERY TICK, INSIDE THE BRIDGE
+=============================================================================
+
+orderManagement.monitorPositions (Node) evaluates exits on an interval and
+fetches candles and positions over HTTP for every position. The monitor
+runs the exit rules next to MT5 instead:
+
+    - one thread polls symbol_info_tick() every POLL seconds, only for the
+      symbols that have positions; only a NEW tick triggers an evaluation
+    - positions come from the shared PositionsCache snapshot (refreshed
+      every REFRESH seconds and right after anything closes)
+    - the forming bar is kept up to date from the ticks themselves;
+      candles (through the CandleCache) are only read when a position is
+      first seen and when a new bar starts
+    - a triggered rule sends the close with order_send() on the spot
+      (through the ExecutionPolicy when given: filling mode, requote retries)
+
+RULES (positions with the DojiHunter magic; R = |entry - SL|, or the doji
+range when the position has no SL):
+
+    range_breach    Node's manualClosingAnalysis: price moved against the
+                    entry by more than the doji range, the forming bar's
+                    range is > range_mult x the doji range and the bar runs
+                    against the position
+    guard_stops     the broker SL/TP was crossed but the position is still
+                    open -> close it ourselves
+    breakeven_r     after +N R the exit stop moves to the entry
+                    (+ breakeven_offset_points)
+    trail_start_r   after +N R the exit stop trails trail_r R behind the
+                    best price
+
+Break-even and trailing stops are held by the monitor and executed as a
+close when crossed (0 turns a rule off). With stop_mode "broker" every
+stop move is also written to the position's SL (TRADE_ACTION_SLTP, see
+sltp.py), so the broker holds it even when the bridge is down; the
+monitor-side stop stays as the backstop. The doji range is the range of
+the last bar closed before the entry, else the previous closed bar.
+
+REACTION TIME: poll that saw the triggering tick -> order_send() returned,
+in monitor_exit_seconds{rule=...} and per exit in /monitor.
+
+CONFIG: POSITION_MONITOR = true | inline JSON rules | path to a .json file
+=============================================================================
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from caches import SymbolInfoCache
+from metrics import registry
+from replay import TF_SECONDS
+from sltp import modify_positions
+
+
+POLL = 0.01                 # tick poll while positions are open
+REFRESH = 0.5               # positions snapshot max age / idle wait
+RETRY = 0.25                # wait before re-sending a failed close / SL move
+EXIT_LOG = 200
+MAGIC = 234000
+
+DEFAULT_RULES = {
+    'timeframe': 'M15',
+    'magic': MAGIC,
+    'deviation': 20,
+    'range_breach': True,
+    'range_mult': 1.5,
+    'guard_stops': True,
+    'breakeven_r': 1.0,
+    'breakeven_offset_points': 0,
+    'trail_start_r': 1.5,
+    'trail_r': 1.0,
+    'stop_mode': 'monitor',
+}
+STOP_MODES = ('monitor', 'broker')
+
+
+def resolve_rules(rules=None, base=None):
+    """Rules merged over `base` (default DEFAULT_RULES); ValueError on unknown names"""
+    rules = rules or {}
+    unknown = set(rules) - set(DEFAULT_RULES)
+    if unknown:
+        raise ValueError(f"Unknown monitor rule(s): {', '.join(sorted(unknown))}")
+    merged = {**(base or DEFAULT_RULES), **rules}
+    if merged['timeframe'] not in TF_SECONDS:
+        raise ValueError(f"Unknown timeframe: {merged['timeframe']}")
+    if merged['stop_mode'] not in STOP_MODES:
+        raise ValueError(f"Unknown stop_mode: {merged['stop_mode']} (use {', '.join(STOP_MODES)})")
+    for name in ('range_mult', 'breakeven_r', 'breakeven_offset_points', 'trail_start_r', 'trail_r'):
+        merged[name] = float(merged[name])
+    return merged
+
+
+def load_monitor_config(value=None):
+    """POSITION_MONITOR -> (enabled, rules)"""
+    value = value if value is not None else os.environ.get('POSITION_MONITOR', '')
+    value = value.strip()
+    if value.lower() in ('', 'false', '0', 'no'):
+        return False, resolve_rules()
+    if value.lower() in ('true', '1', 'yes'):
+        return True, resolve_rules()
+    if not value.startswith('{'):
+        with open(value) as f:
+            value = f.read()
+    return True, resolve_rules(json.loads(value))
+
+
+class PositionMonitor:
+
+    def __init__(self, mt5, candle_cache, positions_cache, rules=None, logger=None, metrics=None, poll=POLL,
+                 symbol_cache=None, policy=None):
+        self.mt5 = mt5
+        self.cache = candle_cache
+        self.positions = positions_cache
+        self.symbols = symbol_cache or SymbolInfoCache()
+        self.policy = policy
+        self.rules = resolve_rules(rules)
+        self.poll = poll
+        self.log = logger
+        self._metrics = metrics or registry
+        self._ticks = {}            # symbol -> (time_msc, bid, ask) last evaluated
+        self._bars = {}             # symbol -> forming bar {time, open, high, low}
+        self._points = {}           # symbol -> point
+        self._state = {}            # ticket -> per-position exit state
+        self._exits = deque(maxlen=EXIT_LOG)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.ticks_seen = 0
+        self.errors = 0
+
+    # -------------------------------------------------------------------------
+    # Control
+    # -------------------------------------------------------------------------
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='position-monitor', daemon=True)
+            self._thread.start()
+        if self.log:
+            self.log.info('monitor_started', rules=self.rules)
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout=2.0)
+        if self.log:
+            self.log.info('monitor_stopped')
+
+    def configure(self, enabled=None, rules=None):
+        """Change rules (merged over the current ones) and/or start/stop"""
+        if rules is not None:
+            resolved = resolve_rules(rules, base=self.rules)
+            with self._lock:
+                self.rules = resolved
+                self._state.clear()     # risk / doji range depend on the rules
+                self._bars.clear()
+        if enabled is True:
+            self.start()
+        elif enabled is False:
+            self.stop()
+
+    def status(self):
+        with self._lock:
+            tracked = [{'ticket': ticket, **{k: v for k, v in s.items() if not k.endswith('_at')}}
+                       for ticket, s in self._state.items()]
+            exits = list(self._exits)
+        reactions = sorted(e['reaction_ms'] for e in exits if e['result'] in ('done', 'partial'))
+        return {
+            'running': self.running,
+            'rules': self.rules,
+            'poll_ms': self.poll * 1000,
+            'ticks_seen': self.ticks_seen,
+            'errors': self.errors,
+            'positions': tracked,
+            'exits': len(exits),
+            'reaction_ms': {
+                'p50': reactions[len(reactions) // 2] if reactions else None,
+                'max': reactions[-1] if reactions else None,
+            },
+        }
+
+    def exits(self, limit=50):
+        """Most recent exits first"""
+        with self._lock:
+            return list(self._exits)[::-1][:max(limit, 0)]
+
+    # -------------------------------------------------------------------------
+    # Loop
+    # -------------------------------------------------------------------------
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.perf_counter()
+            try:
+                busy = self._cycle()
+            except Exception as e:
+                self.errors += 1
+                if self.log:
+                    self.log.exception('monitor_error', error=str(e))
+                busy = False
+            wait = self.poll if busy else REFRESH
+            self._stop.wait(max(0.0, wait - (time.perf_counter() - started)))
+
+    def _cycle(self):
+        """One pass over the held symbols; False when there is nothing to watch"""
+        rules = self.rules
+        positions = self.positions.get(self.mt5, REFRESH)
+        if positions is None:
+            return False
+        mine = [p for p in positions if p.magic == rules['magic']]
+        with self._lock:
+            for ticket in set(self._state) - {p.ticket for p in mine}:
+                del self._state[ticket]
+        if not mine:
+            return False
+
+        by_symbol = {}
+        for pos in mine:
+            by_symbol.setdefault(pos.symbol, []).append(pos)
+        for symbol, held in by_symbol.items():
+            tick = self.mt5.symbol_info_tick(symbol)
+            seen = time.perf_counter_ns()
+            if tick is None:
+                continue
+            key = (tick.time_msc, tick.bid, tick.ask)
+            if self._ticks.get(symbol) == key:
+                continue
+            self._ticks[symbol] = key
+            self.ticks_seen += 1
+            bar = self._update_bar(symbol, tick, rules['timeframe'])
+            for pos in held:
+                self._evaluate(pos, tick, bar, seen, rules)
+        return True
+
+    # -------------------------------------------------------------------------
+    # Market state
+    # -------------------------------------------------------------------------
+    def _update_bar(self, symbol, tick, timeframe):
+        """Forming bar of `symbol`, extended with the tick's bid"""
+        seconds = TF_SECONDS[timeframe]
+        bar_time = int(tick.time) // seconds * seconds
+        bar = self._bars.get(symbol)
+        if bar is None or bar['time'] != bar_time:
+            bar = {'time': bar_time, 'open': tick.bid, 'high': tick.bid, 'low': tick.bid}
+            rates = self.cache.get(self.mt5, symbol, timeframe, 2)
+            if rates is not None and len(rates) and int(rates[-1]['time']) == bar_time:
+                forming = rates[-1]
+                bar.update(open=float(forming['open']), high=float(forming['high']), low=float(forming['low']))
+            self._bars[symbol] = bar
+        bar['high'] = max(bar['high'], tick.bid)
+        bar['low'] = min(bar['low'], tick.bid)
+        return bar
+
+    def _point(self, symbol):
+        if symbol not in self._points:
+            info = self.symbols.get(self.mt5, symbol)
+            self._points[symbol] = info.point if info is not None else 0.0
+        return self._points[symbol]
+
+    def _doji_range(self, pos, timeframe):
+        """Range of the last bar closed before the entry (else the previous closed bar)"""
+        seconds = TF_SECONDS[timeframe]
+        signal_time = int(pos.time) // seconds * seconds - seconds
+        bars_back = (self._bars[pos.symbol]['time'] - signal_time) // seconds + 1
+        rates = self.cache.get(self.mt5, pos.symbol, timeframe, int(min(max(bars_back, 2), 500)))
+        if rates is None or len(rates) < 2:
+            return 0.0
+        match = rates[rates['time'] == signal_time]
+        bar = match[0] if len(match) else rates[-2]
+        return float(bar['high'] - bar['low'])
+
+    def _position_state(self, pos, rules):
+        state = self._state.get(pos.ticket)
+        if state is None:
+            doji = self._doji_range(pos, rules['timeframe'])
+            state = {
+                'symbol': pos.symbol,
+                'doji_range': doji,
+                'risk': abs(pos.price_open - pos.sl) if pos.sl else doji,
+                'best': pos.price_open,
+                'stop': None,
+                'stop_rule': None,
+                'broker_sl': pos.sl,
+                'modify_at': 0.0,
+                'closed': False,
+                'retry_at': 0.0,
+            }
+            with self._lock:
+                self._state[pos.ticket] = state
+        return state
+
+    # -------------------------------------------------------------------------
+    # Rules
+    # -------------------------------------------------------------------------
+    def _evaluate(self, pos, tick, bar, seen, rules):
+        state = self._position_state(pos, rules)
+        if state['closed'] or time.monotonic() < state['retry_at']:
+            return
+        sign = 1 if pos.type == 0 else -1
+        price = tick.bid if sign > 0 else tick.ask
+        state['best'] = max(state['best'], price) if sign > 0 else min(state['best'], price)
+
+        rule = None
+        if rules['guard_stops']:
+            if pos.sl and sign * (price - pos.sl) <= 0:
+                rule = 'sl_guard'
+            elif pos.tp and sign * (price - pos.tp) >= 0:
+                rule = 'tp_guard'
+        if rule is None and state['stop'] is not None and sign * (price - state['stop']) <= 0:
+            rule = state['stop_rule']
+        doji = state['doji_range']
+        if rule is None and rules['range_breach'] and doji > 0:
+            against = sign * (pos.price_open - price)
+            bar_range = bar['high'] - bar['low']
+            bar_against = sign * (tick.bid - bar['open']) < 0
+            if against > doji and bar_range > rules['range_mult'] * doji and bar_against:
+                rule = 'range_breach'
+
+        if rule is not None:
+            self._close(pos, state, price, rule, seen, rules)
+        else:
+            self._move_stop(pos, state, sign, rules, tick)
+
+    def _move_stop(self, pos, state, sign, rules, tick):
+        risk = state['risk']
+        if not risk:
+            return
+        gained = sign * (state['best'] - pos.price_open)
+        levels = []
+        if rules['breakeven_r'] and gained >= rules['breakeven_r'] * risk:
+            offset = rules['breakeven_offset_points'] * self._point(pos.symbol)
+            levels.append((pos.price_open + sign * offset, 'breakeven'))
+        if rules['trail_start_r'] and gained >= rules['trail_start_r'] * risk:
+            levels.append((state['best'] - sign * rules['trail_r'] * risk, 'trailing_stop'))
+        for level, rule in levels:
+            if state['stop'] is None or sign * (level - state['stop']) > 0:
+                state['stop'], state['stop_rule'] = level, rule
+                if self.log:
+                    self.log.debug('monitor_stop_moved', ticket=pos.ticket, rule=rule, stop=level)
+        if rules['stop_mode'] == 'broker' and state['stop'] is not None:
+            self._push_stop(pos, state, sign, tick)
+
+    def _push_stop(self, pos, state, sign, tick):
+        """Write the monitor stop to the position's SL when it is at least a point tighter"""
+        point = self._point(pos.symbol)
+        if state['broker_sl'] and sign * (state['stop'] - state['broker_sl']) < max(point, 1e-12):
+            return
+        if time.monotonic() < state['modify_at']:
+            return
+        result = modify_positions(self.mt5, self.symbols, [(pos.ticket, state['stop'], None)],
+                                  positions=[pos], ticks={pos.symbol: tick})[0]
+        outcome = 'done' if result['success'] else result['reason']
+        self._metrics.counter('monitor_modify_total', 'Monitor stop moves written to the broker SL',
+                              result=outcome).inc()
+        if result['success']:
+            state['broker_sl'] = result['sl']
+            self.positions.invalidate()
+        else:
+            state['modify_at'] = time.monotonic() + RETRY
+            if self.log:
+                self.log.debug('monitor_modify_failed', ticket=pos.ticket, stop=state['stop'],
+                               reason=result['reason'], error=result.get('error'))
+
+    def _close(self, pos, state, price, rule, seen, rules):
+        mt5 = self.mt5
+        close_request = {
+            "action": mt5.TRADE_ACTION_DEAL,
+            "symbol": pos.symbol,
+            "volume": pos.volume,
+            "type": mt5.ORDER_TYPE_SELL if pos.type == 0 else mt5.ORDER_TYPE_BUY,
+            "position": pos.ticket,
+            "price": price,
+            "magic": pos.magic,
+            "comment": f"DojiHunter {rule}",
+            "type_time": mt5.ORDER_TIME_GTC,
+        }
+        if self.policy is not None:
+            self.policy.prepare(close_request)
+            close_request['deviation'] = rules['deviation']
+            result, attempts = self.policy.send(close_request)
+        else:
+            close_request.update(deviation=rules['deviation'], type_filling=mt5.ORDER_FILLING_IOC)
+            result, attempts = mt5.order_send(close_request), None
+        elapsed = time.perf_counter_ns() - seen
+        self._metrics.histogram('monitor_exit_seconds', 'Tick seen -> close order_send returned',
+                                rule=rule).record(elapsed)
+
+        retcode = result.retcode if result is not None else None
+        if retcode == mt5.TRADE_RETCODE_DONE:
+            outcome = 'done'
+            state['closed'] = True
+        elif retcode == mt5.TRADE_RETCODE_DONE_PARTIAL:
+            outcome = 'partial'         # the rest goes out on the next tick
+        elif retcode == mt5.TRADE_RETCODE_POSITION_CLOSED:
+            outcome = 'gone'            # the broker (SL/TP) or someone else was first
+            state['closed'] = True
+        else:
+            outcome = 'failed'
+            state['retry_at'] = time.monotonic() + RETRY
+        if outcome != 'failed':
+            self.positions.invalidate()
+        self._metrics.counter('monitor_exits_total', 'Monitor closes by rule and outcome',
+                              rule=rule, result=outcome).inc()
+
+        record = {
+            'ticket': pos.ticket,
+            'symbol': pos.symbol,
+            'type': 'BUY' if pos.type == 0 else 'SELL',
+            'rule': rule,
+            'result': outcome,
+            'retcode': retcode,
+            'volume': pos.volume,
+            'closed_volume': result.volume if result is not None else 0.0,
+            'trigger_price': price,
+            'close_price': result.price if result is not None else None,
+            'stop': state['stop'],
+            'doji_range': state['doji_range'],
+            'reaction_ms': round(elapsed / 1e6, 3),
+            'attempts': len(attempts) if attempts else 1,
+            'time': time.time(),
+        }
+        if outcome in ('failed', 'gone'):
+            record['error'] = result.comment if result is not None else str(mt5.last_error())
+        with self._lock:
+            self._exits.append(record)
+        if self.log:
+            log = self.log.warning if outcome == 'failed' else self.log.info
+            log('monitor_exit', **record)
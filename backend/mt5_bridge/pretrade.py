@@ -0,0 +1,148 @@
+"""
+=============================================================================
+PRE-TRADE CHECKS - REFUSE DOOMED ORDERS BEFORE THEY REACH THE BROKER
+=============================================================================
+
+A rejected order_send costs a full trip to the trade server. Before /order
+sends, the request goes through (symbol info and account from caches):
+
+    volume      rounded to volume_step and clamped to [volume_min,
+                volume_max]; the adjustment is returned to the caller
+    trade mode  symbol disabled, close-only, long-only or short-only
+    stops       SL / TP at least stops_level points from the price
+    margin      local        margin for 1 lot from order_calc_margin(),
+                             cached per symbol/side for MARGIN_TTL seconds
+                             (or until the price moves MARGIN_REPRICE),
+                             times the volume, against the cached
+                             account margin_free
+                order_check  mt5.order_check() on the final request
+                             (answered by the terminal, not the server)
+                off          no margin check
+
+PRETRADE_MODE = local (default) | order_check | off
+Outcomes: pretrade_total{result=pass|reject, reason=...}
+=============================================================================
+"""
+
+import math
+import threading
+import time
+
+from metrics import registry
+from sltp import check_stops
+
+
+PRETRADE_MODES = ('local', 'order_check', 'off')
+MARGIN_TTL = 60.0
+MARGIN_REPRICE = 0.01       # re-ask order_calc_margin after a 1 % price move
+ACCOUNT_MAX_AGE = 1.0
+
+
+def normalize_volume(info, volume):
+    """(volume on the symbol's step grid within min/max, description of the change or None)"""
+    step = info.volume_step or 0.01
+    digits = max(0, -int(math.floor(math.log10(step)))) if step < 1 else 0
+    adjusted = round(round(volume / step) * step, digits)
+    adjusted = min(max(adjusted, info.volume_min), info.volume_max)
+    adjusted = round(adjusted, digits)
+    if abs(adjusted - volume) < 1e-9:
+        return volume, None
+    if adjusted == info.volume_min and volume < info.volume_min:
+        why = f'raised to volume_min {info.volume_min}'
+    elif adjusted == info.volume_max and volume > info.volume_max:
+        why = f'capped at volume_max {info.volume_max}'
+    else:
+        why = f'rounded to volume_step {step}'
+    return adjusted, why
+
+
+class PreTradeCheck:
+
+    def __init__(self, mt5, symbol_cache, account_cache, mode='local', metrics=None):
+        if mode not in PRETRADE_MODES:
+            raise ValueError(f"Unknown PRETRADE_MODE: {mode} (use {', '.join(PRETRADE_MODES)})")
+        self.mt5 = mt5
+        self.symbols = symbol_cache
+        self.account = account_cache
+        self.mode = mode
+        self._metrics = metrics or registry
+        self._margins = {}          # (symbol, order type) -> (margin per lot, price, fetched)
+        self._lock = threading.Lock()
+
+    def _count(self, result, reason):
+        self._metrics.counter('pretrade_total', 'Pre-trade checks by outcome', result=result, reason=reason).inc()
+
+    def _reject(self, outcome, reason, error, **extra):
+        self._count('reject', reason)
+        outcome.update(ok=False, reason=reason, error=error, **extra)
+        return outcome
+
+    def margin_per_lot(self, symbol, order_type, price):
+        """Margin of 1 lot at `price`, or None when the terminal can't tell"""
+        key = (symbol, order_type)
+        with self._lock:
+            cached = self._margins.get(key)
+        if cached is not None and time.monotonic() - cached[2] < MARGIN_TTL \
+                and abs(price / cached[1] - 1) < MARGIN_REPRICE:
+            return cached[0]
+        per_lot = self.mt5.order_calc_margin(order_type, symbol, 1.0, price)
+        if per_lot is None:
+            return None
+        with self._lock:
+            self._margins[key] = (per_lot, price, time.monotonic())
+        return per_lot
+
+    def check(self, order_request, tick):
+        """
+        Check a market order request (TRADE_ACTION_DEAL) against the cached
+        symbol and account state -> {ok, volume, adjustment, reason, error, ...}.
+        The request itself is not changed; send it with the returned volume.
+        """
+        mt5 = self.mt5
+        symbol = order_request['symbol']
+        buy = order_request['type'] == mt5.ORDER_TYPE_BUY
+        volume = float(order_request['volume'])
+        outcome = {'ok': True, 'volume': volume, 'adjustment': None, 'mode': self.mode}
+
+        info = self.symbols.get(mt5, symbol)
+        if info is None:
+            return self._reject(outcome, 'unknown_symbol', f'Symbol {symbol} not found')
+        if volume <= 0:
+            return self._reject(outcome, 'invalid_volume', f'Volume must be > 0, got {volume}')
+        volume, adjustment = normalize_volume(info, volume)
+        outcome.update(volume=volume, adjustment=adjustment)
+
+        mode = getattr(info, 'trade_mode', None)
+        if mode == getattr(mt5, 'SYMBOL_TRADE_MODE_DISABLED', 0):
+            return self._reject(outcome, 'trade_disabled', f'Trading is disabled for {symbol}')
+        if mode == getattr(mt5, 'SYMBOL_TRADE_MODE_CLOSEONLY', 3):
+            return self._reject(outcome, 'trade_disabled', f'{symbol} is close-only')
+        if mode == getattr(mt5, 'SYMBOL_TRADE_MODE_LONGONLY', 1) and not buy:
+            return self._reject(outcome, 'trade_disabled', f'{symbol} is long-only')
+        if mode == getattr(mt5, 'SYMBOL_TRADE_MODE_SHORTONLY', 2) and buy:
+            return self._reject(outcome, 'trade_disabled', f'{symbol} is short-only')
+
+        error = check_stops(info, buy, tick.bid, tick.ask, order_request.get('sl') or 0.0,
+                            order_request.get('tp') or 0.0)
+        if error:
+            return self._reject(outcome, 'invalid_stops', error)
+
+        if self.mode == 'local':
+            per_lot = self.margin_per_lot(symbol, order_request['type'], order_request['price'])
+            account = self.account.get(mt5, ACCOUNT_MAX_AGE)
+            if per_lot is not None and account is not None:
+                required = round(per_lot * volume, 2)
+                outcome.update(margin_required=required, margin_free=account.margin_free)
+                if required > account.margin_free:
+                    return self._reject(outcome, 'no_money',
+                                        f'Margin {required} needed, {account.margin_free} free')
+        elif self.mode == 'order_check':
+            checked = mt5.order_check({**order_request, 'volume': volume})
+            if checked is not None:
+                outcome.update(margin_after=round(checked.margin, 2), margin_free_after=checked.margin_free)
+                if checked.retcode not in (0, mt5.TRADE_RETCODE_DONE):
+                    return self._reject(outcome, 'order_check', f'order_check: {checked.comment}',
+                                        retcode=checked.retcode)
+
+        self._count('pass', 'adjusted' if adjustment else 'ok')
+        return outcome
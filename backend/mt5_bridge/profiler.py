@@ -0,0 +1,144 @@
+"""
+=============================================================================
+SAMPLING PROFILER - LIVE "WHERE DOES PYTHON TIME GO?"
+=============================================================================
+
+sample() runs on the calling thread (the /debug/profile request): for the
+requested duration it walks sys._current_frames() at a fixed interval,
+sleeping in between, and counts the stack of every other thread (request
+threads, werkzeug workers, log listener, ...) - its own thread is skipped.
+Nothing is installed into the profiled threads, so the overhead is one
+stack walk per thread per tick, and the profile request holds its worker
+thread for the whole duration.
+
+Output formats:
+    collapsed   "thread;outer (file:line);...;inner (file:line) <count>"
+                per line - feed to flamegraph.pl / speedscope / inferno
+    speedscope  speedscope.app JSON, one sampled profile per thread
+
+OPT-IN ONLY: the /debug/profile endpoint is disabled unless
+BRIDGE_ENABLE_PROFILER=true.
+=============================================================================
+"""
+
+import math
+import os
+import sys
+import threading
+import time
+
+
+DEFAULT_INTERVAL = 0.005
+MAX_SECONDS = 60
+
+SPEEDSCOPE_SCHEMA = 'https://www.speedscope.app/file-format-schema.json'
+
+_busy = threading.Lock()
+
+
+def profiler_enabled():
+    return os.environ.get('BRIDGE_ENABLE_PROFILER', 'false').lower() == 'true'
+
+
+class ProfilerBusy(Exception):
+    """Only one profile can run at a time"""
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample(seconds, interval=DEFAULT_INTERVAL):
+    """
+    Sample all threads for `seconds`.
+    Returns (stacks, meta) where stacks maps (thread_name, (frame, ...)) -> count,
+    frames ordered outermost first. ValueError unless both are finite and > 0
+    (a NaN deadline would never pass and keep the profiler busy forever).
+    """
+    if not (math.isfinite(seconds) and seconds > 0 and math.isfinite(interval) and interval > 0):
+        raise ValueError("seconds and interval must be finite and > 0")
+    if not _busy.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running")
+    try:
+        me = threading.get_ident()
+        stacks = {}
+        samples = 0
+        started = time.perf_counter()
+        deadline = started + seconds
+        label_cache = {}
+
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = label_cache.get(code)
+                    if label is None:
+                        label = label_cache[code] = _frame_label(code)
+                    stack.append(label)
+                    frame = frame.f_back
+                stack.reverse()
+                key = (names.get(ident, f"thread-{ident}"), tuple(stack))
+                stacks[key] = stacks.get(key, 0) + 1
+            samples += 1
+            time.sleep(max(0.0, interval - (time.perf_counter() - now)))
+
+        meta = {
+            'duration_s': round(time.perf_counter() - started, 3),
+            'interval_s': interval,
+            'samples': samples,
+        }
+        return stacks, meta
+    finally:
+        _busy.release()
+
+
+def to_collapsed(stacks):
+    lines = []
+    for (thread_name, frames), count in sorted(stacks.items(), key=lambda kv: -kv[1]):
+        lines.append(';'.join((thread_name,) + frames) + f" {count}")
+    return '\n'.join(lines) + '\n'
+
+
+def to_speedscope(stacks, meta, name='mt5_bridge'):
+    frames = []
+    frame_index = {}
+    by_thread = {}
+    for (thread_name, stack), count in stacks.items():
+        indices = []
+        for label in stack:
+            idx = frame_index.get(label)
+            if idx is None:
+                idx = frame_index[label] = len(frames)
+                func, _, location = label.partition(' (')
+                file, _, line = location.rstrip(')').rpartition(':')
+                frames.append({'name': func, 'file': file, 'line': int(line) if line.isdigit() else None})
+            indices.append(idx)
+        by_thread.setdefault(thread_name, []).append((indices, count))
+
+    interval = meta['interval_s']
+    profiles = []
+    for thread_name, entries in sorted(by_thread.items()):
+        profiles.append({
+            'type': 'sampled',
+            'name': thread_name,
+            'unit': 'seconds',
+            'startValue': 0,
+            'endValue': sum(count for _, count in entries) * interval,
+            'samples': [indices for indices, _ in entries],
+            'weights': [count * interval for _, count in entries],
+        })
+
+    return {
+        '$schema': SPEEDSCOPE_SCHEMA,
+        'name': name,
+        'exporter': 'mt5_bridge.profiler',
+        'shared': {'frames': frames},
+        'profiles': profiles,
+    }
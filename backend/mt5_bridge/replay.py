@@ -0,0 +1,298 @@
+"""
+=============================================================================
+HISTORICAL REPLAY - RECORDED CANDLES/TICKS ON A SIMULATED CLOCK
+=============================================================================
+
+Lets the simulator re-run a real trading day through the whole bridge:
+
+    clock = SimClock(start=feed.start_time(warmup_bars=200), speed=100)
+    sim = MT5Simulator(replay=feed, clock=clock)
+
+Every MT5 call answers "as of" clock.now():
+    copy_rates_from_pos   closed bars + the bar that is still forming
+    symbol_info_tick      last recorded tick, or a price interpolated
+                          along the bar's O-H-L-C path when only bars exist
+    positions_get         marked to market at that same instant
+
+Nothing from the future leaks out: the forming bar only contains the part
+of the bar that has already happened.
+
+FILE LAYOUT (one directory):
+    EURUSD_M1.csv | .npy | .parquet      bars  (any timeframe, see TF_SECONDS)
+    EURUSD_ticks.csv | .npy | .parquet   ticks (optional)
+
+Higher timeframes missing on disk are aggregated from the smallest one.
+=============================================================================
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+
+from market_data import RATES_DTYPE, TICKS_DTYPE, aggregate_rates, load_rates, load_ticks
+
+
+TF_SECONDS = {
+    'M1': 60, 'M5': 300, 'M15': 900, 'M30': 1800,
+    'H1': 3600, 'H4': 14400, 'D1': 86400,
+}
+
+
+class SimClock:
+    """
+    Simulated unix time running `speed` times faster than the wall clock.
+    Stops at `end` (if given) instead of running past the recorded data.
+    """
+
+    def __init__(self, start, speed=1.0, end=None):
+        self._lock = threading.Lock()
+        self._start = float(start)
+        self._real_start = time.monotonic()
+        self.speed = float(speed)
+        self.end = end
+        self.paused_at = None
+
+    def __call__(self):
+        return self.now()
+
+    def now(self):
+        with self._lock:
+            if self.paused_at is not None:
+                t = self.paused_at
+            else:
+                t = self._start + (time.monotonic() - self._real_start) * self.speed
+        return min(t, self.end) if self.end is not None else t
+
+    def set(self, t):
+        with self._lock:
+            self._start = float(t)
+            self._real_start = time.monotonic()
+            if self.paused_at is not None:
+                self.paused_at = float(t)
+
+    def set_speed(self, speed):
+        now = self.now()
+        with self._lock:
+            self.speed = float(speed)
+            self._start = now
+            self._real_start = time.monotonic()
+
+    def pause(self):
+        self.paused_at = self.now()
+
+    def resume(self):
+        if self.paused_at is not None:
+            t, self.paused_at = self.paused_at, None
+            self.set(t)
+
+
+_PATH_X = (0.0, 1 / 3, 2 / 3, 1.0)
+
+
+def _path_points(bar):
+    o, h, l, c = float(bar['open']), float(bar['high']), float(bar['low']), float(bar['close'])
+    # Bullish bars are assumed to go O-L-H-C, bearish ones O-H-L-C
+    return (o, l, h, c) if c >= o else (o, h, l, c)
+
+
+def _path_price(bar, fraction):
+    return float(np.interp(fraction, _PATH_X, _path_points(bar)))
+
+
+def _path_range(bar, f0, f1):
+    """(low, high) traded along the bar path between fractions f0 and f1"""
+    points = _path_points(bar)
+    seen = [_path_price(bar, f0), _path_price(bar, f1)]
+    seen += [p for x, p in zip(_PATH_X, points) if f0 < x < f1]
+    return min(seen), max(seen)
+
+
+class ReplayFeed:
+    """Recorded bars and ticks per symbol, answered as of a given time"""
+
+    def __init__(self):
+        self._rates = {}
+        self._ticks = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_directory(cls, path):
+        feed = cls()
+        for name in sorted(os.listdir(path)):
+            stem, ext = os.path.splitext(name)
+            if ext not in ('.csv', '.npy', '.parquet') or '_' not in stem:
+                continue
+            symbol, kind = stem.rsplit('_', 1)
+            full = os.path.join(path, name)
+            if kind.lower() == 'ticks':
+                feed.add_ticks(symbol, load_ticks(full))
+            elif kind.upper() in TF_SECONDS:
+                feed.add_rates(symbol, kind.upper(), load_rates(full))
+        if not feed.symbols():
+            raise ValueError(f"No replay files found in {path}")
+        return feed
+
+    def add_rates(self, symbol, timeframe, rates):
+        rates = np.sort(np.asarray(rates, dtype=RATES_DTYPE), order='time')
+        with self._lock:
+            self._rates[(symbol, timeframe)] = rates
+
+    def add_ticks(self, symbol, ticks):
+        ticks = np.sort(np.asarray(ticks, dtype=TICKS_DTYPE), order='time_msc')
+        with self._lock:
+            self._ticks[symbol] = ticks
+
+    def symbols(self):
+        return sorted({s for s, _ in self._rates} | set(self._ticks))
+
+    def rates(self, symbol, timeframe):
+        """Full bar history for a timeframe, aggregated from a smaller one if needed"""
+        key = (symbol, timeframe)
+        series = self._rates.get(key)
+        if series is not None:
+            return series
+        target = TF_SECONDS[timeframe]
+        candidates = sorted(
+            (TF_SECONDS[tf], tf) for (s, tf) in self._rates
+            if s == symbol and TF_SECONDS[tf] < target and target % TF_SECONDS[tf] == 0
+        )
+        if not candidates:
+            return None
+        series = aggregate_rates(self._rates[(symbol, candidates[0][1])], target)
+        with self._lock:
+            self._rates[key] = series
+        return series
+
+    def _base_rates(self, symbol):
+        options = sorted((TF_SECONDS[tf], tf) for (s, tf) in self._rates if s == symbol)
+        return (self._rates[(symbol, options[0][1])], options[0][0]) if options else (None, None)
+
+    def start_time(self, warmup_bars=0):
+        """First time at which every symbol has `warmup_bars` of history behind it"""
+        starts = []
+        for (symbol, tf), series in self._rates.items():
+            if len(series):
+                starts.append(int(series['time'][min(warmup_bars, len(series) - 1)]))
+        for ticks in self._ticks.values():
+            if len(ticks):
+                starts.append(int(ticks['time_msc'][0] // 1000))
+        return max(starts)
+
+    def end_time(self):
+        ends = []
+        for (symbol, tf), series in self._rates.items():
+            if len(series):
+                ends.append(int(series['time'][-1]) + TF_SECONDS[tf])
+        for ticks in self._ticks.values():
+            if len(ticks):
+                ends.append(int(ticks['time_msc'][-1] // 1000))
+        return max(ends)
+
+    # -------------------------------------------------------------------------
+    # Point-in-time queries
+    # -------------------------------------------------------------------------
+    def quote(self, symbol, t, point=0.00001, digits=5):
+        """(bid, ask) at time t, or None before the data starts"""
+        ticks = self._ticks.get(symbol)
+        if ticks is not None and len(ticks):
+            i = int(np.searchsorted(ticks['time_msc'], int(t * 1000), side='right')) - 1
+            if i < 0:
+                return None
+            return float(ticks['bid'][i]), float(ticks['ask'][i])
+
+        series, tf_seconds = self._base_rates(symbol)
+        if series is None:
+            return None
+        i = int(np.searchsorted(series['time'], t, side='right')) - 1
+        if i < 0:
+            return None
+        bar = series[i]
+        bid = round(_path_price(bar, min(1.0, (t - bar['time']) / tf_seconds)), digits)
+        return bid, round(bid + int(bar['spread']) * point, digits)
+
+    def bid_range(self, symbol, t0, t1):
+        """(low, high) of the bid between t0 and t1 - used for SL/TP touches"""
+        ticks = self._ticks.get(symbol)
+        if ticks is not None and len(ticks):
+            lo = int(np.searchsorted(ticks['time_msc'], int(t0 * 1000), side='left'))
+            hi = int(np.searchsorted(ticks['time_msc'], int(t1 * 1000), side='right'))
+            if hi > lo:
+                window = ticks['bid'][lo:hi]
+                return float(window.min()), float(window.max())
+            return None
+
+        series, tf_seconds = self._base_rates(symbol)
+        if series is None:
+            return None
+        lo = max(0, int(np.searchsorted(series['time'], t0, side='right')) - 1)
+        hi = int(np.searchsorted(series['time'], t1, side='right'))
+        if hi <= lo:
+            return None
+        lows, highs = [], []
+        for bar in series[lo:hi]:
+            f0 = min(1.0, max(0.0, (t0 - bar['time']) / tf_seconds))
+            f1 = min(1.0, max(0.0, (t1 - bar['time']) / tf_seconds))
+            if f0 == 0.0 and f1 == 1.0:
+                low, high = float(bar['low']), float(bar['high'])
+            else:
+                low, high = _path_range(bar, f0, f1)
+            lows.append(low)
+            highs.append(high)
+        return float(min(lows)), float(max(highs))
+
+    def rates_at(self, symbol, timeframe, t, start_pos, count, digits=5):
+        """
+        Bars as copy_rates_from_pos would return them at time t.
+        Position 0 is the forming bar, trimmed to what has happened so far.
+        """
+        series = self.rates(symbol, timeframe)
+        if series is None:
+            return None
+        tf_seconds = TF_SECONDS[timeframe]
+        visible = int(np.searchsorted(series['time'], t, side='right'))
+        end = visible - start_pos
+        if end <= 0:
+            return np.zeros(0, dtype=RATES_DTYPE)
+        out = series[max(0, end - count):end].copy()
+
+        if start_pos == 0 and len(out):
+            bar = out[-1]
+            if t < bar['time'] + tf_seconds:
+                self._trim_forming_bar(symbol, bar, t, tf_seconds, digits)
+                out[-1] = bar
+        return out
+
+    def _trim_forming_bar(self, symbol, bar, t, tf_seconds, digits):
+        ticks = self._ticks.get(symbol)
+        if ticks is not None and len(ticks):
+            lo = int(np.searchsorted(ticks['time_msc'], int(bar['time']) * 1000, side='left'))
+            hi = int(np.searchsorted(ticks['time_msc'], int(t * 1000), side='right'))
+            if hi > lo:
+                bids = ticks['bid'][lo:hi]
+                bar['close'] = bids[-1]
+                bar['high'] = max(bar['open'], bids.max())
+                bar['low'] = min(bar['open'], bids.min())
+                bar['tick_volume'] = hi - lo
+                return
+
+        # Built from finer bars when we have them, so candles agree with quote()
+        base, base_seconds = self._base_rates(symbol)
+        if base is not None and base_seconds < tf_seconds:
+            lo = int(np.searchsorted(base['time'], bar['time'], side='left'))
+            hi = int(np.searchsorted(base['time'], t, side='right'))
+            if hi > lo:
+                inner = base[lo:hi].copy()
+                self._trim_forming_bar(symbol, inner[-1], t, base_seconds, digits)
+                bar['close'] = inner['close'][-1]
+                bar['high'] = inner['high'].max()
+                bar['low'] = inner['low'].min()
+                bar['tick_volume'] = inner['tick_volume'].sum()
+                return
+
+        fraction = (t - bar['time']) / tf_seconds
+        low, high = _path_range(bar, 0.0, fraction)
+        bar['tick_volume'] = int(bar['tick_volume'] * fraction)
+        close = _path_price(bar, fraction)
+        bar['close'], bar['high'], bar['low'] = (round(v, digits) for v in (close, high, low))
@@ -0,0 +1,545 @@
+"""
+=============================================================================
+ROBUSTNESS - WALK-FORWARD AND MONTE CARLO EVALUATION
+=============================================================================
+
+A single backtest over all history is tuned on the same bars it is scored
+on. Two checks against that, both spread over a process pool:
+
+WALK-FORWARD
+    Rolling windows: pick the best combination of a grid/random spec on
+    `train_bars`, then score ONLY that choice on the following `test_bars`;
+    slide by `test_bars` (anchored keeps the train start at bar 0). The
+    out-of-sample trades of all folds are the honest result;
+    efficiency = out-of-sample avg R / in-sample avg R. Workers attach to
+    the candles in shared memory (see sweep.py).
+
+MONTE CARLO
+    One backtest, then `sims` resampled trade sequences:
+        shuffle     same trades, random order     -> drawdown distribution
+        bootstrap   trades drawn with replacement -> result distribution
+    Each trade can also pay random slippage, U(0, slippage_points) * point
+    on entry and again on exit. Reported as percentiles.
+
+BATCH JOBS
+    The bridge runs either mode as a job (BacktestJobs): the candles are
+    saved to <jobs dir>/<id>/rates.npy and `python robustness.py job <dir>`
+    runs in its own process - its own pool, away from the Flask threads -
+    printing progress as JSON lines that /backtest/jobs/<id>/events streams.
+
+USAGE:
+    python robustness.py walk-forward --file EURUSD_M15.csv --train 20000 --test 5000 \\
+        --grid '{"sl_mult": [1, 1.5, 2], "tp_mult": [1.5, 2, 3]}'
+    python robustness.py monte-carlo --file EURUSD_M15.csv --sims 10000 --slippage 3 \\
+        --params '{"point": 0.00001}'
+=============================================================================
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from backtest import (add_source_arguments, load_source, max_drawdown, resolve_params,
+                      simulate_trades, summarize)
+from sweep import RANK_METRICS, SharedRates, grid, load_spec, open_pool, random_search, rank, worker_rates
+
+
+MODES = ('walk_forward', 'monte_carlo')
+MC_METHODS = ('shuffle', 'bootstrap')
+PERCENTILES = (5, 25, 50, 75, 95)
+MC_CHUNK = 250                  # simulations per pool task
+MC_MAX_CELLS = 2_000_000        # simulations x trades per vectorized block
+PROGRESS_STEPS = 50
+
+
+def r_stats(r):
+    """Statistics of a trade sequence given as R multiples"""
+    r = np.asarray(r, dtype=np.float64)
+    if len(r) == 0:
+        return {'trades': 0, 'hit_rate': None, 'total_r': 0.0, 'avg_r': None, 'max_drawdown_r': 0.0}
+    cum = np.cumsum(r)
+    return {
+        'trades': int(len(r)),
+        'hit_rate': round(float((r > 0).mean()), 4),
+        'total_r': round(float(cum[-1]), 3),
+        'avg_r': round(float(r.mean()), 4),
+        'max_drawdown_r': round(float(max_drawdown(cum)), 3),
+    }
+
+
+def _percentiles(values):
+    return {f'p{p}': round(float(v), 4) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+
+
+def _reporter(progress, phase, total):
+    """progress() at most PROGRESS_STEPS times per phase, and at the end"""
+    every = max(1, total // PROGRESS_STEPS)
+
+    def report(done):
+        if progress and (done % every == 0 or done == total):
+            progress({'type': 'progress', 'phase': phase, 'done': done, 'total': total})
+    return report
+
+
+# =============================================================================
+# WALK-FORWARD
+# =============================================================================
+def walk_forward_windows(n, train_bars, test_bars, anchored=False):
+    """[(train_start, train_end, test_end), ...] covering n bars"""
+    if train_bars <= 0 or test_bars <= 0:
+        raise ValueError('train_bars and test_bars must be positive')
+    folds = []
+    start = 0
+    while start + train_bars + test_bars <= n:
+        train_end = start + train_bars
+        folds.append((0 if anchored else start, train_end, train_end + test_bars))
+        start += test_bars
+    return folds
+
+
+def _run_window(task):
+    fold, start, stop, combo, with_r = task
+    rates, base = worker_rates()
+    try:
+        window = rates[start:stop]
+        params = resolve_params({**base, **combo})
+        trades = simulate_trades(window, params)
+        report = summarize(trades, window, params, curve_points=0)
+        report.pop('equity_curve')
+        return fold, combo, report, trades['r'].tolist() if with_r else None, None
+    except Exception as e:
+        return fold, combo, None, None, f'{type(e).__name__}: {e}'
+
+
+def walk_forward(rates, combos, train_bars, test_bars, base_params=None, anchored=False,
+                 metric='total_r', min_trades=30, workers=None, progress=None):
+    base_params = dict(base_params or {})
+    for combo in combos:
+        resolve_params({**base_params, **combo})
+    folds = walk_forward_windows(len(rates), train_bars, test_bars, anchored)
+    if not folds:
+        raise ValueError(f'{len(rates)} bars is not enough for one {train_bars}+{test_bars} window')
+    times = np.asarray(rates['time'])
+    workers = workers or os.cpu_count() or 1
+
+    with SharedRates(rates) as shared, open_pool(shared, base_params, workers) as pool:
+        tasks = [(i, train_start, train_end, combo, False)
+                 for i, (train_start, train_end, _) in enumerate(folds) for combo in combos]
+        chunksize = max(1, min(16, len(tasks) // (workers * 4)))
+        report = _reporter(progress, 'train', len(tasks))
+        trained = defaultdict(list)
+        for done, (fold, combo, result, _, error) in enumerate(
+                pool.imap_unordered(_run_window, tasks, chunksize), 1):
+            trained[fold].append({'params': combo, 'report': result, 'error': error})
+            report(done)
+
+        best = {}
+        for fold in range(len(folds)):
+            ranked = rank(trained[fold], metric, min_trades)
+            if ranked:
+                best[fold] = ranked[0]
+        tasks = [(fold, folds[fold][1], folds[fold][2], row['params'], True) for fold, row in best.items()]
+        report = _reporter(progress, 'test', len(tasks))
+        tested = {}
+        for done, (fold, _, result, r, error) in enumerate(pool.imap_unordered(_run_window, tasks), 1):
+            tested[fold] = (result, r, error)
+            report(done)
+
+    out_folds, oos_r, in_sample = [], [], []
+    for fold, (train_start, train_end, test_end) in enumerate(folds):
+        entry = {
+            'fold': fold,
+            'train': [int(times[train_start]), int(times[train_end - 1])],
+            'test': [int(times[train_end]), int(times[test_end - 1])],
+            'failed': sum(1 for row in trained[fold] if row['error']),
+        }
+        if fold not in best:
+            entry['skipped'] = f'no combination with >= {min_trades} trades'
+        else:
+            result, r, error = tested[fold]
+            entry.update({
+                'params': best[fold]['params'],
+                'train_report': best[fold]['report'],
+                'test_report': result,
+                'error': error,
+            })
+            if r is not None:
+                oos_r.extend(r)
+                in_sample.append(best[fold]['report']['avg_r'])
+        out_folds.append(entry)
+
+    oos = r_stats(oos_r)
+    is_avg = float(np.mean(in_sample)) if in_sample else None
+    stability = defaultdict(Counter)
+    for fold in best.values():
+        for name, value in fold['params'].items():
+            stability[name][json.dumps(value)] += 1
+    return {
+        'mode': 'walk_forward',
+        'bars': len(rates),
+        'combinations': len(combos),
+        'metric': metric,
+        'folds': out_folds,
+        'out_of_sample': oos,
+        'in_sample_avg_r': round(is_avg, 4) if is_avg is not None else None,
+        'efficiency': round(oos['avg_r'] / is_avg, 3) if is_avg and oos['avg_r'] is not None and is_avg > 0 else None,
+        # how often each value was the fold's choice - stable choices repeat
+        'param_stability': {name: dict(counts.most_common()) for name, counts in stability.items()},
+    }
+
+
+# =============================================================================
+# MONTE CARLO
+# =============================================================================
+def _mc_chunk(task):
+    r, risk, seed, sims, method, slippage, risk_fraction = task
+    rng = np.random.default_rng(seed)
+    n = len(r)
+    block = max(1, MC_MAX_CELLS // n)
+    parts = []
+    for start in range(0, sims, block):
+        m = min(block, sims - start)
+        if method == 'shuffle':
+            index = rng.permuted(np.tile(np.arange(n), (m, 1)), axis=1)
+        else:
+            index = rng.integers(0, n, size=(m, n))
+        sample = r[index]
+        if slippage:
+            sample = sample - rng.uniform(0, slippage, size=(2, m, n)).sum(axis=0) / risk[index]
+        cum = np.cumsum(sample, axis=1)
+        equity = np.cumprod(np.maximum(1.0 + risk_fraction * sample, 0.0), axis=1)
+        peak = np.maximum.accumulate(np.maximum(equity, 1.0), axis=1)
+        parts.append(np.stack((
+            cum[:, -1],
+            max_drawdown(cum, axis=1),
+            equity[:, -1],
+            np.max(1 - equity / peak, axis=1) * 100,
+        ), axis=1))
+    return np.concatenate(parts)
+
+
+def monte_carlo(rates, params=None, sims=1000, method='shuffle', slippage_points=0.0, seed=0,
+                workers=None, progress=None):
+    params = resolve_params(params)
+    if method not in MC_METHODS:
+        raise ValueError(f"Unknown method: {method} (use {', '.join(MC_METHODS)})")
+    if slippage_points and not params['point']:
+        raise ValueError('slippage_points needs params.point (price of one point)')
+    if sims <= 0:
+        raise ValueError('sims must be positive')
+
+    trades = simulate_trades(rates, params)
+    r = trades['r']
+    result = {
+        'mode': 'monte_carlo',
+        'bars': len(rates),
+        'method': method,
+        'sims': sims,
+        'slippage_points': slippage_points,
+        'params': {k: list(v) if isinstance(v, tuple) else v for k, v in params.items()},
+        'baseline': r_stats(r),
+    }
+    if len(r) == 0:
+        return result
+
+    risk = np.abs(trades['entry'] - trades['sl'])
+    risk = np.where(risk > 0, risk, np.inf)
+    slippage = slippage_points * params['point']
+    sizes = [min(MC_CHUNK, sims - start) for start in range(0, sims, MC_CHUNK)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(r, risk, s, size, method, slippage, params['risk_fraction']) for s, size in zip(seeds, sizes)]
+
+    report = _reporter(progress, 'monte_carlo', sims)
+    parts, done = [], 0
+    with multiprocessing.Pool(workers or os.cpu_count() or 1) as pool:
+        for part in pool.imap(_mc_chunk, tasks):
+            parts.append(part)
+            done += len(part)
+            report(done)
+    outcomes = np.concatenate(parts)
+
+    result.update({
+        'total_r': _percentiles(outcomes[:, 0]),
+        'max_drawdown_r': _percentiles(outcomes[:, 1]),
+        'final_equity': _percentiles(outcomes[:, 2]),
+        'max_drawdown_pct': _percentiles(outcomes[:, 3]),
+        'prob_loss': round(float((outcomes[:, 0] < 0).mean()), 4),
+    })
+    return result
+
+
+# =============================================================================
+# JOB SPECS
+# =============================================================================
+def _combos(spec):
+    if 'grid' in spec:
+        return grid(spec['grid'])
+    if 'random' in spec:
+        return random_search(spec['random'], int(spec.get('samples', 100)), int(spec.get('seed', 0)))
+    raise ValueError('walk_forward needs "grid" or "random"')
+
+
+def validate_job(spec):
+    """
+    Raise ValueError for a spec run_job would reject - before any work starts.
+    `workers` is clamped in place to [1, cpu count]: specs come over HTTP.
+    """
+    mode = spec.get('mode')
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode: {mode} (use {', '.join(MODES)})")
+    if spec.get('workers') is not None:
+        try:
+            workers = int(spec['workers'])
+        except (TypeError, ValueError):
+            raise ValueError('workers must be an integer')
+        spec['workers'] = max(1, min(workers, os.cpu_count() or 1))
+    if mode == 'walk_forward':
+        for key in ('train_bars', 'test_bars'):
+            if int(spec.get(key, 0)) <= 0:
+                raise ValueError(f'walk_forward needs a positive {key}')
+        if spec.get('rank_by', 'total_r') not in RANK_METRICS:
+            raise ValueError(f"Unknown rank metric: {spec['rank_by']}")
+        base = spec.get('base') or {}
+        for combo in _combos(spec):
+            resolve_params({**base, **combo})
+    else:
+        resolve_params(spec.get('params'))
+        if spec.get('method', 'shuffle') not in MC_METHODS:
+            raise ValueError(f"Unknown method: {spec['method']} (use {', '.join(MC_METHODS)})")
+
+
+def run_job(spec, rates, progress=None):
+    validate_job(spec)
+    if spec['mode'] == 'walk_forward':
+        return walk_forward(rates, _combos(spec), int(spec['train_bars']), int(spec['test_bars']),
+                            spec.get('base'), bool(spec.get('anchored')), spec.get('rank_by', 'total_r'),
+                            int(spec.get('min_trades', 30)), spec.get('workers'), progress)
+    return monte_carlo(rates, spec.get('params'), int(spec.get('sims', 1000)), spec.get('method', 'shuffle'),
+                       float(spec.get('slippage_points', 0)), int(spec.get('seed', 0)),
+                       spec.get('workers'), progress)
+
+
+# =============================================================================
+# BATCH JOBS (bridge side)
+# =============================================================================
+class BacktestJobs:
+    """Runs job specs as `robustness.py job <dir>` subprocesses and relays their progress"""
+
+    def __init__(self, directory, max_running=1, keep=20, logger=None):
+        self.directory = directory
+        self.max_running = max_running
+        self.keep = keep
+        self.log = logger
+        self._jobs = {}
+        self._cond = threading.Condition()
+
+    def submit(self, spec, rates):
+        """Start a job; ValueError for a bad spec, RuntimeError when max_running jobs are busy"""
+        from market_data import save_rates
+        validate_job(spec)
+        with self._cond:
+            if sum(1 for j in self._jobs.values() if j['status'] == 'running') >= self.max_running:
+                raise RuntimeError(f'{self.max_running} backtest job(s) already running')
+            job_id = uuid.uuid4().hex[:12]
+            path = os.path.abspath(os.path.join(self.directory, job_id))
+            job = self._jobs[job_id] = {
+                'id': job_id, 'mode': spec['mode'], 'status': 'running', 'bars': len(rates),
+                'created': time.time(), 'finished': None, 'progress': None, 'result': None,
+                'error': None, 'events': [], 'path': path, 'process': None,
+            }
+        os.makedirs(path, exist_ok=True)
+        save_rates(os.path.join(path, 'rates.npy'), rates)
+        with open(os.path.join(path, 'job.json'), 'w') as f:
+            json.dump(spec, f)
+        threading.Thread(target=self._run, args=(job,), name=f'backtest-job-{job_id}', daemon=True).start()
+        if self.log:
+            self.log.info('job_started', job=job_id, mode=spec['mode'], bars=len(rates))
+        self._prune()
+        return self.snapshot(job_id)
+
+    def _run(self, job):
+        code = None
+        with self._cond:
+            cancelled = job['status'] == 'cancelled'
+        if not cancelled:           # cancel() may come before the process exists
+            code = self._spawn(job)
+
+        with self._cond:
+            if job['status'] == 'cancelled':
+                pass
+            elif code == 0 and job['result'] is not None:
+                job['status'] = 'done'
+            else:
+                job['status'] = 'failed'
+                with open(os.path.join(job['path'], 'stderr.log')) as f:
+                    job['error'] = f.read()[-2000:].strip() or f'exit code {code}'
+            job['finished'] = time.time()
+            job['events'].append({'type': job['status'], 'error': job['error']})
+            self._cond.notify_all()
+        if self.log:
+            self.log.info('job_finished', job=job['id'], status=job['status'],
+                          seconds=round(job['finished'] - job['created'], 2))
+
+    def _spawn(self, job):
+        """Run the job process, relaying its events -> exit code"""
+        with open(os.path.join(job['path'], 'stderr.log'), 'w') as stderr:
+            process = subprocess.Popen([sys.executable, os.path.abspath(__file__), 'job', job['path']],
+                                       stdout=subprocess.PIPE, stderr=stderr, text=True,
+                                       cwd=os.path.dirname(os.path.abspath(__file__)))
+            with self._cond:
+                job['process'] = process
+                cancelled = job['status'] == 'cancelled'
+            if cancelled:
+                process.terminate()
+            for line in process.stdout:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                with self._cond:
+                    if event.get('type') == 'result':
+                        job['result'] = event['result']
+                    else:
+                        job['progress'] = event
+                        job['events'].append(event)
+                    self._cond.notify_all()
+            return process.wait()
+
+    def cancel(self, job_id):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job['status'] != 'running':
+                return False
+            job['status'] = 'cancelled'
+            process = job['process']
+        # Not started yet: _spawn sees the status once it stored the process
+        if process is not None:
+            process.terminate()
+        return True
+
+    def snapshot(self, job_id, with_result=True):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            out = {k: v for k, v in job.items() if k not in ('events', 'path', 'process', 'result')}
+            if with_result:
+                out['result'] = job['result']
+            return out
+
+    def list(self):
+        with self._cond:
+            ids = sorted(self._jobs, key=lambda i: self._jobs[i]['created'], reverse=True)
+        return [self.snapshot(i, with_result=False) for i in ids]
+
+    def events(self, job_id, start=0, timeout=15.0):
+        """(events after index `start`, finished) - waits up to timeout for something new"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return [], True
+            if len(job['events']) <= start and job['status'] == 'running':
+                self._cond.wait(timeout)
+            return job['events'][start:], job['status'] != 'running'
+
+    def _prune(self):
+        with self._cond:
+            finished = sorted((j for j in self._jobs.values() if j['status'] != 'running'),
+                              key=lambda j: j['created'])
+            drop = finished[:max(0, len(finished) - self.keep)]
+            for job in drop:
+                del self._jobs[job['id']]
+        for job in drop:
+            shutil.rmtree(job['path'], ignore_errors=True)
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+def _json_progress(event):
+    print(json.dumps(event), flush=True)
+
+
+def _text_progress(event):
+    if event['done'] != event['total'] and event['done'] % max(1, event['total'] // 10):
+        return
+    print(f"  {event['phase']}: {event['done']}/{event['total']}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Walk-forward and Monte Carlo evaluation of the doji strategy')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    wf = commands.add_parser('walk-forward', help='rolling train/test optimisation')
+    add_source_arguments(wf)
+    space = wf.add_mutually_exclusive_group(required=True)
+    space.add_argument('--grid', help='grid spec (JSON or path)')
+    space.add_argument('--random', help='random-search spec (JSON or path)')
+    wf.add_argument('-n', '--samples', type=int, default=100)
+    wf.add_argument('--base', default='{}', help='params shared by every run (JSON or path)')
+    wf.add_argument('--train', type=int, required=True, help='bars per train window')
+    wf.add_argument('--test', type=int, required=True, help='bars per test window (and step)')
+    wf.add_argument('--anchored', action='store_true', help='train windows always start at bar 0')
+    wf.add_argument('--rank-by', default='total_r', choices=RANK_METRICS)
+    wf.add_argument('--min-trades', type=int, default=30)
+
+    mc = commands.add_parser('monte-carlo', help='trade-order / bootstrap / slippage resampling')
+    add_source_arguments(mc)
+    mc.add_argument('--params', default='{}', help='backtest params (JSON or path)')
+    mc.add_argument('--sims', type=int, default=1000)
+    mc.add_argument('--method', default='shuffle', choices=MC_METHODS)
+    mc.add_argument('--slippage', type=float, default=0.0, help='max slippage per fill, in points')
+
+    for sub in (wf, mc):
+        sub.add_argument('--workers', type=int, default=None, help='processes (default: all cores)')
+        sub.add_argument('--json', action='store_true', help='progress as JSON lines on stdout')
+
+    job = commands.add_parser('job', help='run <dir>/job.json on <dir>/rates.npy (used by the bridge)')
+    job.add_argument('directory')
+    args = parser.parse_args(argv)
+
+    if args.command == 'job':
+        from market_data import load_rates
+        with open(os.path.join(args.directory, 'job.json')) as f:
+            spec = json.load(f)
+        result = run_job(spec, load_rates(os.path.join(args.directory, 'rates.npy')), _json_progress)
+        with open(os.path.join(args.directory, 'result.json'), 'w') as f:
+            json.dump(result, f)
+        _json_progress({'type': 'result', 'result': result})
+        return
+
+    if args.command == 'walk-forward':
+        spec = {'mode': 'walk_forward', 'samples': args.samples, 'seed': args.seed,
+                'base': load_spec(args.base), 'train_bars': args.train, 'test_bars': args.test,
+                'anchored': args.anchored, 'rank_by': args.rank_by, 'min_trades': args.min_trades}
+        if args.grid:
+            spec['grid'] = load_spec(args.grid)
+        else:
+            spec['random'] = load_spec(args.random)
+    else:
+        spec = {'mode': 'monte_carlo', 'params': load_spec(args.params), 'sims': args.sims,
+                'method': args.method, 'slippage_points': args.slippage, 'seed': args.seed}
+    spec['workers'] = args.workers
+
+    started = time.perf_counter()
+    result = run_job(spec, load_source(args), _json_progress if args.json else _text_progress)
+    result['elapsed_s'] = round(time.perf_counter() - started, 2)
+    if args.json:
+        _json_progress({'type': 'result', 'result': result})
+    else:
+        json.dump(result, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+"""
+=============================================================================
+BAR-CLOSE SCHEDULER - "THIS CANDLE JUST CLOSED" EVENTS
+=============================================================================
+
+Instead of analysing on a fixed interval, subscribers get an event the
+moment a (symbol, timeframe) bar closes, with the finished bar, the
+pattern signal for it and (optionally) the updated indicators attached.
+
+HOW A CLOSE IS DETECTED:
+    1. Bar boundaries are known per timeframe (bar time + TF_SECONDS) in
+       SERVER time. Server time = local clock + offset, where the offset is
+       learned from tick timestamps (broker servers run in their own zone)
+       or taken from the simulator's clock.
+    2. The scheduler sleeps until the earliest boundary among subscriptions.
+    3. A bar only "closes" in MT5 when the first tick of the next bar
+       arrives, so due pairs are polled every FAST_POLL seconds (2-bar fetch
+       through the candle cache) until the last closed bar changes.
+    4. Every pair is also re-checked every SAFETY_POLL seconds, which covers
+       a wrong offset estimate and sped-up replays.
+
+Subscribers (e.g. the /events/bars SSE stream) get their own bounded queue;
+a slow subscriber loses its oldest events, it never stalls the scheduler.
+=============================================================================
+"""
+
+import queue
+import threading
+import time
+
+from patterns import latest_signal
+from replay import TF_SECONDS
+
+
+FAST_POLL = 0.05
+SAFETY_POLL = 5.0
+OFFSET_QUANTUM = 900        # broker offsets are whole quarter hours
+SUBSCRIBER_QUEUE = 1000
+
+
+def bar_to_dict(bar):
+    return {
+        'time': int(bar['time']),
+        'open': float(bar['open']),
+        'high': float(bar['high']),
+        'low': float(bar['low']),
+        'close': float(bar['close']),
+        'volume': int(bar['tick_volume']),
+    }
+
+
+class Subscription:
+    """One consumer: the pairs it follows and its event queue"""
+
+    def __init__(self, pairs, maxsize=SUBSCRIBER_QUEUE):
+        self.pairs = frozenset(pairs)
+        self.events = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def push(self, event):
+        while True:
+            try:
+                self.events.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.events.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+
+class BarCloseScheduler:
+
+    def __init__(self, mt5, candle_cache, server_clock=None, logger=None, indicators=None):
+        """
+        server_clock - callable returning server unix time; when None the
+                       offset to the local clock is estimated from ticks
+        indicators   - IndicatorEngine updated on every close (optional)
+        """
+        self.mt5 = mt5
+        self.cache = candle_cache
+        self.indicators = indicators
+        self.server_clock = server_clock
+        self.log = logger
+        self.offset = 0.0
+        self._offset_seen = None
+        self._subs = []
+        self._state = {}            # (symbol, tf) -> [last closed bar time, next check due]
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    # -------------------------------------------------------------------------
+    # Subscriptions
+    # -------------------------------------------------------------------------
+    def subscribe(self, pairs):
+        sub = Subscription(pairs)
+        with self._lock:
+            self._subs.append(sub)
+            for pair in sub.pairs:
+                self._state.setdefault(pair, [None, 0.0])
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='bar-close-scheduler', daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            if sub in self._subs:
+                self._subs.remove(sub)
+            wanted = set().union(*(s.pairs for s in self._subs)) if self._subs else set()
+            for pair in list(self._state):
+                if pair not in wanted:
+                    del self._state[pair]
+
+    def status(self):
+        with self._lock:
+            return {
+                'subscribers': len(self._subs),
+                'pairs': sorted(f"{s}:{tf}" for s, tf in self._state),
+                'server_offset_s': self.offset,
+                'dropped_events': sum(s.dropped for s in self._subs),
+            }
+
+    # -------------------------------------------------------------------------
+    # Server time
+    # -------------------------------------------------------------------------
+    def server_now(self):
+        if self.server_clock is not None:
+            return self.server_clock()
+        return time.time() + self.offset
+
+    def _learn_offset(self, symbol):
+        if self.server_clock is not None:
+            return
+        tick = self.mt5.symbol_info_tick(symbol)
+        if tick is None or not tick.time:
+            return
+        # ticks are never from the future: the largest lead seen is the best estimate
+        lead = tick.time_msc / 1000.0 - time.time()
+        if self._offset_seen is None or lead > self._offset_seen:
+            self._offset_seen = lead
+            self.offset = round(lead / OFFSET_QUANTUM) * OFFSET_QUANTUM
+
+    # -------------------------------------------------------------------------
+    # Loop
+    # -------------------------------------------------------------------------
+    def _run(self):
+        while True:
+            with self._lock:
+                pairs = list(self._state.items())
+            if not pairs:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+
+            now = self.server_now()
+            for (symbol, timeframe), state in pairs:
+                if now >= state[1]:
+                    try:
+                        self._check(symbol, timeframe, state, now)
+                    except Exception as e:
+                        if self.log:
+                            self.log.exception('scheduler_error', symbol=symbol, timeframe=timeframe, error=str(e))
+                        state[1] = now + SAFETY_POLL
+
+            with self._lock:
+                due = min((s[1] for s in self._state.values()), default=now + SAFETY_POLL)
+            # server seconds -> wall seconds for a sped-up simulator clock
+            speed = getattr(self.server_clock, 'speed', 1.0) or 1.0
+            wait = min(SAFETY_POLL, max(FAST_POLL, (due - self.server_now()) / speed))
+            if self._wake.wait(wait):
+                self._wake.clear()
+
+    def _check(self, symbol, timeframe, state, now):
+        rates = self.cache.get(self.mt5, symbol, timeframe, 4)
+        if rates is None or len(rates) < 2:
+            state[1] = now + SAFETY_POLL
+            return
+        closed = rates[-2]
+        closed_time = int(closed['time'])
+        boundary = int(rates[-1]['time']) + TF_SECONDS[timeframe]
+
+        if state[0] is None:
+            # First look: remember where we are, no event for an old bar
+            self._learn_offset(symbol)
+            state[0] = closed_time
+        elif closed_time > state[0]:
+            # Normally one bar; more if several closed since the last check
+            for i in range(len(rates) - 1):
+                if int(rates[i]['time']) > state[0]:
+                    self._emit(symbol, timeframe, rates[:i + 2], now)
+            state[0] = closed_time
+            self._learn_offset(symbol)
+
+        if now >= boundary:
+            # Boundary passed but the next bar has no tick yet: poll fast,
+            # backing off when the market is quiet or closed
+            state[1] = now + min(SAFETY_POLL, max(FAST_POLL, (now - boundary) / 10))
+        else:
+            state[1] = min(boundary, now + SAFETY_POLL)
+
+    def _emit(self, symbol, timeframe, rates, now):
+        closed = rates[-2]
+        closed_at = int(closed['time']) + TF_SECONDS[timeframe]
+        event = {
+            'type': 'bar_closed',
+            'symbol': symbol,
+            'timeframe': timeframe,
+            'bar': bar_to_dict(closed),
+            'server_time': round(now, 3),
+            'detection_latency_ms': round(max(0.0, now - closed_at) * 1000, 1),
+            'signal': latest_signal(rates, index=-2),
+        }
+        if self.indicators is not None:
+            event['indicators'] = self.indicators.get(symbol, timeframe)
+        with self._lock:
+            subs = [s for s in self._subs if (symbol, timeframe) in s.pairs]
+        for sub in subs:
+            sub.push(event)
+        if self.log:
+            self.log.debug('bar_closed', symbol=symbol, timeframe=timeframe, bar_time=int(closed['time']),
+                           latency_ms=event['detection_latency_ms'], subscribers=len(subs))
@@ -15,36 +15,88 @@ RULES:
 =============================================================================
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 import sys
 import os
+import json
+import math
+import queue
+import time
+
+import profiler
+
+from bridge_logging import configure_logging, dropped_records, get_logger
+from backends import BackendConfigError, create_backend, describe, unwrap, use_mock
+from metrics import instrument_app, registry as metrics_registry
+from order_latency import OrderTimer, order_latency_log
+from caches import AccountCache, CandleCache, OrdersCache, PositionsCache, SymbolInfoCache
+from patterns import PATTERNS, latest_signal, scan_series
+from scheduler import BarCloseScheduler
+from indicators import IndicatorEngine
+from backtest import DEFAULT_PARAMS as BACKTEST_PARAMS, run_backtest
+from robustness import BacktestJobs
+from position_monitor import PositionMonitor, load_monitor_config
+from sltp import modify_positions, parse_modification
+from pretrade import PreTradeCheck
+from order_policy import ExecutionPolicy, load_policy_config
+from idempotency import CLAIM_ATTEMPTS, OrderKeys, find_order, fingerprint, parse_key
+from pending_orders import (check_frozen, check_pending, modify_request, order_kind, order_to_dict,
+                            parse_changes, parse_pending, pending_request, remove_request)
+
+configure_logging()
+log_symbols = get_logger('bridge.symbols')
+log_candles = get_logger('bridge.candles')
+log_positions = get_logger('bridge.positions')
+log_order = get_logger('bridge.order')
+log_close = get_logger('bridge.close')
+log_modify = get_logger('bridge.modify')
+log_pending = get_logger('bridge.pending')
+log_events = get_logger('bridge.events')
+log_monitor = get_logger('bridge.monitor')
 
 # =============================================================================
 # STRICT MODE: Check if mock is allowed
 # =============================================================================
-USE_MOCK_MT5 = os.environ.get('USE_MOCK_MT5', 'false').lower() == 'true'
+USE_MOCK_MT5 = use_mock()
+
+# Seconds to wait after order_send before looking the position up
+ORDER_CONFIRM_DELAY = float(os.environ.get('ORDER_CONFIRM_DELAY', 0.5))
 
 if USE_MOCK_MT5:
     print("=" * 60)
     print("⚠️  WARNING: MOCK MODE ENABLED")
     print("⚠️  This is for TESTING ONLY - No real trades will execute")
     print("=" * 60)
-    from mt5_mock import mt5
-else:
+
+# Backend + wrapper stack from MT5_BACKEND / MT5_WRAPPERS (see backends.py)
+try:
+    mt5 = create_backend()
+except BackendConfigError as e:
+    print("=" * 60)
+    print(f"❌ FATAL ERROR: {e}")
+    print("=" * 60)
+    sys.exit(1)
+except ImportError as e:
     # REAL MODE - MetaTrader5 MUST be available
-    try:
-        import MetaTrader5 as mt5
-        print("✅ MetaTrader5 module imported successfully")
-    except ImportError as e:
-        print("=" * 60)
-        print("❌ FATAL ERROR: MetaTrader5 module not found!")
-        print("❌ This system requires REAL MT5 connection.")
-        print("❌ Install with: pip install MetaTrader5")
-        print("❌ Mock mode is DISABLED (USE_MOCK_MT5=false)")
-        print("=" * 60)
-        sys.exit(1)
+    print("=" * 60)
+    print("❌ FATAL ERROR: MetaTrader5 module not found!")
+    print("❌ This system requires REAL MT5 connection.")
+    print("❌ Install with: pip install MetaTrader5")
+    print("❌ Mock mode is DISABLED (USE_MOCK_MT5=false)")
+    print("=" * 60)
+    sys.exit(1)
+
+MT5_BACKEND_CHAIN = describe(mt5)
+print(f"✅ MT5 backend: {MT5_BACKEND_CHAIN}")
+if getattr(unwrap(mt5), 'replay', None) is not None:
+    print(f"⏪ Replaying {os.environ.get('MT5_REPLAY_DIR')} at {unwrap(mt5).clock.speed:g}x")
+if os.environ.get('MT5_FAULTS', '').strip():
+    print("⚠️  FAULT INJECTION CONFIGURED (MT5_FAULTS)")
+if getattr(unwrap(mt5), 'execution', None) is not None:
+    print("⏱  Simulated execution model: latency, slippage, partial fills (MT5_EXECUTION)")
 
 app = Flask(__name__)
+instrument_app(app)
 
 # =============================================================================
 # MT5 INITIALIZATION - Print account info on startup
@@ -124,7 +176,8 @@ def health():
         "connected": connected,
         "account": account.login if account else None,
         "server": account.server if account else None,
-        "mock_mode": USE_MOCK_MT5
+        "mock_mode": USE_MOCK_MT5,
+        "backend": MT5_BACKEND_CHAIN
     })
 
 
@@ -197,6 +250,52 @@ def health_trading():
     }), status_code
 
 
+# =============================================================================
+# ENDPOINT: Metrics (Prometheus text format)
+# =============================================================================
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Route and MT5 call latency histograms + counters"""
+    body = metrics_registry.render_prometheus(extra_gauges={
+        'bridge_log_dropped_total': dropped_records(),
+    })
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+
+# =============================================================================
+# ENDPOINT: Sampling Profiler (opt-in via BRIDGE_ENABLE_PROFILER=true)
+# =============================================================================
+@app.route('/debug/profile', methods=['GET'])
+def debug_profile():
+    """
+    Sample every thread for N seconds and return the profile.
+    Query: seconds (default 5, max 60), interval_ms (default 5),
+           format = collapsed (default) | speedscope
+    """
+    if not profiler.profiler_enabled():
+        return jsonify({"error": "Profiler disabled - set BRIDGE_ENABLE_PROFILER=true"}), 404
+
+    try:
+        seconds = float(request.args.get('seconds', 5))
+        interval_ms = float(request.args.get('interval_ms', 5))
+    except ValueError:
+        return jsonify({"error": "seconds and interval_ms must be numbers"}), 400
+    if not (math.isfinite(seconds) and seconds > 0 and math.isfinite(interval_ms) and interval_ms > 0):
+        return jsonify({"error": "seconds and interval_ms must be finite and > 0"}), 400
+    seconds = min(seconds, profiler.MAX_SECONDS)
+    interval = max(interval_ms, 1.0) / 1000.0
+    fmt = request.args.get('format', 'collapsed')
+
+    try:
+        stacks, meta = profiler.sample(seconds, interval)
+    except profiler.ProfilerBusy as e:
+        return jsonify({"error": str(e)}), 409
+
+    if fmt == 'speedscope':
+        return jsonify(profiler.to_speedscope(stacks, meta))
+    return Response(profiler.to_collapsed(stacks), mimetype='text/plain')
+
+
 # =============================================================================
 # ENDPOINT: Get Symbols
 # =============================================================================
@@ -204,9 +303,8 @@ def health_trading():
 def get_symbols():
     """List all available symbols from MT5"""
     try:
-        print("Getting all symbols...")
         symbols = mt5.symbols_get()
-        print(f"Found {len(symbols) if symbols else 0} symbols")
+        log_symbols.debug('symbols_fetched', count=len(symbols) if symbols else 0)
         
         symbol_list = []
         if symbols:
@@ -220,51 +318,107 @@ def get_symbols():
                 })
         return jsonify(symbol_list)
     except Exception as e:
-        print(f"Error getting symbols: {e}")
+        log_symbols.exception('symbols_error', error=str(e))
         return jsonify({"error": str(e)}), 500
 
 
+# Closed bars reused by /patterns and /scan (see caches.py)
+candle_cache = CandleCache()
+
+# Emits bar-close events for /events/bars (see scheduler.py)
+# Running ATR/EMA/percentile state per series (see indicators.py)
+indicator_engine = IndicatorEngine(mt5, candle_cache)
+
+bar_scheduler = BarCloseScheduler(mt5, candle_cache, server_clock=getattr(unwrap(mt5), 'clock', None),
+                                  logger=log_events, indicators=indicator_engine)
+
+# Walk-forward / Monte Carlo jobs in their own processes (see robustness.py)
+backtest_jobs = BacktestJobs(os.environ.get('BACKTEST_JOBS_DIR', 'backtest_jobs'), logger=log_candles)
+
+# Snapshots of the trade server's books, shared by the endpoints and the monitor
+positions_cache = PositionsCache()
+orders_cache = OrdersCache()                # pending limit/stop orders (see pending_orders.py)
+account_cache = AccountCache(max_age=1.0)
+# Point / digits / stops level / filling modes (see sltp.py, pretrade.py, order_policy.py)
+symbol_cache = SymbolInfoCache()
+MAX_MODIFY_BATCH = 200
+
+
+def books_changed():
+    """Something was sent to the trade server: the cached snapshots are stale"""
+    positions_cache.invalidate()
+    orders_cache.invalidate()
+    account_cache.invalidate()
+
+
+try:
+    # Pre-trade checks (PRETRADE_MODE) and filling/retry policy (ORDER_POLICY) for market deals
+    pretrade = PreTradeCheck(mt5, symbol_cache, account_cache, mode=os.environ.get('PRETRADE_MODE', 'local'))
+    execution_policy = ExecutionPolicy(mt5, symbol_cache, load_policy_config())
+    MONITOR_ENABLED, MONITOR_RULES = load_monitor_config()
+    # Client order ids for /order retries (see idempotency.py)
+    order_keys = OrderKeys(os.environ.get('ORDER_KEYS_FILE', 'order_keys.jsonl') or None,
+                           max_entries=int(os.environ.get('ORDER_KEYS_MAX', 10000)))
+except (OSError, ValueError) as e:
+    print("=" * 60)
+    print(f"❌ FATAL ERROR: invalid PRETRADE_MODE / ORDER_POLICY / POSITION_MONITOR / ORDER_KEYS_FILE: {e}")
+    print("=" * 60)
+    sys.exit(1)
+
+# Exit rules evaluated per tick inside the bridge (see position_monitor.py)
+position_monitor = PositionMonitor(mt5, candle_cache, positions_cache, rules=MONITOR_RULES, logger=log_monitor,
+                                   symbol_cache=symbol_cache, policy=execution_policy)
+if MONITOR_ENABLED:
+    position_monitor.start()
+    print(f"🛡  Position monitor running: {MONITOR_RULES['timeframe']} doji range, "
+          f"poll {position_monitor.poll * 1000:g}ms (POSITION_MONITOR)")
+
+TIMEFRAMES = {
+    'M1': mt5.TIMEFRAME_M1,
+    'M5': mt5.TIMEFRAME_M5,
+    'M15': mt5.TIMEFRAME_M15,
+    'M30': mt5.TIMEFRAME_M30,
+    'H1': mt5.TIMEFRAME_H1,
+    'H4': mt5.TIMEFRAME_H4,
+    'D1': mt5.TIMEFRAME_D1,
+}
+
+
 # =============================================================================
 # ENDPOINT: Get Candles
 # =============================================================================
 @app.route('/candles', methods=['GET'])
 def get_candles():
-    """Get candlestick data from MT5"""
+    """
+    Get candlestick data from MT5.
+    With indicators=1 the response is {"candles": [...], "indicators": {...}}.
+    """
     try:
         symbol = request.args.get('symbol', 'BTCUSD')
         timeframe_str = request.args.get('timeframe', 'M15')
         count = int(request.args.get('count', 10))
+        with_indicators = request.args.get('indicators', '').lower() in ('1', 'true')
         
-        print(f"Getting {count} candles for {symbol} {timeframe_str}")
-        
-        tf_map = {
-            'M1': mt5.TIMEFRAME_M1,
-            'M5': mt5.TIMEFRAME_M5,
-            'M15': mt5.TIMEFRAME_M15,
-            'M30': mt5.TIMEFRAME_M30,
-            'H1': mt5.TIMEFRAME_H1,
-            'H4': mt5.TIMEFRAME_H4,
-            'D1': mt5.TIMEFRAME_D1,
-        }
-        tf = tf_map.get(timeframe_str, mt5.TIMEFRAME_M15)
+        tf = TIMEFRAMES.get(timeframe_str, mt5.TIMEFRAME_M15)
         
         symbol_info = mt5.symbol_info(symbol)
         if symbol_info is None:
-            print(f"Symbol {symbol} not found!")
+            log_candles.warning('symbol_not_found', symbol=symbol)
             return jsonify({"error": f"Symbol {symbol} not found"}), 404
         
         if not symbol_info.visible:
-            print(f"Enabling symbol {symbol}")
+            log_candles.info('symbol_enabled', symbol=symbol)
             mt5.symbol_select(symbol, True)
         
         rates = mt5.copy_rates_from_pos(symbol, tf, 0, count)
         
         if rates is None:
             error = mt5.last_error()
-            print(f"Failed to get rates: {error}")
+            log_candles.error('rates_failed', symbol=symbol, timeframe=timeframe_str, error=str(error))
             return jsonify({"error": f"Failed to get rates: {str(error)}"}), 500
         
-        print(f"Successfully retrieved {len(rates)} candles")
+        log_candles.debug('rates_fetched', symbol=symbol, timeframe=timeframe_str,
+                          requested=count, received=len(rates))
         
         data = []
         for r in rates:
@@ -278,16 +432,355 @@ def get_candles():
                     'volume': int(r[5]) if len(r) > 5 else 0
                 })
             except Exception as e:
-                print(f"Error processing candle: {e}")
+                log_candles.warning('candle_skipped', symbol=symbol, error=str(e))
                 continue
         
+        if with_indicators and timeframe_str in TIMEFRAMES:
+            return jsonify({"candles": data, "indicators": indicator_engine.get(symbol, timeframe_str)})
         return jsonify(data)
         
     except Exception as e:
-        print(f"Error in get_candles: {e}")
+        log_candles.exception('candles_error', error=str(e))
+        return jsonify({"error": str(e)}), 500
+
+
+# =============================================================================
+# ENDPOINT: Indicators (incremental, per symbol/timeframe)
+# =============================================================================
+@app.route('/indicators', methods=['GET'])
+def get_indicators():
+    """EMA, ATR, body/range percentiles and volume z-score as of the last closed bar"""
+    try:
+        symbol = request.args.get('symbol', 'BTCUSD')
+        timeframe_str = request.args.get('timeframe', 'M15')
+        if timeframe_str not in TIMEFRAMES:
+            return jsonify({"error": f"Unknown timeframe: {timeframe_str}"}), 400
+
+        snapshot = indicator_engine.get(symbol, timeframe_str)
+        if snapshot is None:
+            error = mt5.last_error()
+            log_candles.error('indicators_failed', symbol=symbol, timeframe=timeframe_str, error=str(error))
+            return jsonify({"error": f"Failed to get rates: {str(error)}"}), 500
+        return jsonify({"symbol": symbol, "timeframe": timeframe_str, **snapshot})
+
+    except Exception as e:
+        log_candles.exception('indicators_error', error=str(e))
+        return jsonify({"error": str(e)}), 500
+
+
+# =============================================================================
+# ENDPOINT: Pattern Detection (Doji / Morning Star / Evening Star)
+# =============================================================================
+@app.route('/patterns', methods=['GET'])
+def get_patterns():
+    """
+    Run the vectorized pattern engine over a candle series.
+    Query: symbol, timeframe, count (default 200), patterns=star,doji,
+    min_confidence. The last bar is still forming - see 'closed'.
+    """
+    try:
+        symbol = request.args.get('symbol', 'BTCUSD')
+        timeframe_str = request.args.get('timeframe', 'M15')
+        count = int(request.args.get('count', 200))
+        wanted = tuple(p for p in request.args.get('patterns', ','.join(PATTERNS)).split(',') if p)
+        min_confidence = float(request.args.get('min_confidence', 0))
+        unknown = [p for p in wanted if p not in PATTERNS]
+        if unknown or timeframe_str not in TIMEFRAMES:
+            return jsonify({"error": f"Unknown pattern/timeframe: {', '.join(unknown) or timeframe_str}"}), 400
+
+        if mt5.symbol_info(symbol) is None:
+            log_candles.warning('symbol_not_found', symbol=symbol)
+            return jsonify({"error": f"Symbol {symbol} not found"}), 404
+
+        rates = candle_cache.get(mt5, symbol, timeframe_str, count)
+        if rates is None:
+            error = mt5.last_error()
+            log_candles.error('rates_failed', symbol=symbol, timeframe=timeframe_str, error=str(error))
+            return jsonify({"error": f"Failed to get rates: {str(error)}"}), 500
+
+        matches = scan_series(rates, wanted, min_confidence)
+        last = len(rates) - 1
+        for match in matches:
+            match['closed'] = match['index'] < last
+
+        return jsonify({
+            "symbol": symbol,
+            "timeframe": timeframe_str,
+            "bars": len(rates),
+            "matches": matches,
+            "latest": latest_signal(rates, wanted) if len(rates) else None,
+        })
+
+    except Exception as e:
+        log_candles.exception('patterns_error', error=str(e))
+        return jsonify({"error": str(e)}), 500
+
+
+# =============================================================================
+# ENDPOINT: Multi-Symbol Pattern Scan
+# =============================================================================
+@app.route('/scan', methods=['GET', 'POST'])
+def scan():
+    """
+    Evaluate patterns on the latest CLOSED bar of many symbols/timeframes.
+    Params (query string or JSON body):
+        symbols         list or comma string  - or -
+        group           MT5 group filter, e.g. "*USD*,!*BTC*" (default: Market Watch)
+        timeframes      default M15
+        patterns        default star,doji
+        min_confidence  default 0
+    Returns only matching (symbol, timeframe) pairs, highest confidence first.
+    """
+    started = time.perf_counter()
+    # Client errors (bad body, parameters) -> 400 before the scan itself
+    body = request.get_json(silent=True)
+    if body is not None and not isinstance(body, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    params = {**request.args.to_dict(), **(body or {})}
+
+    def as_list(value, default):
+        if value is None or value == '':
+            return list(default)
+        return [v.strip() for v in value.split(',') if v.strip()] if isinstance(value, str) else list(value)
+
+    try:
+        timeframes = as_list(params.get('timeframes'), ['M15'])
+        wanted = tuple(as_list(params.get('patterns'), PATTERNS))
+        symbols = as_list(params.get('symbols'), [])
+        min_confidence = float(params.get('min_confidence', 0))
+    except (TypeError, ValueError):
+        return jsonify({"error": "timeframes, patterns and symbols must be lists or comma strings, "
+                                 "min_confidence a number"}), 400
+    if not math.isfinite(min_confidence):
+        return jsonify({"error": "min_confidence must be a finite number"}), 400
+    unknown = [p for p in wanted if p not in PATTERNS] + [t for t in timeframes if t not in TIMEFRAMES]
+    if unknown:
+        return jsonify({"error": f"Unknown pattern/timeframe: {', '.join(map(str, unknown))}"}), 400
+
+    try:
+        if not symbols:
+            infos = mt5.symbols_get(group=params['group']) if params.get('group') else mt5.symbols_get()
+            if infos is None:
+                return jsonify({"error": f"symbols_get failed: {mt5.last_error()}"}), 500
+            symbols = [info.name for info in infos if params.get('group') or info.visible]
+
+        results, errors = [], []
+        for symbol in symbols:
+            for timeframe in timeframes:
+                # 3 closed bars for the star pattern + the forming bar
+                rates = candle_cache.get(mt5, symbol, timeframe, 4)
+                if rates is None and mt5.symbol_select(symbol, True):
+                    rates = candle_cache.get(mt5, symbol, timeframe, 4)
+                if rates is None:
+                    errors.append({"symbol": symbol, "timeframe": timeframe, "error": str(mt5.last_error())})
+                    continue
+                if len(rates) < 2:
+                    continue
+                signal = latest_signal(rates, wanted, index=-2)
+                if signal and signal['confidence'] >= min_confidence:
+                    signal.pop('index')
+                    results.append({"symbol": symbol, "timeframe": timeframe, **signal})
+
+        results.sort(key=lambda r: (-r['confidence'], r['symbol'], r['timeframe']))
+        log_candles.info('scan_done', symbols=len(symbols), timeframes=len(timeframes),
+                         matches=len(results), errors=len(errors))
+        return jsonify({
+            "scanned": len(symbols) * len(timeframes),
+            "matches": results,
+            "errors": errors,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+            "cache": candle_cache.stats(),
+        })
+
+    except Exception as e:
+        log_candles.exception('scan_error', error=str(e))
+        return jsonify({"error": str(e)}), 500
+
+
+# =============================================================================
+# ENDPOINT: Backtest the Doji Strategy
+# =============================================================================
+@app.route('/backtest', methods=['POST'])
+def backtest():
+    """
+    Vectorized backtest over the closed bars MT5 has (see backtest.py).
+    Body: symbol, timeframe (default M15), bars (default 100000),
+    curve_points (default 500) and any of backtest.DEFAULT_PARAMS, e.g.
+    {"symbol": "EURUSD", "bars": 200000, "sl_mult": 1.5, "tp_mult": 2}.
+    Spread is charged with the symbol's point unless "point" is given.
+    """
+    try:
+        params = request.get_json(silent=True) or {}
+        symbol = params.pop('symbol', 'BTCUSD')
+        timeframe_str = params.pop('timeframe', 'M15')
+        bars = int(params.pop('bars', 100000))
+        curve_points = int(params.pop('curve_points', 500))
+        unknown = [k for k in params if k not in BACKTEST_PARAMS]
+        if unknown or timeframe_str not in TIMEFRAMES:
+            return jsonify({"error": f"Unknown parameter/timeframe: {', '.join(unknown) or timeframe_str}"}), 400
+
+        symbol_info = mt5.symbol_info(symbol)
+        if symbol_info is None:
+            log_candles.warning('symbol_not_found', symbol=symbol)
+            return jsonify({"error": f"Symbol {symbol} not found"}), 404
+        params.setdefault('point', symbol_info.point)
+
+        # Start at 1: the forming bar is not part of history yet
+        rates = mt5.copy_rates_from_pos(symbol, TIMEFRAMES[timeframe_str], 1, bars)
+        if rates is None:
+            error = mt5.last_error()
+            log_candles.error('rates_failed', symbol=symbol, timeframe=timeframe_str, error=str(error))
+            return jsonify({"error": f"Failed to get rates: {str(error)}"}), 500
+
+        report = run_backtest(rates, params, curve_points)
+        log_candles.info('backtest_done', symbol=symbol, timeframe=timeframe_str, bars=len(rates),
+                         trades=report['trades'], elapsed_ms=report['elapsed_ms'])
+        return jsonify({"symbol": symbol, "timeframe": timeframe_str, **report})
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        log_candles.exception('backtest_error', error=str(e))
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/backtest/jobs', methods=['POST'])
+def start_backtest_job():
+    """
+    Start a walk-forward or Monte Carlo job on the closed bars of a symbol.
+    Body: symbol, timeframe, bars + a robustness.py job spec, e.g.
+        {"mode": "walk_forward", "symbol": "EURUSD", "bars": 200000,
+         "train_bars": 20000, "test_bars": 5000, "grid": {"sl_mult": [1, 1.5, 2]}}
+        {"mode": "monte_carlo", "symbol": "EURUSD", "sims": 10000, "slippage_points": 3}
+    Returns 202 with the job; follow it on /backtest/jobs/<id>/events.
+    """
+    try:
+        spec = request.get_json(silent=True) or {}
+        symbol = spec.pop('symbol', 'BTCUSD')
+        timeframe_str = spec.pop('timeframe', 'M15')
+        bars = int(spec.pop('bars', 100000))
+        if timeframe_str not in TIMEFRAMES:
+            return jsonify({"error": f"Unknown timeframe: {timeframe_str}"}), 400
+
+        symbol_info = mt5.symbol_info(symbol)
+        if symbol_info is None:
+            log_candles.warning('symbol_not_found', symbol=symbol)
+            return jsonify({"error": f"Symbol {symbol} not found"}), 404
+        params_key = 'base' if spec.get('mode') == 'walk_forward' else 'params'
+        spec[params_key] = {'point': symbol_info.point, **(spec.get(params_key) or {})}
+
+        rates = mt5.copy_rates_from_pos(symbol, TIMEFRAMES[timeframe_str], 1, bars)
+        if rates is None:
+            error = mt5.last_error()
+            log_candles.error('rates_failed', symbol=symbol, timeframe=timeframe_str, error=str(error))
+            return jsonify({"error": f"Failed to get rates: {str(error)}"}), 500
+
+        job = backtest_jobs.submit(spec, rates)
+        return jsonify({"symbol": symbol, "timeframe": timeframe_str, **job}), 202
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 429
+    except Exception as e:
+        log_candles.exception('backtest_job_error', error=str(e))
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/backtest/jobs', methods=['GET'])
+def list_backtest_jobs():
+    return jsonify(backtest_jobs.list())
+
+
+@app.route('/backtest/jobs/<job_id>', methods=['GET', 'DELETE'])
+def backtest_job(job_id):
+    """Job status and, once done, its result. DELETE cancels a running job."""
+    if request.method == 'DELETE':
+        if not backtest_jobs.cancel(job_id):
+            return jsonify({"error": f"Job {job_id} is not running"}), 404
+    job = backtest_jobs.snapshot(job_id)
+    if job is None:
+        return jsonify({"error": f"Job {job_id} not found"}), 404
+    return jsonify(job)
+
+
+@app.route('/backtest/jobs/<job_id>/events', methods=['GET'])
+def backtest_job_events(job_id):
+    """SSE: 'progress' events, then one 'done' (with the result), 'failed' or 'cancelled'"""
+    if backtest_jobs.snapshot(job_id, with_result=False) is None:
+        return jsonify({"error": f"Job {job_id} not found"}), 404
+
+    def stream():
+        yield "retry: 2000\n\n"
+        seen = 0
+        while True:
+            events, finished = backtest_jobs.events(job_id, seen)
+            if not events and not finished:
+                yield ": keepalive\n\n"
+                continue
+            for event in events:
+                if event['type'] == 'done':
+                    event = {**event, 'result': backtest_jobs.snapshot(job_id)['result']}
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+            seen += len(events)
+            if finished and not events:
+                return
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# =============================================================================
+# ENDPOINT: Bar-Close Events (Server-Sent Events)
+# =============================================================================
+@app.route('/events/bars', methods=['GET'])
+def bar_events():
+    """
+    Push a 'bar_closed' event (finished bar + pattern signal) the moment a
+    subscribed bar closes.
+    Query: pairs=EURUSD:M15,GBPUSD:H1  - or -  symbols=EURUSD,GBPUSD&timeframes=M15,H1
+    """
+    pairs = set()
+    for item in request.args.get('pairs', '').split(','):
+        if ':' in item:
+            symbol, _, timeframe = item.strip().partition(':')
+            pairs.add((symbol, timeframe))
+    symbols = [s.strip() for s in request.args.get('symbols', '').split(',') if s.strip()]
+    timeframes = [t.strip() for t in request.args.get('timeframes', 'M15').split(',') if t.strip()]
+    pairs.update((symbol, timeframe) for symbol in symbols for timeframe in timeframes)
+
+    unknown = sorted({tf for _, tf in pairs if tf not in TIMEFRAMES})
+    if not pairs or unknown:
+        return jsonify({"error": f"No valid pairs (unknown timeframes: {', '.join(unknown) or '-'})"}), 400
+
+    sub = bar_scheduler.subscribe(pairs)
+    log_events.info('subscribed', pairs=len(pairs))
+
+    def stream():
+        try:
+            yield "retry: 2000\n\n"
+            yield f": subscribed to {', '.join(sorted(f'{s}:{tf}' for s, tf in pairs))}\n\n"
+            while True:
+                try:
+                    event = sub.events.get(timeout=15)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: bar_closed\ndata: {json.dumps(event)}\n\n"
+        finally:
+            bar_scheduler.unsubscribe(sub)
+            log_events.info('unsubscribed', pairs=len(pairs))
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/events/status', methods=['GET'])
+def bar_events_status():
+    """Scheduler subscriptions and the learned server time offset"""
+    return jsonify(bar_scheduler.status())
+
+
 # =============================================================================
 # ENDPOINT: Get Positions (CRITICAL - Source of Truth for Active Orders)
 # =============================================================================
@@ -313,14 +806,14 @@ def get_positions():
         
         if positions is None:
             error = mt5.last_error()
-            print(f"Failed to get positions: {error}")
+            log_positions.error('positions_failed', error=str(error))
             return jsonify({
                 "success": False,
                 "error": f"Failed to get positions: {str(error)}",
                 "positions": []
             }), 500
         
-        print(f"Found {len(positions)} open positions in MT5")
+        log_positions.debug('positions_fetched', count=len(positions))
         
         position_list = []
         for pos in positions:
@@ -347,7 +840,7 @@ def get_positions():
         })
         
     except Exception as e:
-        print(f"Error getting positions: {e}")
+        log_positions.exception('positions_error', error=str(e))
         return jsonify({
             "success": False,
             "error": str(e),
@@ -397,49 +890,113 @@ def verify_position(ticket):
 # =============================================================================
 @app.route('/order', methods=['POST'])
 def place_order():
+    """
+    Place a REAL order on MT5, at most once per client order id.
+
+    With `client_order_id` (or an Idempotency-Key header) a repeated request
+    gets the first one's response without reaching the terminal; see
+    idempotency.py for the in-flight and unknown-outcome cases.
+    """
+    timer = OrderTimer()
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"success": False, "error": "Request body must be a JSON object", "retcode": None}), 400
+    try:
+        key = parse_key(data, request.headers)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e), "retcode": None}), 400
+    timer.mark('request_parse')
+    if key is None:
+        return _place_order(data, timer)
+
+    wanted = fingerprint(data)
+    for _ in range(CLAIM_ATTEMPTS):
+        entry, owned = order_keys.claim(key, wanted)
+        if owned:
+            break
+        if entry['request'] != wanted:
+            order_keys.count('conflict')
+            return jsonify({"success": False, "client_order_id": key, "retcode": None,
+                            "error": "client_order_id was already used for a different order"}), 422
+        if entry['status'] == 'pending':
+            entry = order_keys.wait(key)
+            if entry is None:
+                continue        # the first one never reached order_send: claim the key again
+            if entry['status'] == 'pending':
+                break
+        if entry['status'] == 'done':
+            order_keys.count('replay')
+            return jsonify({**entry['response'], "idempotent_replay": True}), entry['code']
+        # 'sent' without an answer: did it reach the server after all?
+        found = find_order(mt5, entry['request']['symbol'], entry['comment'], entry['time'])
+        if found is not None:
+            found.update(client_order_id=key, recovered=True)
+            order_keys.finish(key, 200, found, recovered=True)
+            log_order.warning('order_recovered', client_order_id=key, ticket=found['order_ticket'])
+            return jsonify(found)
+        entry, owned = order_keys.claim(key, wanted, retry=True)
+        if owned:
+            break
+    if not owned:
+        order_keys.count('in_progress')
+        return jsonify({"success": False, "client_order_id": key, "retcode": None, "in_progress": True,
+                        "error": "The order with this client_order_id is still being sent"}), 409
+
+    timer.mark('client_order_id')      # claim, and any wait for an earlier duplicate
+    response = app.make_response(_place_order(data, timer, key, entry['comment']))
+    body = {**response.get_json(), "client_order_id": key}
+    order_keys.finish(key, response.status_code, body)
+    return jsonify(body), response.status_code
+
+
+def _place_order(data, timer, client_order_id=None, comment="DojiHunter AI"):
     """
     Place a REAL order on MT5.
     
     FLOW:
     1. Verify MT5 connection and trading allowed
     2. Build order request
+    2b. Pre-trade checks (see pretrade.py): volume rounded/clamped, doomed
+        orders (trade mode, stops, margin) refused without a trade server trip
     3. Execute order via mt5.order_send()
-    4. Verify retcode == TRADE_RETCODE_DONE (10009)
+    4. Verify retcode == TRADE_RETCODE_DONE (10009), or DONE_PARTIAL (10010)
+       when IOC filled only part of the volume
     5. Verify position exists in positions_get()
     6. Return success only if ALL checks pass
+
+    Every stage is timed into the OrderTimer place_order() started when the
+    request came in (see /orders/latency).
     """
+    timer.set(success=False)
     try:
         # Step 1: Verify connection
         connected, error = verify_mt5_connection()
+        timer.mark('connection_check')
         if not connected:
-            print(f"❌ ORDER REJECTED: {error}")
+            timer.set(error=error)
+            log_order.error('order_rejected', reason=error)
             return jsonify({
                 "success": False,
                 "error": error,
                 "retcode": None
             }), 503
         
-        data = request.json
         symbol = data.get('symbol')
         action_type = data.get('type')  # 'BUY' or 'SELL'
         volume = float(data.get('volume', 0.01))
         sl = data.get('sl')
         tp = data.get('tp')
-        
-        print("\n" + "=" * 60)
-        print("📤 ORDER REQUEST RECEIVED")
-        print("=" * 60)
-        print(f"   Symbol : {symbol}")
-        print(f"   Type   : {action_type}")
-        print(f"   Volume : {volume}")
-        print(f"   SL     : {sl}")
-        print(f"   TP     : {tp}")
+        timer.set(symbol=symbol, type=action_type, volume=volume)
+        if client_order_id:
+            timer.set(client_order_id=client_order_id)
         
         # Step 2: Get current price
         tick = mt5.symbol_info_tick(symbol)
+        timer.mark('symbol_info_tick')
         if tick is None:
             error_msg = f"Symbol {symbol} not found or not available"
-            print(f"❌ {error_msg}")
+            timer.set(error=error_msg)
+            log_order.error('order_symbol_unavailable', symbol=symbol)
             return jsonify({
                 "success": False,
                 "error": error_msg,
@@ -458,46 +1015,69 @@ def place_order():
             "price": price,
             "sl": float(sl) if sl else 0.0,
             "tp": float(tp) if tp else 0.0,
-            "deviation": 20,
             "magic": 234000,
-            "comment": "DojiHunter AI",
+            "comment": comment,
             "type_time": mt5.ORDER_TIME_GTC,
-            "type_filling": mt5.ORDER_FILLING_IOC,
         }
+        execution_policy.prepare(order_request)     # filling mode + deviation (see order_policy.py)
+        timer.set(requested_price=price)
+        timer.mark('build_request')
+
+        # Step 3b: Pre-trade checks (volume grid, trade mode, stops, margin)
+        check = pretrade.check(order_request, tick)
+        timer.mark('pretrade')
+        if not check['ok']:
+            timer.set(error=check['error'], pretrade=check['reason'])
+            log_order.error('order_pretrade_rejected', symbol=symbol, reason=check['reason'], error=check['error'])
+            return jsonify({
+                "success": False,
+                "error": f"Pre-trade check failed: {check['error']}",
+                "retcode": check.get('retcode'),
+                "stage": "pretrade",
+                "reason": check['reason'],
+                "volume": check['volume']
+            }), 400
+        if check['adjustment']:
+            order_request['volume'] = check['volume']
+            log_order.warning('order_volume_adjusted', symbol=symbol, requested=volume, volume=check['volume'],
+                              why=check['adjustment'])
+        log_order.info('order_request', request=order_request)
         
-        print("\n📋 ORDER REQUEST DETAILS:")
-        for key, value in order_request.items():
-            print(f"   {key}: {value}")
-        
-        # Step 4: Execute order
-        print("\n⏳ Sending order to MT5...")
-        result = mt5.order_send(order_request)
+        # Step 4: Execute order (requotes / price changes retried by the policy)
+        if client_order_id:
+            order_keys.sent(client_order_id)
+        result, attempts = execution_policy.send(order_request)
+        timer.mark('order_send')
+        books_changed()
+        timer.set(attempts=attempts)
+        if result is None:
+            error_msg = f"order_send failed: {mt5.last_error()}"
+            timer.set(error=error_msg)
+            log_order.error('order_send_none', symbol=symbol, error=error_msg)
+            return jsonify({"success": False, "error": error_msg, "retcode": None, "attempts": attempts}), 500
+        timer.set(retcode=result.retcode, ticket=result.order, fill_price=result.price,
+                  filled_volume=result.volume)
         
-        print("\n📋 ORDER RESULT FROM MT5:")
-        print(f"   retcode : {result.retcode}")
-        print(f"   deal    : {result.deal}")
-        print(f"   order   : {result.order}")
-        print(f"   volume  : {result.volume}")
-        print(f"   price   : {result.price}")
-        print(f"   comment : {result.comment}")
+        log_order.info('order_result', symbol=symbol, retcode=result.retcode, deal=result.deal,
+                       order=result.order, volume=result.volume, price=result.price,
+                       comment=result.comment)
         
         # Step 5: Verify retcode
-        # TRADE_RETCODE_DONE = 10009
-        if result.retcode != mt5.TRADE_RETCODE_DONE:
-            print(f"\n❌ ORDER FAILED!")
-            print(f"   Retcode: {result.retcode}")
-            print(f"   Comment: {result.comment}")
+        # TRADE_RETCODE_DONE = 10009, TRADE_RETCODE_DONE_PARTIAL = 10010 (IOC remainder cancelled)
+        if result.retcode not in (mt5.TRADE_RETCODE_DONE, mt5.TRADE_RETCODE_DONE_PARTIAL):
+            timer.set(error=result.comment)
+            log_order.error('order_failed', symbol=symbol, retcode=result.retcode, comment=result.comment)
             return jsonify({
                 "success": False,
                 "error": f"Order rejected by MT5: {result.comment}",
                 "retcode": result.retcode,
+                "attempts": attempts,
                 "comment": result.comment
             }), 400
         
         # Step 6: Verify position exists in MT5
-        print("\n⏳ Verifying position in MT5...")
-        import time
-        time.sleep(0.5)  # Small delay for MT5 to register position
+        time.sleep(ORDER_CONFIRM_DELAY)  # Small delay for MT5 to register position
+        timer.mark('confirmation_wait')
         
         # Try to find the position
         positions = mt5.positions_get(symbol=symbol)
@@ -515,19 +1095,15 @@ def place_order():
                     position_found = True
                     verified_position = pos
                     break
+        timer.mark('verification')
+        timer.set(success=True, position_verified=position_found)
         
         if not position_found:
-            print(f"\n⚠️  WARNING: Position not immediately found in MT5")
-            print(f"   This could be a timing issue. Order ticket: {result.order}")
-            # Don't fail here - order_send succeeded
+            # Could be a timing issue - don't fail here, order_send succeeded
+            log_order.warning('position_not_verified', symbol=symbol, order=result.order)
         else:
-            print(f"\n✅ POSITION VERIFIED IN MT5!")
-            print(f"   Ticket: {verified_position.ticket}")
-            print(f"   Price : {verified_position.price_open}")
-        
-        print("\n" + "=" * 60)
-        print("✅ ORDER EXECUTED SUCCESSFULLY")
-        print("=" * 60)
+            log_order.info('position_verified', symbol=symbol, ticket=verified_position.ticket,
+                           price_open=verified_position.price_open)
         
         return jsonify({
             "success": True,
@@ -535,6 +1111,10 @@ def place_order():
             "deal_ticket": result.deal,
             "entry_price": result.price,
             "volume": result.volume,
+            "requested_volume": volume,
+            "volume_adjustment": check['adjustment'],
+            "partial_fill": result.retcode == mt5.TRADE_RETCODE_DONE_PARTIAL,
+            "attempts": attempts,
             "symbol": symbol,
             "type": action_type,
             "retcode": result.retcode,
@@ -542,14 +1122,44 @@ def place_order():
         })
         
     except Exception as e:
-        print(f"\n❌ EXCEPTION IN ORDER: {e}")
-        import traceback
-        traceback.print_exc()
+        timer.set(error=str(e))
+        log_order.exception('order_exception', error=str(e))
         return jsonify({
             "success": False,
             "error": str(e),
             "retcode": None
         }), 500
+    finally:
+        order_latency_log.add(timer)
+
+
+# =============================================================================
+# ENDPOINT: Order Latency Breakdown
+# =============================================================================
+@app.route('/orders/latency', methods=['GET'])
+def get_order_latency():
+    """
+    Recent per-order timing records (most recent first) plus a summary.
+    Query: limit (default 100), symbol, success (true/false)
+    """
+    try:
+        limit = int(request.args.get('limit', 100))
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        return jsonify({"error": "limit must be an integer >= 1"}), 400
+    symbol = request.args.get('symbol')
+    success = request.args.get('success')
+    if success is not None:
+        success = success.lower() == 'true'
+
+    records = order_latency_log.query(limit=limit, symbol=symbol, success=success)
+    return jsonify({
+        "count": len(records),
+        "summary": order_latency_log.summary(records),
+        "orders": records,
+        "client_order_ids": order_keys.stats()
+    })
 
 
 # =============================================================================
@@ -591,39 +1201,304 @@ def close_position(ticket):
             "type": close_type,
             "position": ticket,
             "price": price,
-            "deviation": 20,
             "magic": 234000,
             "comment": "DojiHunter Close",
             "type_time": mt5.ORDER_TIME_GTC,
-            "type_filling": mt5.ORDER_FILLING_IOC,
         }
         
-        print(f"\n📤 CLOSING POSITION {ticket}")
-        result = mt5.order_send(close_request)
+        result, attempts = execution_policy.send(close_request)
+        books_changed()
+        if result is None:
+            log_close.error('close_send_none', ticket=ticket, error=str(mt5.last_error()))
+            return jsonify({"success": False, "error": f"order_send failed: {mt5.last_error()}",
+                            "attempts": attempts}), 500
+        
+        if result.retcode == mt5.TRADE_RETCODE_DONE_PARTIAL:
+            # IOC closed only part of it - the position is still open
+            log_close.warning('close_partial', ticket=ticket, closed=result.volume, volume=pos.volume,
+                              price=result.price)
+            return jsonify({
+                "success": False,
+                "error": f"Partially closed {result.volume} of {pos.volume} lots",
+                "retcode": result.retcode,
+                "closed_volume": result.volume,
+                "close_price": result.price,
+                "attempts": attempts
+            }), 409
         
         if result.retcode != mt5.TRADE_RETCODE_DONE:
+            log_close.error('close_failed', ticket=ticket, retcode=result.retcode, comment=result.comment)
             return jsonify({
                 "success": False,
                 "error": f"Failed to close: {result.comment}",
-                "retcode": result.retcode
+                "retcode": result.retcode,
+                "attempts": attempts
             }), 400
         
-        print(f"✅ Position {ticket} closed successfully")
+        log_close.info('position_closed', ticket=ticket, price=result.price, profit=pos.profit)
         
         return jsonify({
             "success": True,
             "closed_ticket": ticket,
             "close_price": result.price,
-            "profit": pos.profit
+            "profit": pos.profit,
+            "attempts": attempts
         })
         
     except Exception as e:
+        log_close.exception('close_exception', ticket=ticket, error=str(e))
         return jsonify({
             "success": False,
             "error": str(e)
         }), 500
 
 
+# =============================================================================
+# ENDPOINT: Pending Orders (limit / stop)
+# =============================================================================
+def _pending_context(symbol):
+    """(symbol info, tick) or an error response"""
+    info = symbol_cache.get(mt5, symbol)
+    tick = mt5.symbol_info_tick(symbol) if info is not None else None
+    if info is None or tick is None:
+        return None, None, (jsonify({"success": False, "error": f"Symbol {symbol} not found or not available"}), 404)
+    return info, tick, None
+
+
+def _send_pending(order_request, log_event, **fields):
+    """order_send + book invalidation; (result, error response or None)"""
+    result = mt5.order_send(order_request)
+    books_changed()                     # a pending order may have filled meanwhile
+    if result is None or result.retcode != mt5.TRADE_RETCODE_DONE:
+        comment = result.comment if result is not None else str(mt5.last_error())
+        retcode = result.retcode if result is not None else None
+        log_pending.error(f'{log_event}_failed', retcode=retcode, comment=comment, **fields)
+        return result, (jsonify({"success": False, "error": f"Rejected by MT5: {comment}",
+                                 "retcode": retcode}), 400)
+    log_pending.info(log_event, order=result.order, **fields)
+    return result, None
+
+
+@app.route('/orders/pending', methods=['POST'])
+def place_pending_order():
+    """
+    Stage a limit / stop entry on the MT5 server (TRADE_ACTION_PENDING).
+    Body: {"symbol", "type": BUY_LIMIT|SELL_LIMIT|BUY_STOP|SELL_STOP, "volume",
+           "price", "sl"?, "tp"?, "expiration"? (unix seconds, server time), "comment"?}
+    """
+    try:
+        connected, error = verify_mt5_connection()
+        if not connected:
+            return jsonify({"success": False, "error": error}), 503
+        try:
+            order = parse_pending(request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+
+        info, tick, failed = _pending_context(order['symbol'])
+        if failed:
+            return failed
+        for name in ('price', 'sl', 'tp'):
+            order[name] = round(order[name], info.digits)
+        error = check_pending(info, order['type'], tick.bid, tick.ask, order['price'], order['sl'], order['tp'])
+        if error:
+            return jsonify({"success": False, "error": error}), 400
+
+        result, failed = _send_pending(pending_request(mt5, order), 'pending_placed',
+                                       symbol=order['symbol'], type=order['type'], price=order['price'])
+        if failed:
+            return failed
+        return jsonify({"success": True, "order_ticket": result.order, **order})
+
+    except Exception as e:
+        log_pending.exception('pending_exception', error=str(e))
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/orders/pending', methods=['GET'])
+def list_pending_orders():
+    """
+    Pending orders from the orders_get() snapshot cache.
+    Query: symbol, fresh=true (bypass the cache)
+    """
+    connected, error = verify_mt5_connection()
+    if not connected:
+        return jsonify({"success": False, "error": error, "orders": []}), 503
+    orders = orders_cache.get(mt5, 0 if request.args.get('fresh', '').lower() == 'true' else None)
+    if orders is None:
+        return jsonify({"success": False, "error": f"Failed to get orders: {mt5.last_error()}", "orders": []}), 500
+    symbol = request.args.get('symbol')
+    orders = [order_to_dict(mt5, o) for o in orders
+              if order_kind(mt5, o.type) and (symbol is None or o.symbol == symbol)]
+    return jsonify({"success": True, "count": len(orders), "orders": orders, "cache": orders_cache.stats()})
+
+
+@app.route('/orders/pending/<int:ticket>', methods=['PATCH', 'DELETE'])
+def change_pending_order(ticket):
+    """
+    PATCH  - move price / sl / tp / expiration (omitted fields keep their value, sl/tp 0 removes)
+    DELETE - cancel the order (TRADE_ACTION_REMOVE)
+    """
+    try:
+        connected, error = verify_mt5_connection()
+        if not connected:
+            return jsonify({"success": False, "error": error}), 503
+        changes = None
+        if request.method == 'PATCH':
+            try:
+                changes = parse_changes(request.get_json(silent=True))
+            except ValueError as e:
+                return jsonify({"success": False, "error": str(e)}), 400
+
+        found = mt5.orders_get(ticket=ticket)
+        if not found:
+            return jsonify({"success": False, "error": f"Pending order {ticket} not found in MT5"}), 404
+        existing = found[0]
+        kind = order_kind(mt5, existing.type)
+        info, tick, failed = _pending_context(existing.symbol)
+        if failed:
+            return failed
+        error = check_frozen(info, kind, tick.bid, tick.ask, existing.price_open)
+        if error:
+            return jsonify({"success": False, "error": error}), 400
+
+        if changes is None:
+            _, failed = _send_pending(remove_request(mt5, existing), 'pending_removed', ticket=ticket)
+            if failed:
+                return failed
+            return jsonify({"success": True, "removed_ticket": ticket})
+
+        price = round(changes.get('price', existing.price_open), info.digits)
+        sl = round(changes.get('sl', existing.sl), info.digits)
+        tp = round(changes.get('tp', existing.tp), info.digits)
+        expiration = int(changes.get('expiration', existing.time_expiration))
+        if (price, sl, tp, expiration) == (existing.price_open, existing.sl, existing.tp, existing.time_expiration):
+            return jsonify({"success": True, "ticket": ticket, "unchanged": True})
+        error = check_pending(info, kind, tick.bid, tick.ask, price, sl, tp)
+        if error:
+            return jsonify({"success": False, "error": error}), 400
+        _, failed = _send_pending(modify_request(mt5, existing, price, sl, tp, expiration), 'pending_modified',
+                                  ticket=ticket, price=price, sl=sl, tp=tp)
+        if failed:
+            return failed
+        return jsonify({"success": True, "ticket": ticket, "type": kind, "price": price, "sl": sl, "tp": tp,
+                        "expiration": expiration})
+
+    except Exception as e:
+        log_pending.exception('pending_exception', ticket=ticket, error=str(e))
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+# =============================================================================
+# ENDPOINT: Modify SL/TP
+# =============================================================================
+@app.route('/modify', methods=['POST'])
+def modify_position():
+    """
+    Change SL and/or TP of an open position (TRADE_ACTION_SLTP).
+    Body: {"ticket": 123, "sl": 1.0950, "tp": 1.1100} - omitted keeps, 0 removes
+    """
+    try:
+        connected, error = verify_mt5_connection()
+        if not connected:
+            return jsonify({"success": False, "error": error}), 503
+        try:
+            item = parse_modification(request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+
+        result = modify_positions(mt5, symbol_cache, [item])[0]
+        books_changed()
+        if not result['success']:
+            log_modify.error('modify_failed', **result)
+            return jsonify(result), 404 if result['reason'] == 'not_found' else 400
+        log_modify.info('position_modified', **result)
+        return jsonify(result)
+
+    except Exception as e:
+        log_modify.exception('modify_exception', error=str(e))
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/modify/batch', methods=['POST'])
+def modify_positions_batch():
+    """
+    Many SL/TP changes in one call: one positions snapshot, one tick per
+    symbol, then the order_sends back to back.
+    Body: {"modifications": [{"ticket": 123, "sl": ...}, ...]}
+    Always 200 when the batch itself is valid; see each result's success.
+    """
+    try:
+        connected, error = verify_mt5_connection()
+        if not connected:
+            return jsonify({"success": False, "error": error}), 503
+        data = request.get_json(silent=True) or {}
+        raw = data.get('modifications')
+        if not isinstance(raw, list) or not raw:
+            return jsonify({"success": False, "error": "modifications must be a non-empty list"}), 400
+        if len(raw) > MAX_MODIFY_BATCH:
+            return jsonify({"success": False,
+                            "error": f"At most {MAX_MODIFY_BATCH} modifications per batch"}), 400
+        try:
+            items = [parse_modification(item) for item in raw]
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+
+        started = time.perf_counter()
+        results = modify_positions(mt5, symbol_cache, items)
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 3)
+        books_changed()
+        failed = [r for r in results if not r['success']]
+        log_modify.info('batch_modified', count=len(results), failed=len(failed), elapsed_ms=elapsed_ms)
+        return jsonify({
+            "success": not failed,
+            "count": len(results),
+            "modified": sum(1 for r in results if r['success'] and not r.get('unchanged')),
+            "failed": len(failed),
+            "elapsed_ms": elapsed_ms,
+            "results": results
+        })
+
+    except Exception as e:
+        log_modify.exception('modify_batch_exception', error=str(e))
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+# =============================================================================
+# ENDPOINT: Position Monitor
+# =============================================================================
+@app.route('/monitor', methods=['GET', 'POST'])
+def monitor():
+    """
+    GET  - monitor state, tracked positions, exit stops, reaction times
+    POST - {"enabled": true|false, "rules": {...}} (rules merge over the current ones)
+    """
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        enabled = data.get('enabled')
+        if enabled is not None and not isinstance(enabled, bool):
+            return jsonify({"success": False, "error": "enabled must be true or false"}), 400
+        try:
+            position_monitor.configure(enabled=enabled, rules=data.get('rules'))
+        except (TypeError, ValueError) as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        log_monitor.info('monitor_configured', enabled=enabled, rules=data.get('rules'))
+    return jsonify({**position_monitor.status(), "positions_cache": positions_cache.stats()})
+
+
+@app.route('/monitor/exits', methods=['GET'])
+def monitor_exits():
+    """Recent monitor closes, most recent first. Query: limit (default 50)"""
+    try:
+        limit = int(request.args.get('limit', 50))
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        return jsonify({"error": "limit must be an integer >= 1"}), 400
+    exits = position_monitor.exits(limit)
+    return jsonify({"count": len(exits), "exits": exits})
+
+
 # =============================================================================
 # ENDPOINT: Account Info
 # =============================================================================
@@ -0,0 +1,126 @@
+"""
+=============================================================================
+SL/TP MODIFICATION - TRADE_ACTION_SLTP INSTEAD OF CLOSE + REOPEN
+=============================================================================
+
+Every modification is checked before it reaches MT5, using the cached
+symbol info (SymbolInfoCache) and the current tick:
+
+    - sl / tp omitted -> keep the position's value, 0 -> remove it;
+      values are rounded to the symbol's digits
+    - stops level   BUY   sl <= bid - stops_level * point, tp >= bid + ...
+                    SELL  sl >= ask + stops_level * point, tp <= ask - ...
+    - freeze level  an SL/TP already within trade_freeze_level points of
+                    the price can no longer be moved
+    - unchanged     nothing is sent (MT5 would answer NO_CHANGES)
+
+modify_positions() reads the positions once, the tick once per symbol,
+then sends the valid requests one after another in a tight loop; each
+result carries its own order_send time.
+=============================================================================
+"""
+
+import time
+
+
+def parse_modification(item):
+    """{"ticket", "sl"?, "tp"?} -> (ticket, sl or None, tp or None)"""
+    if not isinstance(item, dict):
+        raise ValueError('Each modification must be an object')
+    try:
+        ticket = int(item['ticket'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('ticket (integer) is required')
+    values = []
+    for name in ('sl', 'tp'):
+        value = item.get(name)
+        if value is not None:
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f'{name} must be a number')
+            if value < 0:
+                raise ValueError(f'{name} must be >= 0')
+        values.append(value)
+    if values == [None, None]:
+        raise ValueError(f'Nothing to modify for ticket {ticket}: give sl and/or tp')
+    return ticket, values[0], values[1]
+
+
+def check_stops(info, buy, bid, ask, sl, tp, current_sl=0.0, current_tp=0.0):
+    """Why MT5 would refuse the new sl/tp, or None when it is fine"""
+    point = info.point
+    price = bid if buy else ask
+    sign = 1 if buy else -1
+    freeze = info.trade_freeze_level * point
+    if freeze:
+        for name, current, new in (('sl', current_sl, sl), ('tp', current_tp, tp)):
+            if current and new != current and abs(price - current) <= freeze:
+                return f'{name} {current} is inside the freeze level ({info.trade_freeze_level} points)'
+    distance = info.trade_stops_level * point
+    if sl and sign * (price - sl) < distance - point / 2:
+        return (f'sl {sl} must be {"below" if buy else "above"} {round(price - sign * distance, info.digits)} '
+                f'(stops level {info.trade_stops_level} points)')
+    if tp and sign * (tp - price) < distance - point / 2:
+        return (f'tp {tp} must be {"above" if buy else "below"} {round(price + sign * distance, info.digits)} '
+                f'(stops level {info.trade_stops_level} points)')
+    return None
+
+
+def modify_positions(mt5, symbol_cache, items, positions=None, ticks=None):
+    """
+    Apply [(ticket, sl, tp)] -> one result dict per item, in order.
+    positions / ticks (by symbol) may be passed in by callers that already
+    hold a fresh snapshot. A failed result has `reason`: not_found,
+    invalid_stops or rejected.
+    """
+    if positions is None:
+        positions = mt5.positions_get() or ()
+    by_ticket = {p.ticket: p for p in positions}
+    ticks = dict(ticks or {})
+    results, pending = [], []
+
+    for ticket, sl, tp in items:
+        result = {'ticket': ticket, 'success': False}
+        results.append(result)
+        pos = by_ticket.get(ticket)
+        if pos is None:
+            result.update(reason='not_found', error=f'Position {ticket} not found in MT5')
+            continue
+        info = symbol_cache.get(mt5, pos.symbol)
+        if pos.symbol not in ticks:
+            ticks[pos.symbol] = mt5.symbol_info_tick(pos.symbol)
+        tick = ticks[pos.symbol]
+        if info is None or tick is None:
+            result.update(reason='rejected', error=f'Symbol {pos.symbol} not available')
+            continue
+        sl = pos.sl if sl is None else round(sl, info.digits)
+        tp = pos.tp if tp is None else round(tp, info.digits)
+        result.update(symbol=pos.symbol, sl=sl, tp=tp)
+        if (sl, tp) == (pos.sl, pos.tp):
+            result.update(success=True, unchanged=True)
+            continue
+        error = check_stops(info, pos.type == 0, tick.bid, tick.ask, sl, tp, pos.sl, pos.tp)
+        if error:
+            result.update(reason='invalid_stops', error=error)
+            continue
+        pending.append((result, {
+            "action": mt5.TRADE_ACTION_SLTP,
+            "symbol": pos.symbol,
+            "position": ticket,
+            "sl": sl,
+            "tp": tp,
+            "magic": pos.magic,
+        }))
+
+    for result, sltp_request in pending:
+        started = time.perf_counter()
+        sent = mt5.order_send(sltp_request)
+        result['send_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        result['retcode'] = sent.retcode if sent is not None else None
+        if sent is not None and sent.retcode == mt5.TRADE_RETCODE_DONE:
+            result['success'] = True
+        else:
+            result.update(reason='rejected',
+                          error=sent.comment if sent is not None else str(mt5.last_error()))
+    return results
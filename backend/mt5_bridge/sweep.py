@@ -0,0 +1,306 @@
+"""
+=============================================================================
+PARAMETER SWEEP - MANY BACKTESTS ON EVERY CORE
+=============================================================================
+
+Fans a grid or a random search over backtest.DEFAULT_PARAMS out to a
+process pool:
+
+    - the candles are copied ONCE into shared memory; each worker attaches
+      to the block in its initializer and wraps it in a zero-copy NumPy
+      view, so a task is only its small params dict
+    - every finished combination is appended to a JSONL checkpoint and
+      flushed; re-running with the same checkpoint skips what is done
+    - results are ranked by a report metric (default total_r)
+
+SPEC (JSON):
+    grid     {"sl_mult": [1, 1.5, 2], "tp_mult": [1.5, 2, 3]}
+    random   {"sl_mult": {"min": 0.5, "max": 3}, "patterns": ["doji", "star,doji"]}
+             lists are sampled as choices, {"min", "max"} uniformly
+             ({"min", "max", "int": true} for integers)
+
+USAGE:
+    python sweep.py --file EURUSD_M15.csv --grid spec.json --checkpoint sweep.jsonl
+    python sweep.py --simulate 200000 --random '{"doji_max": {"min": 0.05, "max": 0.2}}' -n 500
+=============================================================================
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from backtest import add_source_arguments, load_source, resolve_params, run_backtest
+
+
+RANK_METRICS = ('total_r', 'avg_r', 'profit_factor', 'hit_rate', 'final_equity', 'max_drawdown_r')
+LOWER_IS_BETTER = ('max_drawdown_r',)
+TABLE_COLUMNS = ('trades', 'hit_rate', 'total_r', 'avg_r', 'profit_factor', 'max_drawdown_r')
+
+
+# =============================================================================
+# PARAMETER SPACES
+# =============================================================================
+def load_spec(value):
+    """Spec from inline JSON or a JSON file"""
+    if os.path.exists(value):
+        with open(value) as f:
+            return json.load(f)
+    return json.loads(value)
+
+
+def grid(spec):
+    """Every combination of the listed values, in a stable order"""
+    names = sorted(spec)
+    values = [spec[n] if isinstance(spec[n], list) else [spec[n]] for n in names]
+    return [dict(zip(names, combo)) for combo in itertools.product(*values)]
+
+
+def random_search(spec, count, seed=0):
+    """`count` samples of the spec (same seed, same samples)"""
+    rng = random.Random(seed)
+    names = sorted(spec)
+    samples = []
+    for _ in range(count):
+        combo = {}
+        for name in names:
+            value = spec[name]
+            if isinstance(value, dict):
+                if value.get('int'):
+                    combo[name] = rng.randint(int(value['min']), int(value['max']))
+                else:
+                    combo[name] = round(rng.uniform(value['min'], value['max']), 6)
+            elif isinstance(value, list):
+                combo[name] = rng.choice(value)
+            else:
+                combo[name] = value
+        samples.append(combo)
+    return samples
+
+
+def combo_key(combo):
+    return json.dumps(combo, sort_keys=True)
+
+
+# =============================================================================
+# SHARED CANDLES
+# =============================================================================
+class SharedRates:
+    """A rates array copied into a named shared-memory block (owner side)"""
+
+    def __init__(self, rates):
+        rates = np.ascontiguousarray(rates)
+        self.shape = rates.shape
+        self.dtype = rates.dtype
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, rates.nbytes))
+        np.ndarray(self.shape, dtype=self.dtype, buffer=self.shm.buf)[:] = rates
+
+    def handle(self):
+        """What a worker needs to attach: (name, shape, dtype descr)"""
+        return self.shm.name, self.shape, self.dtype.descr
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_worker = {}
+
+
+def _attach(name, shape, descr, base_params):
+    # Pool workers share the parent's resource tracker, which unlinks the
+    # block only when the parent does
+    shm = shared_memory.SharedMemory(name=name)
+    _worker['shm'] = shm
+    _worker['rates'] = np.ndarray(shape, dtype=np.dtype(descr), buffer=shm.buf)
+    _worker['base'] = base_params
+
+
+def open_pool(shared, base_params=None, workers=None):
+    """Process pool whose workers are attached to `shared` (a SharedRates)"""
+    return multiprocessing.Pool(workers or os.cpu_count() or 1, initializer=_attach,
+                                initargs=(*shared.handle(), base_params or {}))
+
+
+def worker_rates():
+    """Inside a pool worker: the shared candles and the base params"""
+    return _worker['rates'], _worker['base']
+
+
+def _run_one(combo):
+    try:
+        report = run_backtest(_worker['rates'], {**_worker['base'], **combo}, curve_points=0)
+        report.pop('equity_curve')
+        report.pop('params')
+        return combo, report, None
+    except Exception as e:
+        return combo, None, f'{type(e).__name__}: {e}'
+
+
+# =============================================================================
+# CHECKPOINT
+# =============================================================================
+def fingerprint(rates):
+    """Identifies the data set a checkpoint belongs to"""
+    digest = hashlib.blake2b(np.ascontiguousarray(rates).tobytes(), digest_size=8).hexdigest()
+    return {'bars': len(rates), 'digest': digest}
+
+
+def read_checkpoint(path, header):
+    """{combo key: row} already done; refuses a checkpoint of other data/params"""
+    done = {}
+    if not path or not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for number, line in enumerate(f):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue            # torn last line after a crash
+            if number == 0:
+                if row.get('sweep') != header:
+                    raise ValueError(f"Checkpoint {path} belongs to another data set or base params")
+                continue
+            if row.get('error') is None:
+                done[combo_key(row['params'])] = row     # failed combinations are retried
+    return done
+
+
+# =============================================================================
+# SWEEP
+# =============================================================================
+def run_sweep(rates, combos, base_params=None, workers=None, checkpoint=None, progress=None):
+    """
+    Backtest every combo (merged over base_params) and return all rows,
+    including those restored from the checkpoint. progress(done, total)
+    is called after each finished combination.
+    """
+    base_params = {k: list(v) if isinstance(v, tuple) else v for k, v in (base_params or {}).items()}
+    for combo in combos:
+        resolve_params({**base_params, **combo})         # fail fast on typos
+    header = {'data': fingerprint(rates), 'base': base_params}
+    done = read_checkpoint(checkpoint, header)
+    rows = [done[k] for k in dict.fromkeys(map(combo_key, combos)) if k in done]
+    todo = list({combo_key(c): c for c in combos if combo_key(c) not in done}.values())
+    total = len(rows) + len(todo)
+    if not todo:
+        return rows
+
+    workers = workers or os.cpu_count() or 1
+    out = None
+    if checkpoint:
+        fresh = not os.path.exists(checkpoint) or os.path.getsize(checkpoint) == 0
+        if not fresh:
+            with open(checkpoint, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b'\n'
+        out = open(checkpoint, 'a')
+        if fresh:
+            out.write(json.dumps({'sweep': header}) + '\n')
+        elif torn:
+            out.write('\n')                # end the line a crash cut short
+
+    try:
+        with SharedRates(rates) as shared, open_pool(shared, base_params, workers) as pool:
+            chunksize = max(1, min(16, len(todo) // (workers * 4)))
+            for combo, report, error in pool.imap_unordered(_run_one, todo, chunksize):
+                row = {'params': combo, 'report': report, 'error': error}
+                rows.append(row)
+                if out:
+                    out.write(json.dumps(row) + '\n')
+                    out.flush()
+                if progress:
+                    progress(len(rows), total)
+    finally:
+        if out:
+            out.close()
+    return rows
+
+
+def rank(rows, metric='total_r', min_trades=1):
+    """Successful rows with enough trades, best first"""
+    if metric not in RANK_METRICS:
+        raise ValueError(f"Unknown rank metric: {metric} (use {', '.join(RANK_METRICS)})")
+    sign = 1 if metric in LOWER_IS_BETTER else -1
+    ok = [r for r in rows if r['report'] and r['report']['trades'] >= min_trades
+          and r['report'].get(metric) is not None]
+    return sorted(ok, key=lambda r: sign * r['report'][metric])
+
+
+def format_table(rows, top=20):
+    if not rows:
+        return '(no results)'
+    names = sorted({k for r in rows[:top] for k in r['params']})
+    header = ['#'] + names + list(TABLE_COLUMNS)
+    lines = []
+    for i, row in enumerate(rows[:top], 1):
+        cells = [str(i)] + [str(row['params'].get(n, '')) for n in names]
+        cells += ['' if row['report'][c] is None else str(row['report'][c]) for c in TABLE_COLUMNS]
+        lines.append(cells)
+    widths = [max(len(h), *(len(l[i]) for l in lines)) for i, h in enumerate(header)]
+    fmt = '  '.join(f'{{:>{w}}}' for w in widths)
+    return '\n'.join([fmt.format(*header)] + [fmt.format(*l) for l in lines])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Parallel parameter sweep over the doji strategy backtest')
+    add_source_arguments(parser)
+    space = parser.add_mutually_exclusive_group(required=True)
+    space.add_argument('--grid', help='grid spec (JSON or path)')
+    space.add_argument('--random', help='random-search spec (JSON or path)')
+    parser.add_argument('-n', '--samples', type=int, default=100, help='random-search samples')
+    parser.add_argument('--base', default='{}', help='params shared by every run (JSON or path)')
+    parser.add_argument('--workers', type=int, default=None, help='processes (default: all cores)')
+    parser.add_argument('--checkpoint', help='JSONL file; re-run to resume')
+    parser.add_argument('--rank-by', default='total_r', choices=RANK_METRICS)
+    parser.add_argument('--min-trades', type=int, default=30)
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--output', help='write all ranked rows as JSON')
+    args = parser.parse_args(argv)
+
+    rates = load_source(args)
+    if args.grid:
+        combos = grid(load_spec(args.grid))
+    else:
+        combos = random_search(load_spec(args.random), args.samples, args.seed)
+
+    started = time.perf_counter()
+
+    def progress(done, total):
+        if done == total or done % max(1, total // 20) == 0:
+            print(f"  {done}/{total} ({time.perf_counter() - started:.1f}s)", file=sys.stderr)
+
+    print(f"Sweep: {len(combos)} combinations over {len(rates)} bars, "
+          f"{args.workers or os.cpu_count()} workers", file=sys.stderr)
+    rows = run_sweep(rates, combos, load_spec(args.base), args.workers, args.checkpoint, progress)
+    ranked = rank(rows, args.rank_by, args.min_trades)
+
+    failed = [r for r in rows if r['error']]
+    if failed:
+        print(f"{len(failed)} combination(s) failed, e.g. {failed[0]['params']}: {failed[0]['error']}",
+              file=sys.stderr)
+    print(format_table(ranked, args.top))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(ranked, f, indent=2)
+        print(f"Results written to {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
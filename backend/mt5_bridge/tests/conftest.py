@@ -0,0 +1,26 @@
+"""
+Bridge modules import each other flat (`from metrics import registry`), so
+the tests run with backend/mt5_bridge on sys.path, against MT5Simulator.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import MetricsRegistry  # noqa: E402
+from mt5_mock import MT5Simulator  # noqa: E402
+
+
+@pytest.fixture
+def sim():
+    simulator = MT5Simulator(seed=1)
+    simulator.initialize()
+    return simulator
+
+
+@pytest.fixture
+def metrics():
+    return MetricsRegistry()
@@ -0,0 +1,43 @@
+"""create_backend(): strict mode in both directions"""
+
+import pytest
+
+import backends
+from backends import BackendConfigError, create_backend, describe, missing_functions
+from mt5_mock import MT5Simulator
+
+
+@pytest.fixture
+def fake_real(monkeypatch):
+    """A backend registered as real, so the tests don't need the MetaTrader5 package"""
+    monkeypatch.setitem(backends.BACKENDS, 'fake_real', (lambda env: MT5Simulator(seed=1), True))
+    return 'fake_real'
+
+
+def test_faults_over_real_backend_is_refused(fake_real):
+    with pytest.raises(BackendConfigError, match='MT5_FAULTS_ALLOW_REAL'):
+        create_backend(fake_real, env={'MT5_WRAPPERS': 'faults,metrics', 'MT5_FAULTS': '{}'})
+
+
+def test_leftover_mt5_faults_does_not_wrap_real_backend(fake_real):
+    backend = create_backend(fake_real, env={'MT5_FAULTS': '{"rules": {"*": {"none": 1.0}}}'})
+    assert describe(backend) == 'metrics > MT5Simulator'
+
+
+def test_faults_over_real_backend_with_opt_in(fake_real):
+    env = {'MT5_FAULTS': '{}', 'MT5_FAULTS_ALLOW_REAL': 'true'}
+    assert describe(create_backend(fake_real, env=env)) == 'metrics > faults > MT5Simulator'
+
+
+def test_faults_over_simulator_by_default():
+    env = {'USE_MOCK_MT5': 'true', 'MT5_FAULTS': '{}'}
+    assert describe(create_backend(env=env)) == 'metrics > faults > MT5Simulator'
+
+
+def test_simulator_requires_use_mock():
+    with pytest.raises(BackendConfigError, match='USE_MOCK_MT5'):
+        create_backend('simulator', env={})
+
+
+def test_simulator_serves_every_backend_function(sim):
+    assert missing_functions(sim) == []
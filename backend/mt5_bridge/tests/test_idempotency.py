@@ -0,0 +1,286 @@
+"""Client order ids: OrderKeys state machine, journal, find_order() and /order end to end"""
+
+import importlib
+import json
+import threading
+
+import pytest
+
+from idempotency import OrderKeys, find_order, fingerprint, order_comment, parse_key
+
+
+ORDER = {'symbol': 'EURUSD', 'type': 'BUY', 'volume': 0.1}
+
+
+def buy(sim, comment):
+    tick = sim.symbol_info_tick('EURUSD')
+    return sim.order_send({'action': sim.TRADE_ACTION_DEAL, 'symbol': 'EURUSD', 'volume': 0.1,
+                           'type': sim.ORDER_TYPE_BUY, 'price': tick.ask, 'comment': comment,
+                           'type_filling': sim.ORDER_FILLING_IOC})
+
+
+# =============================================================================
+# OrderKeys
+# =============================================================================
+def test_claim_send_finish(metrics):
+    keys = OrderKeys(metrics=metrics)
+    entry, owned = keys.claim('a', fingerprint(ORDER))
+    assert owned and entry['status'] == 'pending'
+    assert entry['comment'] == order_comment('a') and len(entry['comment']) <= 31
+
+    keys.sent('a')
+    duplicate, owned = keys.claim('a', fingerprint(ORDER))
+    assert not owned and duplicate['status'] == 'pending'     # in flight, not 'sent'
+
+    keys.finish('a', 200, {'success': True, 'retcode': 10009})
+    done, owned = keys.claim('a', fingerprint(ORDER))
+    assert not owned and done['status'] == 'done' and done['code'] == 200
+
+
+def test_key_released_when_never_sent(metrics):
+    keys = OrderKeys(metrics=metrics)
+    keys.claim('a', fingerprint(ORDER))
+    keys.finish('a', 400, {'success': False, 'retcode': None})
+    assert keys.wait('a', timeout=0) is None
+    _, owned = keys.claim('a', fingerprint(ORDER))
+    assert owned
+
+
+def test_unknown_outcome_stays_sent_until_retried(metrics):
+    keys = OrderKeys(metrics=metrics)
+    keys.claim('a', fingerprint(ORDER))
+    keys.sent('a')
+    keys.finish('a', 500, {'success': False, 'retcode': None})
+    entry, owned = keys.claim('a', fingerprint(ORDER))
+    assert not owned and entry['status'] == 'sent'
+    entry, owned = keys.claim('a', fingerprint(ORDER), retry=True)
+    assert owned and entry['status'] == 'pending'
+    _, owned = keys.claim('a', fingerprint(ORDER), retry=True)
+    assert not owned        # only one caller takes the key over
+
+
+def test_wait_returns_when_the_first_request_finishes(metrics):
+    keys = OrderKeys(metrics=metrics)
+    keys.claim('a', fingerprint(ORDER))
+    keys.sent('a')
+    timer = threading.Timer(0.05, keys.finish, ('a', 200, {'retcode': 10009}))
+    timer.start()
+    entry = keys.wait('a', timeout=5)
+    timer.join()
+    assert entry['status'] == 'done'
+
+
+def test_size_and_ttl_pruning(metrics):
+    keys = OrderKeys(max_entries=3, metrics=metrics)
+    for i in range(5):
+        keys.claim(f'k{i}', {})
+        keys.sent(f'k{i}')
+        keys.finish(f'k{i}', 200, {'retcode': 10009})
+    assert list(keys._entries) == ['k2', 'k3', 'k4']
+
+    keys._entries['k2']['time'] -= keys.ttl + 1
+    _, owned = keys.claim('k2', {})
+    assert owned            # expired: a new order
+
+
+def test_journal_replay_and_compaction(tmp_path, metrics):
+    path = str(tmp_path / 'keys.jsonl')
+    keys = OrderKeys(path, max_entries=3, metrics=metrics)
+    for i in range(4):
+        keys.claim(f'k{i}', {})
+        keys.sent(f'k{i}')
+        keys.finish(f'k{i}', 200, {'retcode': 10009, 'ticket': i})
+    keys.claim('lost', {})
+    keys.sent('lost')           # the bridge "dies" here
+    with open(path, 'a') as f:
+        f.write('{"key": "torn", "sta')
+
+    restarted = OrderKeys(path, max_entries=3, metrics=metrics)
+    assert list(restarted._entries) == ['k2', 'k3', 'lost']
+    assert restarted._entries['k3']['response'] == {'retcode': 10009, 'ticket': 3}
+    assert restarted._entries['lost']['status'] == 'sent'
+    with open(path) as f:
+        assert [json.loads(line)['key'] for line in f] == ['k2', 'k3', 'lost']
+
+
+def test_journal_compacts_while_running(tmp_path, metrics):
+    path = str(tmp_path / 'keys.jsonl')
+    keys = OrderKeys(path, max_entries=2, metrics=metrics)
+    for i in range(10):
+        keys.claim(f'k{i}', {})
+        keys.sent(f'k{i}')
+        keys.finish(f'k{i}', 200, {'retcode': 10009})
+    with open(path) as f:
+        assert sum(1 for _ in f) <= 2 * keys.max_entries + 1
+
+
+def test_parse_key():
+    assert parse_key({'client_order_id': ' a-1 '}, {}) == 'a-1'
+    assert parse_key({}, {'Idempotency-Key': 'h-1'}) == 'h-1'
+    assert parse_key({}, {}) is None
+    with pytest.raises(ValueError):
+        parse_key({'client_order_id': 'x' * 65}, {})
+
+
+# =============================================================================
+# find_order
+# =============================================================================
+def test_find_order_in_positions(sim):
+    comment = order_comment('p')
+    result = buy(sim, comment)
+    found = find_order(sim, 'EURUSD', comment, sim.clock())
+    assert found['order_ticket'] == result.order and found['position_verified']
+    assert find_order(sim, 'EURUSD', order_comment('other'), sim.clock()) is None
+
+
+def test_find_order_in_deal_history(sim):
+    comment = order_comment('h')
+    result = buy(sim, comment)
+    tick = sim.symbol_info_tick('EURUSD')
+    sim.order_send({'action': sim.TRADE_ACTION_DEAL, 'symbol': 'EURUSD', 'volume': 0.1,
+                    'type': sim.ORDER_TYPE_SELL, 'position': result.order, 'price': tick.bid,
+                    'type_filling': sim.ORDER_FILLING_IOC})
+    assert not sim.positions
+    found = find_order(sim, 'EURUSD', comment, sim.clock())
+    assert found['order_ticket'] == result.order and not found['position_verified']
+
+
+# =============================================================================
+# /order end to end
+# =============================================================================
+class LostAnswer:
+    """order_send reaches the simulator, but the bridge gets None back"""
+
+    def __init__(self, mt5, execute=True):
+        self._mt5 = mt5
+        self.execute = execute
+
+    def order_send(self, request):
+        if self.execute:
+            self._mt5.order_send(request)
+        return None
+
+    def __getattr__(self, name):
+        return getattr(self._mt5, name)
+
+
+@pytest.fixture(scope='module')
+def server_module():
+    mp = pytest.MonkeyPatch()
+    for name, value in (('USE_MOCK_MT5', 'true'), ('ORDER_KEYS_FILE', ''), ('ORDER_CONFIRM_DELAY', '0'),
+                        ('BRIDGE_LOG_LEVEL', 'ERROR'), ('MT5_WRAPPERS', ''), ('MT5_EXECUTION', ''),
+                        ('MT5_FAULTS', ''), ('MT5_BACKEND', ''), ('MT5_REPLAY_DIR', ''),
+                        ('POSITION_MONITOR', '')):
+        mp.setenv(name, value)
+    server = importlib.import_module('server')
+    yield server
+    mp.undo()
+
+
+@pytest.fixture
+def bridge(server_module, monkeypatch, metrics):
+    monkeypatch.setattr(server_module, 'order_keys', OrderKeys(metrics=metrics))
+    return server_module
+
+
+def positions(bridge):
+    return len(bridge.mt5.positions_get() or ())
+
+
+def test_duplicate_is_replayed_without_a_second_position(bridge):
+    client = bridge.app.test_client()
+    before = positions(bridge)
+    first = client.post('/order', json={**ORDER, 'client_order_id': 'dup'})
+    second = client.post('/order', json=ORDER, headers={'Idempotency-Key': 'dup'})
+    assert first.status_code == second.status_code == 200
+    assert second.get_json()['idempotent_replay']
+    assert second.get_json()['order_ticket'] == first.get_json()['order_ticket']
+    assert positions(bridge) == before + 1
+
+
+def test_concurrent_duplicates_open_one_position(bridge, monkeypatch):
+    client = bridge.app.test_client()
+    send = bridge.execution_policy.send
+    gate = threading.Event()
+
+    def slow_send(order_request):
+        gate.wait(5)
+        return send(order_request)
+
+    monkeypatch.setattr(bridge.execution_policy, 'send', slow_send)
+    before = positions(bridge)
+    responses = []
+    threads = [threading.Thread(target=lambda: responses.append(
+        client.post('/order', json={**ORDER, 'client_order_id': 'conc'}))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    threading.Timer(0.2, gate.set).start()
+    for thread in threads:
+        thread.join()
+    assert [r.status_code for r in responses] == [200] * 4
+    assert len({r.get_json()['order_ticket'] for r in responses}) == 1
+    assert positions(bridge) == before + 1
+
+
+def test_changed_body_is_a_conflict(bridge):
+    client = bridge.app.test_client()
+    assert client.post('/order', json={**ORDER, 'client_order_id': 'chg'}).status_code == 200
+    response = client.post('/order', json={**ORDER, 'volume': 0.2, 'client_order_id': 'chg'})
+    assert response.status_code == 422
+
+
+def test_refused_before_send_releases_the_key(bridge):
+    client = bridge.app.test_client()
+    refused = client.post('/order', json={**ORDER, 'sl': 5.0, 'client_order_id': 'pre'})
+    assert refused.status_code == 400 and refused.get_json()['stage'] == 'pretrade'
+    # Same key, fixed order: a new order, not a 422 or a replay of the refusal
+    assert bridge.order_keys.wait('pre', timeout=0) is None
+    retry = client.post('/order', json={**ORDER, 'client_order_id': 'pre'})
+    assert retry.status_code == 200 and not retry.get_json().get('idempotent_replay')
+
+
+def test_lost_answer_is_recovered_from_the_terminal(bridge, monkeypatch):
+    client = bridge.app.test_client()
+    before = positions(bridge)
+    monkeypatch.setattr(bridge.execution_policy, 'mt5', LostAnswer(bridge.mt5))
+    lost = client.post('/order', json={**ORDER, 'client_order_id': 'lost'})
+    assert lost.status_code == 500
+    monkeypatch.setattr(bridge.execution_policy, 'mt5', bridge.mt5)
+
+    recovered = client.post('/order', json={**ORDER, 'client_order_id': 'lost'})
+    assert recovered.status_code == 200 and recovered.get_json()['recovered']
+    assert positions(bridge) == before + 1
+    assert client.post('/order', json={**ORDER, 'client_order_id': 'lost'}).get_json()['idempotent_replay']
+
+
+def test_never_executed_is_sent_again(bridge, monkeypatch):
+    client = bridge.app.test_client()
+    before = positions(bridge)
+    monkeypatch.setattr(bridge.execution_policy, 'mt5', LostAnswer(bridge.mt5, execute=False))
+    assert client.post('/order', json={**ORDER, 'client_order_id': 'never'}).status_code == 500
+    monkeypatch.setattr(bridge.execution_policy, 'mt5', bridge.mt5)
+
+    resent = client.post('/order', json={**ORDER, 'client_order_id': 'never'})
+    assert resent.status_code == 200 and not resent.get_json().get('recovered')
+    assert positions(bridge) == before + 1
+
+
+def test_restart_replays_from_the_journal(bridge, monkeypatch, tmp_path, metrics):
+    path = str(tmp_path / 'keys.jsonl')
+    client = bridge.app.test_client()
+    monkeypatch.setattr(bridge, 'order_keys', OrderKeys(path, metrics=metrics))
+    first = client.post('/order', json={**ORDER, 'client_order_id': 'restart'})
+    before = positions(bridge)
+
+    monkeypatch.setattr(bridge, 'order_keys', OrderKeys(path, metrics=metrics))
+    again = client.post('/order', json={**ORDER, 'client_order_id': 'restart'})
+    assert again.get_json()['idempotent_replay']
+    assert again.get_json()['order_ticket'] == first.get_json()['order_ticket']
+    assert positions(bridge) == before
+
+
+def test_body_must_be_an_object(bridge):
+    client = bridge.app.test_client()
+    for body in ('[1]', '"x"', 'not json'):
+        response = client.post('/order', data=body, content_type='application/json')
+        assert response.status_code == 400 and response.is_json
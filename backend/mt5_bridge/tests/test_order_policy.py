@@ -0,0 +1,113 @@
+"""ExecutionPolicy: filling selection, INVALID_FILL fallback and requote retries"""
+
+import pytest
+
+from caches import SymbolInfoCache
+from faults import FaultInjectingMT5
+from order_policy import DEFAULT_POLICY, ExecutionPolicy, load_policy_config
+
+
+class SendSpy:
+    """Keeps every request dict passed to order_send, plus a copy taken at call time"""
+
+    def __init__(self, mt5):
+        self._mt5 = mt5
+        self.sent = []
+
+    def order_send(self, request):
+        self.sent.append((request, dict(request)))
+        return self._mt5.order_send(request)
+
+    def __getattr__(self, name):
+        return getattr(self._mt5, name)
+
+
+def requoting(sim, rate, seed=7, **rule):
+    return FaultInjectingMT5(sim, {'seed': seed, 'rules': {'order_send': {
+        'requote': rate, 'requote_codes': [sim.TRADE_RETCODE_REQUOTE], **rule}}})
+
+
+def buy(mt5, **extra):
+    tick = mt5.symbol_info_tick('EURUSD')
+    return {'action': mt5.TRADE_ACTION_DEAL, 'symbol': 'EURUSD', 'volume': 0.1,
+            'type': mt5.ORDER_TYPE_BUY, 'price': tick.ask, 'magic': 234000, **extra}
+
+
+def policy(mt5, metrics, **config):
+    return ExecutionPolicy(mt5, SymbolInfoCache(metrics=metrics), {**DEFAULT_POLICY, **config}, metrics=metrics)
+
+
+def test_requote_is_resent_at_a_fresh_price(sim, metrics):
+    spy = SendSpy(requoting(sim, 0.7))
+    executor = policy(spy, metrics, max_attempts=5)
+    retried = None
+    for _ in range(10):
+        spy.sent.clear()
+        result, attempts = executor.send(buy(spy))
+        if len(attempts) > 1 and result.retcode == sim.TRADE_RETCODE_DONE:
+            retried = attempts
+            break
+    assert retried is not None, 'seeded requote rate never produced a retried fill'
+    assert [a['retcode'] for a in retried[:-1]] == [sim.TRADE_RETCODE_REQUOTE] * (len(retried) - 1)
+    # Each attempt went out as its own dict, unchanged after the call
+    assert len({id(request) for request, _ in spy.sent}) == len(spy.sent)
+    for (request, at_call), attempt in zip(spy.sent, retried):
+        assert request == at_call
+        assert request['price'] == attempt['price']
+
+
+def test_max_attempts_cuts_off_retries(sim, metrics):
+    result, attempts = policy(requoting(sim, 1.0), metrics, max_attempts=3).send(buy(sim))
+    assert result.retcode == sim.TRADE_RETCODE_REQUOTE
+    assert len(attempts) == 3
+    assert not sim.positions
+
+
+def test_budget_cuts_off_retries(sim, metrics):
+    slow = requoting(sim, 1.0, latency={'dist': 'fixed', 'ms': 30})
+    result, attempts = policy(slow, metrics, max_attempts=10, budget_ms=50).send(buy(sim))
+    assert result.retcode == sim.TRADE_RETCODE_REQUOTE
+    assert len(attempts) == 1       # a second 30 ms attempt would overrun the 50 ms budget
+
+
+def test_deviation_widens_up_to_max(sim, metrics):
+    executor = policy(requoting(sim, 1.0), metrics, max_attempts=4, deviation=5, deviation_step=10,
+                      max_deviation=20)
+    _, attempts = executor.send(executor.prepare(buy(sim)))
+    assert [a['deviation'] for a in attempts] == [5, 15, 20, 20]
+
+
+def test_invalid_fill_falls_back_to_next_mode(sim, metrics):
+    # The simulator refuses RETURN for market deals
+    executor = policy(sim, metrics, filling=['RETURN', 'IOC'])
+    result, attempts = executor.send(buy(sim))
+    assert result.retcode == sim.TRADE_RETCODE_DONE
+    assert [(a['retcode'], a['filling']) for a in attempts] == [
+        (sim.TRADE_RETCODE_INVALID_FILL, sim.ORDER_FILLING_RETURN),
+        (sim.TRADE_RETCODE_DONE, sim.ORDER_FILLING_IOC),
+    ]
+    # Remembered for the symbol: the next order starts with IOC
+    assert executor.prepare(buy(sim))['type_filling'] == sim.ORDER_FILLING_IOC
+
+
+def test_invalid_fill_with_no_mode_left_gives_up(sim, metrics):
+    result, attempts = policy(sim, metrics, filling=['RETURN']).send(buy(sim))
+    assert result.retcode == sim.TRADE_RETCODE_INVALID_FILL
+    assert len(attempts) == 1
+
+
+def test_filling_follows_symbol_flags(sim, metrics):
+    sim.specs['EURUSD'].filling_mode = sim.SYMBOL_FILLING_FOK
+    assert policy(sim, metrics).filling_for('EURUSD') == 'FOK'
+    sim.specs['EURUSD'].filling_mode = 0
+    assert policy(sim, metrics, filling=['FOK', 'RETURN']).filling_for('EURUSD') == 'RETURN'
+
+
+def test_load_policy_config_validates():
+    assert load_policy_config('{"max_attempts": 5}')['max_attempts'] == 5
+    with pytest.raises(ValueError):
+        load_policy_config('{"retries": 5}')
+    with pytest.raises(ValueError):
+        load_policy_config('{"filling": ["BOC"]}')
+    with pytest.raises(ValueError):
+        load_policy_config('{"max_attempts": 0}')